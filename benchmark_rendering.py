@@ -1,94 +1,414 @@
+"""Offline rendering benchmark suite.
+
+Renders synthetic maps of controlled size and composition, plus any real map
+fixtures stored in benchmarks/fixtures, without touching the network. Every
+render reports per-stage timings, results are written to a JSON file and can
+be compared against a stored baseline to catch regressions.
+
+Usage:
+    uv run benchmark_rendering.py                      # run and compare
+    uv run benchmark_rendering.py --update-baseline    # store new baseline
+    uv run benchmark_rendering.py --record 69669       # save a real map fixture
+"""
+
+import argparse
 import asyncio
-import time
+import json
 import logging
+import platform
+import random
 import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
 
-from src.core.repository import MapRepository
-from src.core.aw2_renderer import AW2Renderer
+from src.core.aw2_data import REEF_ID, SEA_ID, SHOAL_IDS
+from src.core.timing import StageTimer
 
 # Setup logging to avoid cluttering output
 logging.basicConfig(level=logging.CRITICAL)
 
+BENCH_DIR = Path("benchmarks")
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+RESULTS_PATH = BENCH_DIR / "results.json"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
 
-MAP_IDS = [
-    69669,  # Small map (25x25)
-    179270,  # Large 6 player map (50x44)
-    153643,
-    111366,
-    102523,
-    160183,
-    153592,
-    168502,  # Special emphasis
-]
+# Stages are reported individually and rolled up into these groups
+STAGE_GROUPS = {
+    "convert": ["convert"],
+    "autotile": ["autotile"],
+    "compose": ["compose"],
+    "overlays": ["overhangs", "units"],
+    "resize": ["resize"],
+    "animate": ["animate"],
+    "encode": ["encode"],
+}
 
+# Run settings (with their defaults) that must match the baseline's
+BENCHMARK_CONFIG = {"level": "full", "weather": "clear", "animated": False}
 
-async def prepare_data():
-    """Fetch all maps once to ensure they are cached."""
-    print("Pre-fetching map data...")
-    repo = MapRepository()
-    for map_id in MAP_IDS:
-        try:
-            print(f"Fetching {map_id}...")
-            await repo.get_map_data(map_id)
-        except Exception as e:
-            print(f"Failed to fetch {map_id}: {e}")
+# Ignore regressions smaller than this many milliseconds (timer noise)
+MIN_REGRESSION_MS = 1.0
 
-    await repo.close()
-    print("Data preparation complete.")
+LAND_IDS = [1, 1, 1, 2, 3, 15, 16, 17]
+RIVER_IDS = list(range(4, 15))
+# Neutral, Orange Star, Blue Moon, Green Earth and Yellow Comet buildings
+PROPERTY_IDS = list(range(34, 58))
+UNIT_IDS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 46]
+UNIT_COUNTRIES = ["os", "bm", "ge", "yc"]
 
 
-def benchmark():
-    print("\nStarting Benchmark...")
-    repo = MapRepository()  # Use cached data
-    renderer = AW2Renderer()
+def _make_map(name: str, grid: np.ndarray, units: list[dict]) -> dict:
+    """Wrap a (height, width) terrain grid into repository-style map data."""
+    height, width = grid.shape
+    return {
+        "id": 0,
+        "name": name,
+        "author": "benchmark",
+        "player_count": 2,
+        "size_w": width,
+        "size_h": height,
+        # AWBW stores terrain column-major (terr[x][y])
+        "terr": grid.T.tolist(),
+        "unit": units,
+    }
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
 
-    map_data_cache = {}
+def _random_units(rng: random.Random, grid: np.ndarray, density: float) -> list:
+    height, width = grid.shape
+    units = []
+    for y in range(height):
+        for x in range(width):
+            if rng.random() < density:
+                units.append(
+                    {
+                        "id": rng.choice(UNIT_IDS),
+                        "x": x,
+                        "y": y,
+                        "ctry": rng.choice(UNIT_COUNTRIES),
+                        "hp": rng.randint(1, 10),
+                    }
+                )
+    return units
 
-    # Load all data into memory first to isolate rendering time
-    async def load_maps():
-        for map_id in MAP_IDS:
-            map_data_cache[map_id] = await repo.get_map_data(map_id)
 
-    loop.run_until_complete(load_maps())
-    loop.close()
+def _islands(rng: random.Random, width: int, height: int, land: float) -> np.ndarray:
+    """Boolean land mask made of smoothed random blobs."""
+    mask = np.array(
+        [[rng.random() < land for _ in range(width)] for _ in range(height)]
+    )
+    for _ in range(2):
+        padded = np.pad(mask.astype(np.int32), 1)
+        neighbours = sum(
+            padded[1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
+            for dy in (-1, 0, 1)
+            for dx in (-1, 0, 1)
+        )
+        mask = neighbours >= 5
+    return mask
 
-    results = {}
 
-    for map_id in MAP_IDS:
-        data = map_data_cache.get(map_id)
-        if not data:
-            print(f"Skipping {map_id} (no data)")
-            continue
+def synthetic_maps(seed: int = 1234) -> dict[str, dict]:
+    """Generate the fixed set of synthetic benchmark maps."""
+    rng = random.Random(seed)
+    maps = {}
+
+    grid = np.full((30, 30), SEA_ID, dtype=np.int32)
+    maps["all_sea_30x30"] = _make_map("all_sea_30x30", grid, [])
+
+    land = _islands(rng, 40, 40, 0.45)
+    grid = np.where(land, 1, SEA_ID).astype(np.int32)
+    for y, x in zip(*np.where(~land)):
+        roll = rng.random()
+        if roll < 0.25:
+            grid[y, x] = rng.choice(sorted(SHOAL_IDS))
+        elif roll < 0.3:
+            grid[y, x] = REEF_ID
+    for y, x in zip(*np.where(land)):
+        if rng.random() < 0.15:
+            grid[y, x] = rng.choice(RIVER_IDS)
+    maps["coastline_40x40"] = _make_map("coastline_40x40", grid, [])
+
+    grid = np.array(
+        [
+            [rng.choice(PROPERTY_IDS) if rng.random() < 0.6 else 1 for _ in range(40)]
+            for _ in range(40)
+        ],
+        dtype=np.int32,
+    )
+    maps["property_dense_40x40"] = _make_map("property_dense_40x40", grid, [])
+
+    grid = np.array(
+        [[rng.choice(LAND_IDS) for _ in range(40)] for _ in range(40)],
+        dtype=np.int32,
+    )
+    units = _random_units(rng, grid, 0.7)
+    maps["unit_dense_40x40"] = _make_map("unit_dense_40x40", grid, units)
+
+    land = _islands(rng, 100, 100, 0.55)
+    grid = np.full((100, 100), SEA_ID, dtype=np.int32)
+    for y in range(100):
+        for x in range(100):
+            roll = rng.random()
+            if land[y, x]:
+                if roll < 0.2:
+                    grid[y, x] = rng.choice(PROPERTY_IDS)
+                elif roll < 0.3:
+                    grid[y, x] = rng.choice(RIVER_IDS)
+                else:
+                    grid[y, x] = rng.choice(LAND_IDS)
+            elif roll < 0.2:
+                grid[y, x] = rng.choice(sorted(SHOAL_IDS))
+    units = _random_units(rng, grid, 0.3)
+    maps["worst_case_100x100"] = _make_map("worst_case_100x100", grid, units)
+
+    return maps
+
+
+def fixture_maps() -> dict[str, dict]:
+    """Load real map fixtures (repository-style map data JSON)."""
+    maps = {}
+    for path in sorted(FIXTURES_DIR.glob("*.json")):
+        with open(path) as f:
+            maps[f"fixture_{path.stem}"] = json.load(f)
+    return maps
+
+
+async def record_fixtures(map_ids: list[int]):
+    """Fetch maps once (cache or AWBW) and store them as fixtures."""
+    from src.core.repository import MapRepository
+
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    repo = MapRepository()
+    try:
+        for map_id in map_ids:
+            data = await repo.get_map_data(map_id)
+            path = FIXTURES_DIR / f"{map_id}.json"
+            await asyncio.to_thread(
+                path.write_text, json.dumps(data, separators=(",", ":"))
+            )
+            print(f"Saved {data['size_w']}x{data['size_h']} map to {path}")
+    finally:
+        await repo.close()
+
+
+def _summarize(values: list[float]) -> dict:
+    return {
+        "mean": statistics.mean(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def benchmark(
+    maps: dict[str, dict],
+    runs: int,
+    level: str,
+    weather: str = "clear",
+    animated: bool = False,
+) -> dict:
+    from src.core.aw2_renderer import AW2Renderer
 
-        times = []
+    renderer = AW2Renderer()
+    render = renderer.render_animation if animated else renderer.render_map
+    results = {}
+
+    for name, data in maps.items():
         # Warmup
-        renderer.render_map(data)
+        render(data, level=level, use_cache=False, weather=weather)
 
-        # Run 5 times
-        for _ in range(5):
+        totals = []
+        stage_runs = []
+        for _ in range(runs):
+            timer = StageTimer()
             start = time.perf_counter()
-            renderer.render_map(data)
-            end = time.perf_counter()
-            times.append(end - start)
+            _, out = render(
+                data, level=level, use_cache=False, timer=timer, weather=weather
+            )
+            totals.append(time.perf_counter() - start)
+            stage_runs.append(timer.stages)
+
+        stage_names = sorted({stage for stages in stage_runs for stage in stages})
+        stages = {
+            stage: statistics.mean(s.get(stage, 0.0) for s in stage_runs)
+            for stage in stage_names
+        }
+        groups = {
+            group: sum(stages.get(stage, 0.0) for stage in members)
+            for group, members in STAGE_GROUPS.items()
+        }
 
-        avg_time = statistics.mean(times)
-        min_time = min(times)
-        max_time = max(times)
-        results[map_id] = avg_time
+        results[name] = {
+            "size": f"{data['size_w']}x{data['size_h']}",
+            "units": len(data.get("unit", [])),
+            "output_bytes": len(out.getvalue()),
+            "total": _summarize(totals),
+            "stages": stages,
+            "groups": groups,
+        }
 
+        total = results[name]["total"]
         print(
-            f"Map {map_id} ({data['size_w']}x{data['size_h']}): Avg: {avg_time * 1000:.2f}ms (Min: {min_time * 1000:.2f}ms, Max: {max_time * 1000:.2f}ms)"
+            f"{name:<24} {results[name]['size']:>8}: "
+            f"Avg: {total['mean'] * 1000:8.2f}ms "
+            f"(Min: {total['min'] * 1000:.2f}ms, Max: {total['max'] * 1000:.2f}ms)"
+        )
+        print(
+            " " * 26
+            + "  ".join(f"{g}={t * 1000:.1f}ms" for g, t in groups.items() if t > 0)
         )
 
     return results
 
 
+def config_mismatches(current: dict, baseline: dict) -> list[str]:
+    """Render settings that differ between a run and its baseline.
+
+    Timings are only comparable between runs with the same settings.
+    Baselines stored before a setting existed count as its default.
+    """
+    mismatches = []
+    for key, default in BENCHMARK_CONFIG.items():
+        now = current["meta"].get(key, default)
+        before = baseline.get("meta", {}).get(key, default)
+        if now != before:
+            mismatches.append(f"{key}: baseline {before!r}, this run {now!r}")
+    return mismatches
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return human-readable regressions of current vs baseline."""
+    regressions = []
+
+    def check(label: str, now: float, before: float):
+        if before <= 0:
+            return
+        delta_ms = (now - before) * 1000
+        if now > before * (1 + threshold) and delta_ms > MIN_REGRESSION_MS:
+            regressions.append(
+                f"{label}: {before * 1000:.2f}ms -> {now * 1000:.2f}ms "
+                f"(+{(now / before - 1) * 100:.0f}%)"
+            )
+
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        check(f"{name} total", result["total"]["mean"], base["total"]["mean"])
+        for stage, seconds in result["stages"].items():
+            check(f"{name} {stage}", seconds, base["stages"].get(stage, 0.0))
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per map")
+    parser.add_argument(
+        "--level", default="full", help="Pyramid level to encode (default: full)"
+    )
+    parser.add_argument(
+        "--weather", default="clear", help="Terrain layer to draw (default: clear)"
+    )
+    parser.add_argument(
+        "--animated",
+        action="store_true",
+        help="Benchmark animated previews instead of static ones",
+    )
+    parser.add_argument(
+        "--only", nargs="*", help="Only run maps whose name contains one of these"
+    )
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Relative slowdown vs baseline that counts as a regression",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the results as the new baseline",
+    )
+    parser.add_argument(
+        "--record",
+        type=int,
+        nargs="+",
+        metavar="MAP_ID",
+        help="Fetch these maps and save them as fixtures, then exit",
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record_fixtures(args.record))
+        return 0
+
+    maps = {**synthetic_maps(), **fixture_maps()}
+    if args.only:
+        maps = {k: v for k, v in maps.items() if any(o in k for o in args.only)}
+
+    print(f"Benchmarking {len(maps)} maps ({args.runs} runs each)...\n")
+    current = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "level": args.level,
+            "weather": args.weather,
+            "animated": args.animated,
+        },
+        "scenarios": benchmark(
+            maps, args.runs, args.level, args.weather, args.animated
+        ),
+    }
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline updated at '{args.baseline}'.")
+        return 0
+
+    if not args.baseline.exists():
+        print("No baseline found; run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    mismatches = config_mismatches(current, baseline)
+    if mismatches:
+        print("\nNot comparing: the baseline was recorded with other settings:")
+        for line in mismatches:
+            print(f"  {line}")
+        print("Rerun with matching options or pass another --baseline.")
+        return 1
+
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) vs baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print("\nNo regressions vs baseline.")
+    return 0
+
+
 if __name__ == "__main__":
     try:
-        asyncio.run(prepare_data())
-        benchmark()
+        sys.exit(main())
     except KeyboardInterrupt:
         pass
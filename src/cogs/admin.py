@@ -1,23 +1,58 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import asyncio
+import io
 import traceback
 import os
 import sys
 import platform
+import time
 from datetime import datetime, timedelta
+from typing import Optional
+from src.core.profiling import PROFILE_MAX_SECONDS, RenderProfiler
 from src.core.repository import MapRepository
-from src.core.stats import BotStats
-from src.core.aw2_atlas import SpriteAtlas, build_atlas
+from src.core.services import Services
+from src.core.stats import BotStats, REQUEST_STAGES, RENDER_STAGES
+from src.core.timing import format_durations
 
 
 from src.config import config
 
 
+def format_stage_table(stage_stats: dict, stages: tuple) -> str:
+    """Format p50/p95/p99 stage timings (in ms) as a fixed-width table."""
+    lines = [f"{'Stage':<12}{'p50':>9}{'p95':>9}{'p99':>9}{'Count':>8}"]
+    for stage in stages:
+        stats = stage_stats.get(stage)
+        if not stats:
+            continue
+        lines.append(
+            f"{stage:<12}"
+            f"{stats['p50'] * 1000:>9.1f}"
+            f"{stats['p95'] * 1000:>9.1f}"
+            f"{stats['p99'] * 1000:>9.1f}"
+            f"{stats['count']:>8}"
+        )
+    if len(lines) == 1:
+        lines.append("No samples yet")
+    return "\n".join(lines)
+
+
+def pack_messages(blocks: list[str], limit: int = 1900) -> list[str]:
+    """Greedily join message blocks so each message stays under limit."""
+    messages = []
+    for block in blocks:
+        if messages and len(messages[-1]) + len(block) + 1 < limit:
+            messages[-1] += "\n" + block
+        else:
+            messages.append(block)
+    return messages
+
+
 class Admin(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.repo = MapRepository()
         self.start_time = datetime.now()
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
@@ -28,8 +63,9 @@ class Admin(commands.Cog):
             )
         return is_owner
 
-    async def cog_unload(self):
-        await self.repo.close()
+    @property
+    def repo(self) -> MapRepository:
+        return Services().repository
 
     @app_commands.command(name="sync", description="Sync slash commands")
     async def sync_tree(self, interaction: discord.Interaction):
@@ -45,6 +81,11 @@ class Admin(commands.Cog):
         try:
             config.reload()
             config_msg = "Config reloaded."
+            invalidated = await Services().refresh()
+            if invalidated:
+                config_msg += f" Rebuilt: {', '.join(invalidated)}."
+            else:
+                config_msg += " Caches kept warm."
         except Exception as e:
             config_msg = f"Config reload failed: {e}"
             traceback.print_exc()
@@ -54,15 +95,23 @@ class Admin(commands.Cog):
 
         extensions = list(self.bot.extensions.keys())
 
+        stats = BotStats()
+        reload_start = time.perf_counter()
         for ext in extensions:
             try:
+                start_time = time.perf_counter()
                 await self.bot.reload_extension(ext)
+                stats.record_startup(f"reload {ext}", time.perf_counter() - start_time)
                 reloaded.append(ext)
             except Exception as e:
                 failed.append(f"{ext}: {e}")
                 traceback.print_exc()
 
-        msg = f"{config_msg}\n\n**Reloaded ({len(reloaded)}):**\n" + "\n".join(reloaded)
+        reload_ms = (time.perf_counter() - reload_start) * 1000
+        msg = (
+            f"{config_msg}\n\n**Reloaded ({len(reloaded)}) in {reload_ms:.0f} ms:**\n"
+            + "\n".join(reloaded)
+        )
         if failed:
             msg += f"\n\n**Failed ({len(failed)}):**\n" + "\n".join(failed)
 
@@ -100,19 +149,106 @@ class Admin(commands.Cog):
             await interaction.followup.send(f"Failed to purge cache: {e}")
 
     @app_commands.command(name="rebuild_atlas", description="Rebuild the sprite atlas")
-    async def rebuild_atlas(self, interaction: discord.Interaction):
+    @app_commands.describe(
+        full="Decode every sprite again instead of only changed files"
+    )
+    async def rebuild_atlas(self, interaction: discord.Interaction, full: bool = False):
         await interaction.response.defer(ephemeral=True)
 
+        status = await interaction.followup.send(
+            "Rebuilding sprite atlas...", wait=True
+        )
+        progress = {"done": 0, "total": 0}
+
+        def on_progress(done: int, total: int):
+            # Called from the build thread; the reporter task reads it
+            progress["done"], progress["total"] = done, total
+
+        async def report_progress():
+            while True:
+                await asyncio.sleep(2)
+                if progress["total"]:
+                    await status.edit(
+                        content=f"Rebuilding sprite atlas... "
+                        f"{progress['done']}/{progress['total']} sprites"
+                    )
+
+        reporter = asyncio.create_task(report_progress())
         try:
-            build_atlas(force=True)
-            # Reload the atlas in the singleton instance
-            SpriteAtlas().reload()
-            await interaction.followup.send(
-                "Sprite atlas rebuilt and reloaded successfully."
+            from src.core.aw2_atlas import build_atlas_async, load_manifest
+
+            start_time = time.perf_counter()
+            built_at = load_manifest().get("built_at")
+            atlas = await build_atlas_async(
+                force=True, progress=on_progress, incremental=not full
+            )
+            elapsed = time.perf_counter() - start_time
+            reporter.cancel()
+            manifest = load_manifest()
+            if manifest.get("built_at") == built_at:
+                await status.edit(
+                    content=f"Sprite atlas is up to date ({len(atlas)} sprites, "
+                    f"version `{manifest.get('version')}`), checked in {elapsed:.1f}s."
+                )
+                return
+
+            # Picks up the new atlas file and rebuilds the renderer
+            await Services().refresh()
+            changes = manifest["changes"]
+            sheet = manifest["sheet"]
+            saved_kb = (sheet["sprite_bytes"] - sheet["sheet_bytes"]) / 1024
+            await status.edit(
+                content=f"Sprite atlas rebuilt with {len(atlas)} sprites in "
+                f"{elapsed:.1f}s ({changes['decoded']} decoded, "
+                f"{changes['changed']} changed, {changes['removed']} removed; "
+                f"{sheet['unique']} unique, {saved_kb:.0f} KB saved) "
+                f"and reloaded successfully. Version `{manifest['version']}`."
             )
         except Exception as e:
-            await interaction.followup.send(f"Failed to rebuild atlas: {e}")
+            await status.edit(content=f"Failed to rebuild atlas: {e}")
             traceback.print_exc()
+        finally:
+            reporter.cancel()
+
+    @app_commands.command(
+        name="profile", description="Profile the next renders on live traffic"
+    )
+    @app_commands.describe(
+        renders="Stop after this many renders",
+        seconds=f"Stop after this many seconds (default: 60, at most {PROFILE_MAX_SECONDS})",
+    )
+    async def profile(
+        self,
+        interaction: discord.Interaction,
+        renders: Optional[app_commands.Range[int, 1]] = None,
+        seconds: Optional[app_commands.Range[float, 1, PROFILE_MAX_SECONDS]] = None,
+    ):
+        await interaction.response.defer(ephemeral=True)
+
+        if renders is None and seconds is None:
+            seconds = 60
+        profiler = RenderProfiler()
+        if not profiler.start(renders=renders, seconds=seconds):
+            await interaction.followup.send("A render profile is already running.")
+            return
+
+        limits = []
+        if renders is not None:
+            limits.append(f"{renders} renders")
+        if seconds is not None:
+            limits.append(f"{seconds:g}s")
+        await interaction.followup.send(
+            f"Profiling renders for the next {' or '.join(limits)}..."
+        )
+
+        await profiler.wait_async()
+        await interaction.followup.send(
+            f"Render profile: {profiler.summary()}",
+            file=discord.File(
+                io.BytesIO(profiler.report().encode()),
+                filename=f"render_profile_{datetime.now():%Y%m%d_%H%M%S}.txt",
+            ),
+        )
 
     @app_commands.command(name="stats", description="Show bot statistics")
     async def stats(self, interaction: discord.Interaction):
@@ -145,15 +281,49 @@ class Admin(commands.Cog):
             # Cache stats
             cache_stats = self.repo.get_cache_stats()
 
-            # Atlas stats
-            atlas = SpriteAtlas()
-            atlas_size_mb = atlas.size_bytes / (1024 * 1024)
-            atlas_count = len(atlas)
+            # Atlas stats; loading the atlas here would block the event
+            # loop, so it is only described once the renderer has loaded it
+            services = Services()
+            if services.renderer_loaded:
+                atlas = (await services.get_renderer()).atlas
+                atlas_text = (
+                    f"Atlas Size:       {atlas.size_bytes / (1024 * 1024):.2f} MB\n"
+                    f"Atlas Sprites:    {len(atlas)}\n"
+                )
+                sheet = atlas.sheet_stats
+                if sheet:
+                    saved_mb = (sheet["sprite_bytes"] - sheet["sheet_bytes"]) / (
+                        1024 * 1024
+                    )
+                    atlas_text += f"Atlas Unique:     {sheet['unique']} ({saved_mb:.2f} MB saved)\n"
+                atlas_text += f"Atlas Version:    {atlas.version}\n"
+            else:
+                atlas_text = "Atlas:            not loaded yet\n"
 
             # Telemetry stats
             bot_stats = BotStats()
             api_stats = bot_stats.get_api_stats()
             render_stats = bot_stats.get_render_stats()
+            cache_events = bot_stats.get_cache_event_stats()
+
+            cache_lines = []
+            for name, label in (
+                ("db", "DB Cache"),
+                ("summary", "Summary"),
+                ("image", "Image Cache"),
+                ("response", "Response"),
+                ("attachment", "Reused URL"),
+            ):
+                events = cache_events.get(name)
+                if not events:
+                    continue
+                lookups = events["hits"] + events["misses"]
+                lookups_1h = events["hits_1h"] + events["misses_1h"]
+                cache_lines.append(
+                    f"{label + ' Hits:':<18}{events['hits']}/{lookups} "
+                    f"({events['hits_1h']}/{lookups_1h} last hour)\n"
+                )
+            cache_hits_text = "".join(cache_lines)
 
             # System info
             python_version = f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
@@ -194,9 +364,10 @@ class Admin(commands.Cog):
                 f"```\n"
                 f"DB Cache Size:    {cache_stats['db_size_mb']:.2f} MB / {cache_stats['size_limit_mb']} MB\n"
                 f"Cached Maps:      {cache_stats['entry_count']}\n"
+                f"Map Summaries:    {cache_stats['summary_count']}\n"
                 f"Cache TTL:        {cache_stats['ttl_seconds']} seconds\n"
-                f"Atlas Size:       {atlas_size_mb:.2f} MB\n"
-                f"Atlas Sprites:    {atlas_count}\n"
+                f"{atlas_text}"
+                f"{cache_hits_text}"
                 f"```\n"
                 f"**🌐 API Statistics**\n"
                 f"```\n"
@@ -210,23 +381,80 @@ class Admin(commands.Cog):
                 f"**🎨 Render Statistics**\n"
                 f"```\n"
                 f"Total Renders:    {render_stats['count']}\n"
+                f"Last 24 Hours:    {render_stats['total_24h']}\n"
+                f"Last Hour:        {render_stats['total_1h']}\n"
                 f"Total Time:       {render_stats['total_time']:.2f} s\n"
                 f"Avg Render:       {render_stats['average'] * 1000:.1f} ms\n"
                 f"Longest Render:   {longest_render_str}\n"
                 f"```"
             )
 
-            # Send guild list separately if it's long
-            if len(msg) + len(guilds_text) < 1900:
-                msg += (
-                    f"\n**🏠 Servers ({total_guilds} total):**\n```\n{guilds_text}\n```"
+            preview_stats = bot_stats.get_preview_stats()
+            preview_lines = [
+                f"Msgs Scanned:     {preview_stats['scanned']}",
+                f"Regex Checked:    {preview_stats['regex_checked']}",
+                f"With Map Links:   {preview_stats['matched']}",
+                f"In Progress:      {preview_stats['active']}",
+                f"Deferred:         {preview_stats['deferred']}",
+                f"Dropped:          {preview_stats['dropped_total']}",
+            ]
+            for reason, count in preview_stats["dropped"].items():
+                preview_lines.append(f"  {reason:<16}{count:>5}")
+            preview_msg = (
+                "**🔗 Link Auto-Previews**\n```\n" + "\n".join(preview_lines) + "\n```"
+            )
+
+            loop_stats = bot_stats.get_loop_stats()
+            loop_lines = [
+                f"Lag p50 / p99:    {loop_stats['lag_p50'] * 1000:.1f} / "
+                f"{loop_stats['lag_p99'] * 1000:.1f} ms",
+                f"Max Lag:          {loop_stats['lag_max'] * 1000:.1f} ms",
+                f"Slow Callbacks:   {loop_stats['slow_total']}",
+            ]
+            for entry in loop_stats["by_label"][:5]:
+                loop_lines.append(
+                    f"  {entry['label']:<16}{entry['count']:>5}x  "
+                    f"max {entry['longest'] * 1000:.0f} ms"
                 )
-                await interaction.followup.send(msg)
-            else:
-                await interaction.followup.send(msg)
-                await interaction.followup.send(
-                    f"**🏠 Servers ({total_guilds} total):**\n```\n{guilds_text}\n```"
+            for entry in loop_stats["recent"][-3:]:
+                loop_lines.append(
+                    f"  {entry['duration'] * 1000:.0f} ms {entry['label']} "
+                    f"@ {entry['location']}"
                 )
+            loop_msg = "**🐢 Event Loop**\n```\n" + "\n".join(loop_lines) + "\n```"
+
+            stage_stats = bot_stats.get_stage_stats()
+            # Stages missing from RENDER_STAGES are listed after the known ones
+            render_stages = RENDER_STAGES + tuple(
+                stage
+                for stage in stage_stats
+                if stage not in REQUEST_STAGES and stage not in RENDER_STAGES
+            )
+            timing_msg = (
+                f"**⏱️ Request Phases (ms)**\n"
+                f"```\n"
+                f"{format_stage_table(stage_stats, REQUEST_STAGES)}\n"
+                f"```\n"
+                f"**🧩 Render Stages (ms)**\n"
+                f"```\n"
+                f"{format_stage_table(stage_stats, render_stages)}\n"
+                f"```"
+            )
+            startup_msg = (
+                f"**🚀 Startup (ms)**\n"
+                f"```\n"
+                f"{format_durations(bot_stats.startup_stages)}\n"
+                f"```"
+            )
+            guilds_msg = (
+                f"**🏠 Servers ({total_guilds} total):**\n```\n{guilds_text}\n```"
+            )
+
+            # Split into several messages if the combined text is too long
+            for chunk in pack_messages(
+                [msg, timing_msg, preview_msg, loop_msg, startup_msg, guilds_msg]
+            ):
+                await interaction.followup.send(chunk)
 
         except Exception as e:
             await interaction.followup.send(f"Failed to get stats: {e}")
@@ -234,4 +462,6 @@ class Admin(commands.Cog):
 
 
 async def setup(bot: commands.Bot):
+    start_time = time.perf_counter()
     await bot.add_cog(Admin(bot))
+    BotStats().record_startup(f"setup {__name__}", time.perf_counter() - start_time)
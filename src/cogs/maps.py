@@ -1,82 +1,257 @@
 import discord
 from discord import app_commands, ui
 from discord.ext import commands
+import asyncio
+import functools
+import io
+import json
 import re
+import time
 import traceback
 import logging
-from urllib.parse import quote
+from typing import Awaitable, Callable, Optional
+from urllib.parse import quote, urlparse, parse_qs
 
+from src.core.image_cache import ImageCache
 from src.core.repository import MapRepository
-from src.core.aw2_renderer import AW2Renderer
+from src.core.services import Services
+from src.core.stats import BotStats
+from src.core.throttle import PreviewThrottle
 from src.utils.awbw_data import (
+    CLEAR,
+    WEATHER_LAYERS,
     UNIT_NAMES,
     CTRY_NAMES,
+    PROPERTY_NAMES,
 )
-from src.utils.map_helpers import format_k, count_properties, count_units
+from src.utils.map_helpers import (
+    changed_tiles,
+    format_k,
+    map_data_version,
+    summary_changes,
+    PROPERTY_TYPES,
+)
+from src.config import config
 
 logger = logging.getLogger(__name__)
 
 RE_AWL = re.compile(
     r"(?i)https?://(www\.)?awbw\.amarriner\.com/prevmaps\.php\?maps_id=(?P<id>[0-9]+)"
 )
+# Substring every RE_AWL match contains (lowercased), checked before the regex
+AWL_HOST = "awbw.amarriner.com"
+
+# Minimum image widths per context; the renderer serves the smallest
+# pyramid level that satisfies them.
+MAP_COMMAND_WIDTH = config.renderer.get("image_size", 1024)
+AUTO_PREVIEW_WIDTH = config.renderer.get("thumbnail_size", 512)
+REUSE_ATTACHMENT_URLS = config.cache.get("reuse_attachment_urls", True)
+ATTACHMENT_URL_MIN_TTL = config.cache.get("attachment_url_min_ttl_seconds", 3600)
+# Image format of animated previews (extension of the uploaded file)
+ANIMATION_FORMAT = config.renderer.get("animation_format", "gif").upper()
+
+# Terrain layers offered by /map
+WEATHER_CHOICES = [
+    app_commands.Choice(name=weather.title(), value=weather)
+    for weather in (CLEAR,) + WEATHER_LAYERS
+]
+
+# Discord allows 10 embeds and 10 attachments per message
+MAX_PREVIEWS_PER_MESSAGE = 10
+# Upload limit when the guild's own limit is unknown (e.g. in DMs)
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024
+
+
+def attachment_url_expiry(url: str) -> Optional[float]:
+    """Expiry timestamp of a signed Discord CDN URL (its hex ex= parameter)."""
+    values = parse_qs(urlparse(url).query).get("ex")
+    if not values:
+        return None
+    try:
+        return float(int(values[0], 16))
+    except ValueError:
+        return None
+
+
+def pack_previews(
+    results: list[tuple], max_bytes: int = DEFAULT_UPLOAD_LIMIT
+) -> list[list[tuple]]:
+    """Group generated previews into messages within Discord's limits."""
+    batches = []
+    batch_bytes = 0
+    for result in results:
+        files = result[1]
+        size = sum(f.fp.getbuffer().nbytes for f in files)
+        if (
+            not batches
+            or len(batches[-1]) >= MAX_PREVIEWS_PER_MESSAGE
+            or batch_bytes + size > max_bytes
+        ):
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append(result)
+        batch_bytes += size
+    return batches
+
+
+# Tab name -> (button label, emoji), in display order
+MAP_TABS = {
+    "preview": ("Preview", "🗺️"),
+    "properties": ("Properties", "🏠"),
+    "units": ("Predeployed", "🎖️"),
+}
+
+
+class MapTabButton(
+    ui.DynamicItem[ui.Button],
+    template=r"map:(?P<id>[0-9]+):(?P<tab>preview|properties|units)"
+    r"(?::(?P<version>[0-9a-f]+):(?P<renderer>[^:]+):(?P<variant>.+))?",
+):
+    """Tab button whose custom_id encodes the map ID and tab.
+
+    Registered once as a dynamic item, so clicks are handled for every
+    preview message (including ones sent before a restart) without keeping
+    per-message state; the tab's embed is rebuilt from the map summary.
+    image_key is (data version, renderer version, variant) of the preview
+    image, so the Preview tab can restore exactly that image; buttons sent
+    before it was added have none.
+    """
+
+    def __init__(
+        self,
+        awbw_id: int,
+        tab: str,
+        active: bool = False,
+        image_key: Optional[tuple[str, str, str]] = None,
+    ):
+        label, emoji = MAP_TABS[tab]
+        custom_id = f"map:{awbw_id}:{tab}"
+        if image_key is not None:
+            custom_id += ":" + ":".join(image_key)
+        super().__init__(
+            ui.Button(
+                label=label,
+                emoji=emoji,
+                style=discord.ButtonStyle.primary
+                if active
+                else discord.ButtonStyle.secondary,
+                custom_id=custom_id,
+            )
+        )
+        self.awbw_id = awbw_id
+        self.tab = tab
+        self.image_key = image_key
+
+    @classmethod
+    async def from_custom_id(
+        cls, interaction: discord.Interaction, item: ui.Button, match: re.Match[str]
+    ) -> "MapTabButton":
+        image_key = None
+        if match["version"] is not None:
+            image_key = (match["version"], match["renderer"], match["variant"])
+        return cls(int(match["id"]), match["tab"], image_key=image_key)
+
+    async def callback(self, interaction: discord.Interaction):
+        cog = interaction.client.get_cog("Maps")
+        if cog is None:
+            await interaction.response.defer()
+            return
+        embed = await cog.build_tab_embed(
+            self.awbw_id, self.tab, interaction.message, self.image_key
+        )
+        await interaction.response.edit_message(
+            embed=embed, view=TabbedMapView(self.awbw_id, self.tab, self.image_key)
+        )
 
 
 class TabbedMapView(ui.View):
-    def __init__(self, awbw_id: int, embeds: dict):
-        super().__init__(timeout=None)
-        self.awbw_id = awbw_id
-        self.embeds = embeds
+    """Tab buttons for a map preview message.
 
-    @ui.button(
-        label="Preview",
-        emoji="🗺️",
-        style=discord.ButtonStyle.primary,
-        custom_id="map_tab_preview",
-    )
-    async def tab_preview(self, interaction: discord.Interaction, button: ui.Button):
-        await self.update_tab(interaction, button, "preview")
-
-    @ui.button(
-        label="Properties",
-        emoji="🏠",
-        style=discord.ButtonStyle.secondary,
-        custom_id="map_tab_properties",
-    )
-    async def tab_properties(self, interaction: discord.Interaction, button: ui.Button):
-        await self.update_tab(interaction, button, "properties")
-
-    @ui.button(
-        label="Predeployed",
-        emoji="🎖️",
-        style=discord.ButtonStyle.secondary,
-        custom_id="map_tab_units",
-    )
-    async def tab_units(self, interaction: discord.Interaction, button: ui.Button):
-        await self.update_tab(interaction, button, "units")
+    The view is stopped right away so discord.py does not keep it in its
+    view store; clicks are dispatched to the registered MapTabButton.
+    """
 
-    async def update_tab(
-        self, interaction: discord.Interaction, button: ui.Button, tab_name: str
+    def __init__(
+        self,
+        awbw_id: int,
+        active_tab: str = "preview",
+        image_key: Optional[tuple[str, str, str]] = None,
     ):
-        self.set_active_button(button)
-        await interaction.response.edit_message(embed=self.embeds[tab_name], view=self)
-
-    def set_active_button(self, active_button: ui.Button):
-        for child in self.children:
-            child.style = discord.ButtonStyle.secondary
-        active_button.style = discord.ButtonStyle.primary
+        super().__init__(timeout=None)
+        for tab in MAP_TABS:
+            self.add_item(
+                MapTabButton(
+                    awbw_id, tab, active=tab == active_tab, image_key=image_key
+                )
+            )
+        self.stop()
 
 
 class Maps(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.repo = MapRepository()
-        self.renderer = AW2Renderer()
+        # Repository, renderer and caches outlive the cog across /reload
+        self.services = Services()
+        self._warmup_task: Optional[asyncio.Task] = None
+        auto_preview = config.auto_preview
+        self.throttle = PreviewThrottle(
+            channel_cooldown=auto_preview.get("channel_cooldown_seconds", 5),
+            guild_cooldown=auto_preview.get("guild_cooldown_seconds", 1),
+            dedup_window=auto_preview.get("dedup_window_seconds", 300),
+            max_concurrent=auto_preview.get("max_concurrent", 4),
+            max_queued=auto_preview.get("max_queued", 16),
+        )
+
+    async def cog_load(self):
+        self.bot.add_dynamic_items(MapTabButton)
+        if self.bot.is_ready():
+            # Loaded by /reload, so on_ready won't fire again
+            self._start_warmup()
 
     async def cog_unload(self):
-        await self.repo.close()
+        self.bot.remove_dynamic_items(MapTabButton)
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+
+    @property
+    def repo(self) -> MapRepository:
+        return self.services.repository
+
+    @property
+    def response_cache(self) -> ImageCache:
+        return self.services.response_cache
 
-    def build_embeds(self, awbw_id: int, map_data: dict, preview_filename: str) -> dict:
-        author = map_data.get("author", "Unknown")
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._start_warmup()
+
+    def _start_warmup(self):
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self._warm_up())
+
+    async def _warm_up(self):
+        if self.services.renderer_loaded:
+            return
+        start_time = time.perf_counter()
+        await self.services.get_renderer()
+        duration = time.perf_counter() - start_time
+        BotStats().record_startup("warm-up renderer", duration)
+        logger.info(f"Renderer warmed up in {duration * 1000:.0f} ms")
+
+    async def weather_available(self, weather: str) -> bool:
+        """Whether the loaded sprite atlas has the weather layer.
+
+        The choices come from the config; a layer missing from the atlas
+        would otherwise be drawn as clear terrain.
+        """
+        if weather == CLEAR:
+            return True
+        renderer = await self.services.get_renderer()
+        return weather in renderer.atlas.layers
+
+    def build_embeds(self, awbw_id: int, summary: dict, preview_filename: str) -> dict:
+        """Format the tab embeds from a precomputed map summary."""
+        author = summary.get("author", "Unknown")
         author_url = f"https://awbw.amarriner.com/profile.php?username={quote(author)}"
 
         if author == "[Unknown]":
@@ -91,18 +266,13 @@ class Maps(commands.Cog):
             f"[Map Analysis](https://awbw.amarriner.com/analysis.php?maps_id={awbw_id})"
         )
 
-        prop_counts, income = count_properties(map_data.get("terr", []))
-        unit_counts = count_units(map_data.get("unit", []))
+        countries = summary.get("countries", [])
+        title = summary.get("name") or f"Map {awbw_id}"
 
-        active_ctries = [
-            i for i in range(21) if prop_counts.get(i) or unit_counts.get(i)
-        ]
-        active_ctries.sort(key=lambda i: (0 if prop_counts.get(i) else 1, i))
-
-        size_w = map_data.get("size_w", 0)
-        size_h = map_data.get("size_h", 0)
-        published = map_data.get("published", "Unknown")[:10]
-        active_players = len([i for i in active_ctries if i != 0])
+        size_w = summary.get("size_w", 0)
+        size_h = summary.get("size_h", 0)
+        published = (summary.get("published") or "Unknown")[:10]
+        active_players = summary.get("active_players", 0)
 
         header_desc = (
             f"{author_line} ・ **Players:** {active_players} ・ **Size:** {size_w}x{size_h} ・ **Published:** {published}\n"
@@ -111,66 +281,46 @@ class Maps(commands.Cog):
 
         # Preview embed (AW2 sprites) - primary tab with embedded image
         preview_embed = discord.Embed(
-            title=map_data.get("name", f"Map {awbw_id}"),
+            title=title,
             url=f"https://awbw.amarriner.com/prevmaps.php?maps_id={awbw_id}",
             description=header_desc,
         )
         preview_embed.set_image(url=f"attachment://{preview_filename}")
 
-        if not active_ctries:
+        if not countries:
             prop_embed = discord.Embed(
-                title=map_data.get("name", f"Map {awbw_id}"),
+                title=title,
                 url=f"https://awbw.amarriner.com/prevmaps.php?maps_id={awbw_id}",
                 description=f"{header_desc}\n\nNo properties found on this map.",
             )
             unit_embed = discord.Embed(
-                title=map_data.get("name", f"Map {awbw_id}"),
+                title=title,
                 url=f"https://awbw.amarriner.com/prevmaps.php?maps_id={awbw_id}",
                 description=f"{header_desc}\n\nNo units found on this map.",
             )
         else:
-            total_props_all = sum(sum(c.values()) for c in prop_counts.values())
-
-            hq_count = sum(p.get(101, 0) for p in prop_counts.values())
-            city_count = sum(p.get(102, 0) for p in prop_counts.values())
-            base_count = sum(p.get(103, 0) for p in prop_counts.values())
-            air_count = sum(p.get(104, 0) for p in prop_counts.values())
-            port_count = sum(p.get(105, 0) for p in prop_counts.values())
-
-            income_props = hq_count + city_count + base_count + air_count + port_count
-
-            base_income_k = 2 if map_data.get("is_hfog", False) else 1
-            total_income_all = income_props * base_income_k
-
-            players = map_data.get("player_count", active_players)
-            funds_per_player = (
-                round(total_income_all / players, 1) if players > 0 else 0
-            )
-            funds_per_base = (
-                round(total_income_all / base_count, 1) if base_count > 0 else 0
-            )
-
             stats_desc = (
                 f"{header_desc}\n\n"
-                f"**Total:** {total_props_all} props | **{format_k(total_income_all * 1000)}**/day\n"
-                f"**{format_k(funds_per_player * 1000)}**/player | **{format_k(funds_per_base * 1000)}**/base"
+                f"**Total:** {summary['total_props']} props | **{format_k(summary['daily_income_k'] * 1000)}**/day\n"
+                f"**{format_k(summary['funds_per_player'] * 1000)}**/player | **{format_k(summary['funds_per_base'] * 1000)}**/base"
             )
 
             prop_embed = discord.Embed(
-                title=map_data.get("name", f"Map {awbw_id}"),
+                title=title,
                 url=f"https://awbw.amarriner.com/prevmaps.php?maps_id={awbw_id}",
                 description=stats_desc,
             )
 
             unit_embed = discord.Embed(
-                title=map_data.get("name", f"Map {awbw_id}"),
+                title=title,
                 url=f"https://awbw.amarriner.com/prevmaps.php?maps_id={awbw_id}",
                 description=header_desc,
             )
 
-            for ctry_id in active_ctries:
+            for country in countries:
+                ctry_id = country["ctry"]
                 name = CTRY_NAMES.get(ctry_id, f"Country {ctry_id}")
-                props = prop_counts.get(ctry_id, {})
+                props = dict(zip(PROPERTY_TYPES, country["props"]))
                 hq = props.get(101, 0)
                 city = props.get(102, 0)
                 base = props.get(103, 0)
@@ -178,7 +328,7 @@ class Maps(commands.Cog):
                 port = props.get(105, 0)
                 tower = props.get(106, 0)
                 lab = props.get(107, 0)
-                inc = format_k(income.get(ctry_id, 0))
+                inc = format_k(country["income"])
 
                 # Build dot-separated property list
                 prop_parts = []
@@ -205,18 +355,19 @@ class Maps(commands.Cog):
                     inline=False,
                 )
 
-            for ctry_id in active_ctries:
+            for country in countries:
+                ctry_id = country["ctry"]
                 if ctry_id == 0:
                     continue
                 name = CTRY_NAMES.get(ctry_id, f"Country {ctry_id}")
-                units = unit_counts.get(ctry_id, {})
+                units = country["units"]
                 if not units:
                     unit_embed.add_field(name=name, value="—", inline=False)
                 else:
                     # Build dot-separated unit list
                     unit_parts = [
                         f"**{UNIT_NAMES.get(uid, f'Unit{uid}')}:** {count}"
-                        for uid, count in sorted(units.items())
+                        for uid, count in units
                     ]
                     unit_embed.add_field(
                         name=name, value=" ・ ".join(unit_parts), inline=False
@@ -225,60 +376,527 @@ class Maps(commands.Cog):
         return {"preview": preview_embed, "properties": prop_embed, "units": unit_embed}
 
     async def generate_map_response(
-        self, awbw_id: int
-    ) -> tuple[discord.Embed, list[discord.File], ui.View] | None:
+        self,
+        awbw_id: int,
+        min_width: int = MAP_COMMAND_WIDTH,
+        reuse_url: bool = REUSE_ATTACHMENT_URLS,
+        weather: str = CLEAR,
+        animated: bool = False,
+    ) -> tuple[discord.Embed, list[discord.File], ui.View, tuple] | None:
+        """Build the preview message for a map.
+
+        Returns (preview embed, files, view, cache key). files is empty when
+        the image is served from a previously uploaded attachment URL.
+        """
+        stats = BotStats()
         try:
+            start_time = time.perf_counter()
             map_data = await self.repo.get_map_data(awbw_id)
+            fetch_time = time.perf_counter() - start_time
+
+            renderer = await self.services.get_renderer()
+            level = renderer.choose_level(map_data, min_width)
+            # Weather and animated renders are separate images with their own key
+            variant = level if weather == CLEAR else f"{level}:{weather}"
+            if animated:
+                variant += ":animated"
+            cache_key = (awbw_id, map_data_version(map_data), renderer.version, variant)
+            payload = self.response_cache.get(cache_key)
+            stats.record_cache_event("response", hit=payload is not None)
+
+            if payload is None:
+                start_time = time.perf_counter()
+                summary = await self.repo.get_map_summary(awbw_id, map_data)
+                fetch_time += time.perf_counter() - start_time
+
+                # Generate AW2 preview image at the smallest adequate level
+                start_time = time.perf_counter()
+                if animated:
+                    _, preview_bytes = await renderer.render_animation_async(
+                        map_data, level=level, weather=weather
+                    )
+                else:
+                    _, preview_bytes = await renderer.render_map_async(
+                        map_data, level=level, weather=weather
+                    )
+                stats.record_stage("render", time.perf_counter() - start_time)
 
-            # Generate AW2 preview image
-            _, preview_bytes = self.renderer.render_map(map_data)
-
-            # Create filename
-            preview_filename = f"awbw_{awbw_id}.png"
+                preview_filename = (
+                    f"awbw_{awbw_id}"
+                    if weather == CLEAR
+                    else f"awbw_{awbw_id}_{weather}"
+                )
+                preview_filename += (
+                    f".{ANIMATION_FORMAT.lower()}" if animated else ".png"
+                )
+                embeds = self.build_embeds(awbw_id, summary, preview_filename)
+                payload = {
+                    "filename": preview_filename,
+                    "image": preview_bytes.getvalue(),
+                    "embed": embeds["preview"].to_dict(),
+                }
+                size = len(payload["image"]) + len(json.dumps(payload["embed"]))
+                self.response_cache.put(cache_key, payload, size)
+
+            stats.record_stage("fetch", fetch_time)
+
+            # Fresh objects per message; the payload itself is shared
+            embed = discord.Embed.from_dict(payload["embed"])
+            url = await self._reusable_url(cache_key, payload) if reuse_url else None
+            if url:
+                embed.set_image(url=url)
+                files = []
+            else:
+                files = [
+                    discord.File(
+                        io.BytesIO(payload["image"]), filename=payload["filename"]
+                    )
+                ]
 
-            # Create file object
-            preview_file = discord.File(preview_bytes, filename=preview_filename)
+            view = TabbedMapView(awbw_id, image_key=cache_key[1:])
+            return embed, files, view, cache_key
 
-            files = [preview_file]
+        except Exception as e:
+            logger.error(f"Error generating map {awbw_id}: {e}")
+            traceback.print_exc()
+            return None
 
-            embeds = self.build_embeds(awbw_id, map_data, preview_filename)
-            view = TabbedMapView(awbw_id, embeds)
+    async def generate_diff_response(
+        self, awbw_id: int, other_id: Optional[int] = None, weather: str = CLEAR
+    ) -> tuple[discord.Embed, Optional[discord.File]] | None:
+        """Build a message comparing two maps.
 
-            return embeds["preview"], files, view
+        Compares awbw_id with other_id, or, without other_id, the cached copy
+        of awbw_id (expired or not) with its current version on AWBW. The
+        file is None when there is no earlier version to compare with.
+        """
+        try:
+            if other_id is None:
+                other_id = awbw_id
+                old_data = await self.repo.get_stored_map_data(awbw_id)
+                # Before the refresh overwrites the stored map and summary
+                if old_data is not None:
+                    old_summary = await self.repo.get_map_summary(awbw_id, old_data)
+                new_data = await self.repo.get_map_data(awbw_id, refresh=True)
+                if old_data is None or map_data_version(old_data) == map_data_version(
+                    new_data
+                ):
+                    embed = self.build_no_diff_embed(
+                        awbw_id, new_data, cached=old_data is not None
+                    )
+                    return embed, None
+            else:
+                old_data = await self.repo.get_map_data(awbw_id)
+                old_summary = await self.repo.get_map_summary(awbw_id, old_data)
+                new_data = await self.repo.get_map_data(other_id)
+            new_summary = await self.repo.get_map_summary(other_id, new_data)
+
+            renderer = await self.services.get_renderer()
+            level = renderer.choose_level(new_data, MAP_COMMAND_WIDTH)
+            start_time = time.perf_counter()
+            _, image = await renderer.render_diff_async(
+                old_data, new_data, level=level, weather=weather
+            )
+            BotStats().record_stage("render", time.perf_counter() - start_time)
+
+            filename = f"awbw_diff_{awbw_id}_{other_id}.png"
+            embed = self.build_diff_embed(
+                awbw_id,
+                other_id,
+                old_summary,
+                new_summary,
+                int(changed_tiles(old_data, new_data).sum()),
+            )
+            embed.set_image(url=f"attachment://{filename}")
+            return embed, discord.File(image, filename=filename)
 
         except Exception as e:
-            logger.error(f"Error generating map {awbw_id}: {e}")
+            logger.error(f"Error comparing maps {awbw_id} and {other_id}: {e}")
             traceback.print_exc()
             return None
 
+    def build_no_diff_embed(
+        self, awbw_id: int, map_data: dict, cached: bool
+    ) -> discord.Embed:
+        """Say that the cache held no earlier version of a map."""
+        name = map_data.get("name") or f"Map {awbw_id}"
+        if cached:
+            reason = "the cached copy is already the current version."
+        else:
+            reason = "the map was not cached before."
+        return discord.Embed(
+            title=f"{name}: cached vs. current",
+            url=f"https://awbw.amarriner.com/prevmaps.php?maps_id={awbw_id}",
+            description=f"There is no earlier version to compare with: {reason}",
+        )
+
+    def build_diff_embed(
+        self,
+        old_id: int,
+        new_id: int,
+        old_summary: dict,
+        new_summary: dict,
+        changed_count: int,
+    ) -> discord.Embed:
+        """Describe the differences between two map summaries."""
+        old_name = old_summary.get("name") or f"Map {old_id}"
+        new_name = new_summary.get("name") or f"Map {new_id}"
+        if old_id == new_id:
+            title = f"{new_name}: cached vs. current"
+        else:
+            title = f"{old_name} vs. {new_name}"
+
+        changes = summary_changes(old_summary, new_summary)
+        fields = changes["fields"]
+        lines = [f"**Changed tiles:** {changed_count}"]
+        if "size_w" in fields or "size_h" in fields:
+            lines.append(
+                f"**Size:** {old_summary.get('size_w', 0)}x{old_summary.get('size_h', 0)}"
+                f" → {new_summary.get('size_w', 0)}x{new_summary.get('size_h', 0)}"
+            )
+        if "active_players" in fields:
+            lines.append("**Players:** {} → {}".format(*fields["active_players"]))
+        if "total_props" in fields:
+            lines.append("**Properties:** {} → {}".format(*fields["total_props"]))
+        if "daily_income_k" in fields:
+            old_income, new_income = fields["daily_income_k"]
+            lines.append(
+                f"**Income:** {format_k(old_income * 1000)}/day"
+                f" → {format_k(new_income * 1000)}/day"
+            )
+        if changed_count == 0 and not changes["countries"]:
+            lines.append("The maps are identical.")
+
+        embed = discord.Embed(
+            title=title,
+            url=f"https://awbw.amarriner.com/prevmaps.php?maps_id={new_id}",
+            description="\n".join(lines),
+        )
+
+        for country in changes["countries"]:
+            ctry_id = country["ctry"]
+            name = CTRY_NAMES.get(ctry_id, f"Country {ctry_id}")
+            if country["income"]:
+                sign = "+" if country["income"] > 0 else "-"
+                name += f" ({sign}{format_k(abs(country['income']))}/day)"
+
+            parts = [
+                f"**{PROPERTY_NAMES.get(prop, prop)}:** {delta:+d}"
+                for prop, delta in zip(PROPERTY_TYPES, country["props"])
+                if delta
+            ]
+            parts += [
+                f"**{UNIT_NAMES.get(uid, f'Unit{uid}')}:** {delta:+d}"
+                for uid, delta in country["units"]
+            ]
+            embed.add_field(name=name, value=" ・ ".join(parts) or "—", inline=False)
+
+        return embed
+
+    async def build_tab_embed(
+        self,
+        awbw_id: int,
+        tab: str,
+        message: Optional[discord.Message],
+        image_key: Optional[tuple[str, str, str]] = None,
+    ) -> discord.Embed:
+        """Rebuild one tab of a preview message from the stored map summary."""
+        summary = await self.repo.get_map_summary(awbw_id)
+        embed = self.build_embeds(awbw_id, summary, f"awbw_{awbw_id}.png")[tab]
+        if tab == "preview":
+            image_url = await self._preview_image_url(awbw_id, message, image_key)
+            if image_url:
+                embed.set_image(url=image_url)
+            else:
+                embed.set_image(url=None)
+        return embed
+
+    async def _preview_image_url(
+        self,
+        awbw_id: int,
+        message: Optional[discord.Message],
+        image_key: Optional[tuple[str, str, str]] = None,
+    ) -> Optional[str]:
+        """Find the image a preview message was sent with."""
+        if message is not None:
+            if message.attachments:
+                return f"attachment://{message.attachments[0].filename}"
+            for embed in message.embeds:
+                if embed.image.url:
+                    return embed.image.url
+        # Sent with a reused CDN URL and currently showing another tab
+        if image_key is not None:
+            result = await self.repo.get_attachment_url(
+                (awbw_id, *image_key), time.time()
+            )
+        else:
+            # Buttons without the key: the best guess is the newest upload
+            result = await self.repo.get_latest_attachment_url(awbw_id, time.time())
+        return result[0] if result else None
+
+    async def _reusable_url(self, cache_key: tuple, payload: dict) -> Optional[str]:
+        """Return an uploaded URL for this image that won't expire soon.
+
+        The URL is checked against the CDN first; one that no longer serves
+        the image is forgotten so the image is uploaded again.
+        """
+        valid_until = time.time() + ATTACHMENT_URL_MIN_TTL
+        if payload.get("url") is None:
+            payload["url"] = await self.repo.get_attachment_url(cache_key, valid_until)
+
+        url = None
+        if payload["url"] is not None:
+            url, expires_at = payload["url"]
+            if expires_at is not None and expires_at <= valid_until:
+                payload["url"] = url = None
+            elif not await self.repo.attachment_url_available(url):
+                logger.info(
+                    f"Attachment URL for map {cache_key[0]} is gone; re-uploading"
+                )
+                payload["url"] = url = None
+                await self.repo.forget_attachment_url(cache_key)
+        BotStats().record_cache_event("attachment", hit=url is not None)
+        return url
+
+    async def _remember_upload(
+        self, cache_key: tuple, message: discord.Message, filename: str
+    ):
+        """Store the CDN URL of a freshly uploaded preview for reuse."""
+        attachment = next(
+            (a for a in message.attachments if a.filename == filename), None
+        )
+        if attachment is None:
+            return
+        url = attachment.url
+        expires_at = attachment_url_expiry(url)
+        payload = self.response_cache.get(cache_key)
+        if payload is not None:
+            payload["url"] = (url, expires_at)
+        await self.repo.save_attachment_url(cache_key, url, expires_at)
+
+    async def send_map_responses(
+        self,
+        send: Callable[..., Awaitable[Optional[discord.Message]]],
+        awbw_ids: list[int],
+        min_width: int = MAP_COMMAND_WIDTH,
+        max_bytes: int = DEFAULT_UPLOAD_LIMIT,
+        weather: str = CLEAR,
+        animated: bool = False,
+    ) -> list[int]:
+        """Generate previews for several maps concurrently and send them.
+
+        Fetches go through the AWBW rate limiter and renders through the
+        render thread pool. A single map gets the tabbed view; several maps
+        are combined into as few messages as Discord's limits allow.
+        Returns the IDs of the maps sent.
+        """
+        results = await asyncio.gather(
+            *(
+                self.generate_map_response(
+                    awbw_id, min_width, weather=weather, animated=animated
+                )
+                for awbw_id in awbw_ids
+            )
+        )
+        results = [result for result in results if result]
+        for batch in pack_previews(results, max_bytes):
+            await self._send_batch(send, batch, min_width, weather, animated)
+        return [cache_key[0] for _, _, _, cache_key in results]
+
+    async def _send_batch(
+        self,
+        send: Callable[..., Awaitable[Optional[discord.Message]]],
+        batch: list[tuple],
+        min_width: int,
+        weather: str = CLEAR,
+        animated: bool = False,
+    ):
+        """Send one message of previews.
+
+        Reused URLs were checked when the previews were built; if Discord
+        still rejects the message, the images are uploaded instead.
+        """
+
+        def message_kwargs(batch: list[tuple]) -> dict:
+            kwargs = {
+                "embeds": [embed for embed, _, _, _ in batch],
+                "files": [f for _, files, _, _ in batch for f in files],
+            }
+            if len(batch) == 1:
+                kwargs["view"] = batch[0][2]
+            return kwargs
+
+        start_time = time.perf_counter()
+        try:
+            message = await send(**message_kwargs(batch))
+        except discord.HTTPException as e:
+            reused = [cache_key for _, files, _, cache_key in batch if not files]
+            if not reused:
+                raise
+            logger.warning(
+                f"Reused image URLs for maps {[key[0] for key in reused]} were "
+                f"rejected ({e}); re-uploading"
+            )
+            for cache_key in reused:
+                payload = self.response_cache.get(cache_key)
+                if payload is not None:
+                    payload["url"] = None
+                await self.repo.forget_attachment_url(cache_key)
+
+            results = await asyncio.gather(
+                *(
+                    self.generate_map_response(
+                        cache_key[0],
+                        min_width,
+                        reuse_url=False,
+                        weather=weather,
+                        animated=animated,
+                    )
+                    for _, _, _, cache_key in batch
+                )
+            )
+            batch = [result for result in results if result]
+            if not batch:
+                return
+            message = await send(**message_kwargs(batch))
+        BotStats().record_stage("upload", time.perf_counter() - start_time)
+
+        if message is not None:
+            for _, files, _, cache_key in batch:
+                if files:
+                    await self._remember_upload(cache_key, message, files[0].filename)
+
     @app_commands.command(name="map", description="Preview an AWBW map")
-    @app_commands.describe(awbw_id="The ID of the AWBW map")
-    async def map_preview(self, interaction: discord.Interaction, awbw_id: int):
+    @app_commands.describe(
+        awbw_id="The ID of the AWBW map",
+        weather="Weather to draw the terrain in",
+        animated=f"Animate units and terrain ({ANIMATION_FORMAT})",
+    )
+    @app_commands.choices(weather=WEATHER_CHOICES)
+    async def map_preview(
+        self,
+        interaction: discord.Interaction,
+        awbw_id: int,
+        weather: Optional[app_commands.Choice[str]] = None,
+        animated: bool = False,
+    ):
         await interaction.response.defer()
-        result = await self.generate_map_response(awbw_id)
-        if result:
-            embed, files, view = result
-            await interaction.followup.send(embed=embed, files=files, view=view)
-        else:
+        layer = weather.value if weather else CLEAR
+        if not await self.weather_available(layer):
+            await interaction.followup.send(
+                f"The {layer} layer is not in the sprite atlas."
+            )
+            return
+        send = functools.partial(interaction.followup.send, wait=True)
+        max_bytes = (
+            interaction.guild.filesize_limit
+            if interaction.guild
+            else DEFAULT_UPLOAD_LIMIT
+        )
+        if not await self.send_map_responses(
+            send,
+            [awbw_id],
+            max_bytes=max_bytes,
+            weather=layer,
+            animated=animated,
+        ):
             await interaction.followup.send(
                 f"Error loading map ID {awbw_id}. Please check if the ID is valid."
             )
 
+    @app_commands.command(
+        name="mapdiff", description="Highlight what changed between two maps"
+    )
+    @app_commands.describe(
+        awbw_id="The ID of the AWBW map",
+        other_id="Map to compare with (default: the latest version of the same map)",
+        weather="Weather to draw the terrain in",
+    )
+    @app_commands.choices(weather=WEATHER_CHOICES)
+    async def map_diff(
+        self,
+        interaction: discord.Interaction,
+        awbw_id: int,
+        other_id: Optional[int] = None,
+        weather: Optional[app_commands.Choice[str]] = None,
+    ):
+        await interaction.response.defer()
+        layer = weather.value if weather else CLEAR
+        if not await self.weather_available(layer):
+            await interaction.followup.send(
+                f"The {layer} layer is not in the sprite atlas."
+            )
+            return
+        result = await self.generate_diff_response(awbw_id, other_id, weather=layer)
+        if result is None:
+            await interaction.followup.send(
+                f"Error comparing map ID {awbw_id}. Please check if the IDs are valid."
+            )
+            return
+        embed, file = result
+        if file is None:
+            await interaction.followup.send(embed=embed)
+        else:
+            await interaction.followup.send(embed=embed, file=file)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         if message.author.bot:
             return
-        match = RE_AWL.search(message.content)
-        if match:
-            map_id = int(match.group("id"))
+        stats = BotStats()
+        stats.messages_scanned += 1
+
+        # Cheap checks first: this runs for every message in every guild
+        content = message.content
+        if "://" not in content or AWL_HOST not in content.lower():
+            return
+        stats.messages_regex_checked += 1
+
+        # Every distinct map linked in the message, in order of appearance
+        map_ids = list(
+            dict.fromkeys(int(match.group("id")) for match in RE_AWL.finditer(content))
+        )
+        if not map_ids:
+            return
+        stats.messages_matched += 1
+        if len(map_ids) > MAX_PREVIEWS_PER_MESSAGE:
+            logger.info(
+                f"Message {message.id} links {len(map_ids)} maps; "
+                f"previewing the first {MAX_PREVIEWS_PER_MESSAGE}"
+            )
+            map_ids = map_ids[:MAX_PREVIEWS_PER_MESSAGE]
+
+        channel_id = message.channel.id
+        guild_id = message.guild.id if message.guild else None
+        map_ids = self.throttle.admit(channel_id, guild_id, map_ids)
+        if not map_ids or not await self.throttle.acquire(len(map_ids)):
+            return
+
+        sent = []
+        try:
+            # Other messages may have previewed these while this one waited
+            map_ids = self.throttle.admit(channel_id, guild_id, map_ids)
+            if not map_ids:
+                return
+            self.throttle.mark(channel_id, guild_id, map_ids)
             async with message.channel.typing():
-                result = await self.generate_map_response(map_id)
-                if result:
-                    embed, files, view = result
-                    await message.reply(
-                        embed=embed, files=files, view=view, mention_author=False
-                    )
+                send = functools.partial(message.reply, mention_author=False)
+                max_bytes = (
+                    message.guild.filesize_limit
+                    if message.guild
+                    else DEFAULT_UPLOAD_LIMIT
+                )
+                sent = await self.send_map_responses(
+                    send, map_ids, min_width=AUTO_PREVIEW_WIDTH, max_bytes=max_bytes
+                )
+        finally:
+            self.throttle.unmark(
+                channel_id, [map_id for map_id in map_ids if map_id not in sent]
+            )
+            self.throttle.release()
 
 
 async def setup(bot: commands.Bot):
+    start_time = time.perf_counter()
     await bot.add_cog(Maps(bot))
+    BotStats().record_startup(f"setup {__name__}", time.perf_counter() - start_time)
@@ -40,6 +40,10 @@ class Config:
                     "db_path": "cache/maps.db",
                     "ttl_hours": 24,
                     "max_size_mb": 250,
+                    "response_cache_mb": 32,
+                    "reuse_attachment_urls": True,
+                    "attachment_url_min_ttl_seconds": 3600,
+                    "attachment_url_check_timeout": 5,
                 },
                 "renderer": {
                     "tile_size": 16,
@@ -47,8 +51,33 @@ class Config:
                     "sprite_dir": "/home/devj/local-arch/code/awbw/public_html/terrain/aw2",
                     "newseas_dir": "/home/devj/local-arch/code/awbw/public_html/terrain/newseas",
                     "atlas_path": "cache/aw2_atlas.npz",
+                    "atlas_build_workers": 0,
+                    "weather_layers": ["rain", "snow", "fog"],
                     "fallback_color": [255, 0, 255, 255],
+                    "diff_color": [255, 48, 48, 255],
                     "image_size": 1024,
+                    "thumbnail_size": 512,
+                    "image_cache_mb": 64,
+                    "render_workers": 4,
+                    "animation_format": "gif",
+                    "animation_max_frames": 32,
+                    "animation_max_ms": 4000,
+                },
+                "auto_preview": {
+                    "channel_cooldown_seconds": 5,
+                    "guild_cooldown_seconds": 1,
+                    "dedup_window_seconds": 300,
+                    "max_concurrent": 4,
+                    "max_queued": 16,
+                },
+                "metrics": {
+                    "enabled": False,
+                    "host": "127.0.0.1",
+                    "port": 9108,
+                    "loop_lag_interval": 0.5,
+                    "slow_callback_threshold": 0.25,
+                    "profile_interval_ms": 5,
+                    "profile_max_seconds": 600,
                 },
             }
 
@@ -68,6 +97,14 @@ class Config:
     def renderer(self) -> Dict[str, Any]:
         return self._config.get("renderer", {})
 
+    @property
+    def auto_preview(self) -> Dict[str, Any]:
+        return self._config.get("auto_preview", {})
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        return self._config.get("metrics", {})
+
 
 # Global instance
 config = Config()
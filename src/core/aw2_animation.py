@@ -0,0 +1,267 @@
+"""Animated previews.
+
+Animated sprites keep all their GIF frames in the atlas, each with its own
+duration. A preview plays them on one clock: the output gets a frame
+whenever any sprite on the map changes frame, so sprites with different
+timings stay in step.
+
+Only part of a map animates, so frames are built from the static render.
+The canvas is split into tile-sized cells (an extra row on top for the
+margin tall sprites reach into), the cells any animated sprite can touch are
+marked dirty once, and each frame recomposites just those cells: a gather
+from the frame's tile table, the overhangs and a few batched sprite blends.
+GIF output needs one palette for the whole animation, so the dirty cells of
+every frame are built first and the palette is made from all their colors;
+other formats get frames one at a time as the encoder asks for them.
+"""
+
+import math
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.config import config
+from src.core.aw2_autotile import blend_over
+
+TILE_SIZE = config.renderer["tile_size"]
+MAX_PROP_EXTENSION = config.renderer["max_prop_extension"]
+ANIMATION_MAX_FRAMES = config.renderer.get("animation_max_frames", 32)
+# Longest loop played before the animation repeats, in milliseconds
+ANIMATION_MAX_MS = config.renderer.get("animation_max_ms", 4000)
+
+# Rows of padding above the canvas so the margin is a full cell row
+PAD_TOP = max(TILE_SIZE, MAX_PROP_EXTENSION)
+
+# GIF palette index of transparent pixels; the other 255 hold colors
+TRANSPARENT_INDEX = 255
+# Pixels with less alpha than this are transparent in GIF output
+ALPHA_THRESHOLD = 128
+# A little-endian word holds an RGBA pixel's bytes in order
+WORD = np.dtype("<u4")
+
+
+def timeline(animations: Dict[str, Sequence[int]]) -> List[Tuple[int, int]]:
+    """(start, duration) in ms of each output frame of several animations.
+
+    A frame starts whenever any animation changes frame. The loop lasts
+    until all animations line up again, capped at ANIMATION_MAX_MS (but
+    long enough for each to play once) and ANIMATION_MAX_FRAMES.
+    """
+    if not animations:
+        return [(0, 0)]
+    cycles = [sum(durations) for durations in animations.values()]
+    period = min(math.lcm(*cycles), max(max(cycles), ANIMATION_MAX_MS))
+    starts = set()
+    for durations, cycle in zip(animations.values(), cycles):
+        offsets = [0, *accumulate(durations)][:-1]
+        for loop_start in range(0, period, cycle):
+            starts.update(loop_start + offset for offset in offsets)
+    starts = sorted(start for start in starts if start < period)
+    ends = starts[1:] + [period]
+    return [(start, end - start) for start, end in zip(starts, ends)][
+        :ANIMATION_MAX_FRAMES
+    ]
+
+
+def frames_at(animations: Dict[str, Sequence[int]], time_ms: int) -> Dict[str, int]:
+    """Frame number each animation shows at a point in time."""
+    frames = {}
+    for name, durations in animations.items():
+        ends = list(accumulate(durations))
+        frames[name] = bisect_right(ends, time_ms % ends[-1])
+    return frames
+
+
+def padded_canvas(canvas: np.ndarray) -> np.ndarray:
+    """Copy a (MAX_PROP_EXTENSION + h, w, ...) canvas below PAD_TOP rows.
+
+    cells() of the result line up with map tiles; the canvas itself is
+    padded[PAD_TOP - MAX_PROP_EXTENSION:].
+    """
+    padded = np.zeros(
+        (canvas.shape[0] - MAX_PROP_EXTENSION + PAD_TOP, *canvas.shape[1:]),
+        dtype=canvas.dtype,
+    )
+    padded[PAD_TOP - MAX_PROP_EXTENSION :] = canvas
+    return padded
+
+
+def cells(padded: np.ndarray, height: int, width: int) -> np.ndarray:
+    """(height + 1, TILE_SIZE, width, TILE_SIZE, ...) view of a padded canvas.
+
+    Cell [y + 1, :, x] is map tile (y, x); row 0 is the margin above the map.
+    """
+    return padded[PAD_TOP - TILE_SIZE :].reshape(
+        height + 1, TILE_SIZE, width, TILE_SIZE, *padded.shape[2:]
+    )
+
+
+def footprint(
+    x: int, y: int, w: int, h: int, height: int, width: int
+) -> Tuple[slice, slice]:
+    """Cell rows and columns a sprite pasted at canvas (x, y) covers."""
+    top = max((y - MAX_PROP_EXTENSION) // TILE_SIZE + 1, 0)
+    bottom = min((y + h - 1 - MAX_PROP_EXTENSION) // TILE_SIZE + 2, height + 1)
+    left = max(x // TILE_SIZE, 0)
+    right = min((x + w - 1) // TILE_SIZE + 1, width)
+    return slice(top, max(bottom, top)), slice(left, max(right, left))
+
+
+def paste_over(canvas: np.ndarray, sprite: np.ndarray, x: int, y: int):
+    """Paste a sprite at (x, y) using its alpha, clipped, like Image.paste."""
+    h, w = sprite.shape[:2]
+    top, left = max(y, 0), max(x, 0)
+    bottom, right = min(y + h, canvas.shape[0]), min(x + w, canvas.shape[1])
+    if top < bottom and left < right:
+        region = canvas[top:bottom, left:right]
+        region[...] = blend_over(
+            region, sprite[top - y : bottom - y, left - x : right - x]
+        )
+
+
+def as_words(pixels: np.ndarray) -> np.ndarray:
+    """View (..., 4) uint8 RGBA pixels as (...) uint32, red in the low byte."""
+    pixels = np.ascontiguousarray(pixels)
+    return pixels.view(WORD).reshape(pixels.shape[:-1])
+
+
+class SpriteBatches:
+    """Sprite pastes grouped so each group is a single vectorized blend.
+
+    Pastes go into layers in which no two overlap, later layers for pastes
+    over earlier ones (so paste order is kept where it matters), then into
+    groups of the same sprite size. Pastes sticking out of the canvas get a
+    group of their own and are clipped.
+    """
+
+    def __init__(
+        self,
+        pastes: Sequence[Tuple[str, int, int]],
+        frames: Dict[str, np.ndarray],
+        shape: Tuple[int, int],
+    ):
+        """pastes are (sprite name, x, y); frames holds each sprite's
+        (frames, h, w, 4) frames; shape is the canvas (height, width)."""
+        self.frames = frames
+        canvas_h, canvas_w = shape
+        # Highest layer drawn so far on each tile-sized block of the canvas
+        blocks = np.full(
+            (-(-canvas_h // TILE_SIZE), -(-canvas_w // TILE_SIZE)), -1, dtype=np.int32
+        )
+        groups: Dict[Tuple[int, Tuple], List[Tuple[str, int, int]]] = {}
+        for i, (name, x, y) in enumerate(pastes):
+            h, w = frames[name].shape[1:3]
+            top, left = max(y, 0), max(x, 0)
+            bottom, right = min(y + h, canvas_h), min(x + w, canvas_w)
+            if top >= bottom or left >= right:
+                continue
+            covered = blocks[
+                top // TILE_SIZE : (bottom - 1) // TILE_SIZE + 1,
+                left // TILE_SIZE : (right - 1) // TILE_SIZE + 1,
+            ]
+            layer = int(covered.max()) + 1
+            covered[...] = layer
+            clipped = (top, left, bottom, right) != (y, x, y + h, x + w)
+            key = ("clipped", i) if clipped else ("batch", h, w)
+            groups.setdefault((layer, key), []).append((name, x, y))
+
+        self.groups = []
+        for (_, key), members in sorted(groups.items(), key=lambda g: g[0][0]):
+            if key[0] == "clipped":
+                self.groups.append(members[0])
+                continue
+            _, h, w = key
+            names = sorted({name for name, _, _ in members})
+            name_ids = np.array([names.index(name) for name, _, _ in members])
+            ys = np.array([y for _, _, y in members])[:, None] + np.arange(h)
+            xs = np.array([x for _, x, _ in members])[:, None] + np.arange(w)
+            # Flat pixel offsets of every sprite pixel in the canvas
+            offsets = ys[:, :, None] * canvas_w + xs[:, None, :]
+            # Sprites with fewer frames never index past their own
+            frame_count = max(len(frames[name]) for name in names)
+            table = np.zeros((len(names), frame_count, h, w, 4), dtype=np.uint8)
+            for i, name in enumerate(names):
+                table[i, : len(frames[name])] = frames[name]
+            self.groups.append((names, name_ids, offsets, table))
+
+    def paste(self, canvas: np.ndarray, frame_of: Dict[str, int]):
+        """Paste every sprite, each at its frame in frame_of (default 0)."""
+        # One uint32 per pixel, so gathering a sprite's pixels is one lookup each
+        pixels = as_words(canvas).reshape(-1)
+        for group in self.groups:
+            if len(group) == 3:
+                name, x, y = group
+                paste_over(canvas, self.frames[name][frame_of.get(name, 0)], x, y)
+                continue
+            names, name_ids, offsets, table = group
+            frame_ids = np.array([frame_of.get(name, 0) for name in names])
+            sprites = table[name_ids, frame_ids[name_ids]]
+            below = pixels[offsets].view(np.uint8).reshape(sprites.shape)
+            pixels[offsets] = as_words(blend_over(below, sprites))
+
+
+def _unpacked_rgb(packed: np.ndarray) -> np.ndarray:
+    return np.stack([packed & 255, (packed >> 8) & 255, packed >> 16], axis=-1)
+
+
+def _opaque_colors(pixels: np.ndarray) -> np.ndarray:
+    """24-bit colors of the pixels that are opaque in GIF output."""
+    words = as_words(pixels).reshape(-1)
+    return words[words >= ALPHA_THRESHOLD << 24] & 0xFFFFFF
+
+
+class Palette:
+    """A GIF palette shared by every frame of an animation.
+
+    Built from the colors of every frame up front (the static frame and
+    all dirty-cell patches). Up to 255 colors are kept exactly; beyond that
+    Pillow's median cut picks the palette from a sample of the pixels (so
+    common colors weigh more) and every color maps to its nearest entry.
+    """
+
+    # Colors matched against the palette at once in the nearest-color path
+    NEAREST_CHUNK = 4096
+    # Pixels the median cut looks at; evenly spaced over all of them
+    QUANTIZE_SAMPLE = 1 << 16
+
+    def __init__(self, images: Sequence[np.ndarray]):
+        pixels = np.concatenate([_opaque_colors(image) for image in images])
+        # Sorted distinct 24-bit colors; index() looks pixels up by position
+        self.colors = np.unique(pixels)
+        self.palette = np.zeros((256, 3), dtype=np.uint8)
+        if len(self.colors) <= TRANSPARENT_INDEX:
+            self.size = len(self.colors)
+            self.palette[: self.size] = _unpacked_rgb(self.colors)
+            self._indices = np.arange(self.size, dtype=np.uint8)
+            return
+
+        sample = pixels[:: max(len(pixels) // self.QUANTIZE_SAMPLE, 1)]
+        rgb = _unpacked_rgb(sample).astype(np.uint8)
+        quantized = Image.fromarray(rgb[None], "RGB").quantize(
+            TRANSPARENT_INDEX, method=Image.Quantize.MEDIANCUT
+        )
+        used = np.array(quantized.getpalette(), dtype=np.uint8).reshape(-1, 3)
+        used = used[:TRANSPARENT_INDEX]
+        self.size = len(used)
+        self.palette[: self.size] = used
+
+        used = used.astype(np.int32)
+        self._indices = np.empty(len(self.colors), dtype=np.uint8)
+        for start in range(0, len(self.colors), self.NEAREST_CHUNK):
+            chunk = self.colors[start : start + self.NEAREST_CHUNK]
+            rgb = _unpacked_rgb(chunk).astype(np.int32)
+            distances = ((rgb[:, None] - used) ** 2).sum(axis=-1)
+            self._indices[start : start + len(chunk)] = distances.argmin(axis=1)
+
+    def index(self, pixels: np.ndarray) -> np.ndarray:
+        """Palette indices of RGBA pixels of any shape from the frames."""
+        words = as_words(pixels)
+        opaque = words >= ALPHA_THRESHOLD << 24
+        indices = np.full(words.shape, TRANSPARENT_INDEX, dtype=np.uint8)
+        if len(self.colors):
+            positions = np.searchsorted(self.colors, words[opaque] & 0xFFFFFF)
+            indices[opaque] = self._indices[positions]
+        return indices
@@ -1,17 +1,48 @@
 """AW2 Sprite Atlas builder and loader.
 
 Builds a compressed sprite atlas from AW2 terrain GIFs.
-Filters: *.gif, exclude _rain, _snow, gs_ prefixes.
+Filters: *.gif; _rain, _snow and gs_ (fog) variants go to weather layers.
 Outputs: cache/aw2_atlas.npz
+
+The atlas also stores a manifest of the source files (path, size, mtime and
+content hash per sprite) so rebuilds only decode files that changed, an
+atlas version hash that downstream caches key on, and the pre-rendered
+autotile tables (see aw2_autotile).
+
+Identical sprites (unit aliases, shared building and sea variants) are
+stored once: unique sprites are packed into a single sprite sheet and every
+name maps to a rectangle in it.
+
+Weather layers (rain, snow, fog) hold the variant sprites under
+"layer:name" keys in the same sheet, so variants identical to the clear
+sprite cost nothing. Each layer has its own autotile tables with the same
+row layout as the clear ones; they are only read from disk the first time
+a render asks for that weather.
+
+Animated GIFs keep every frame: frame 0 is the sprite itself and later
+frames are stored as "name#1", "name#2", ... with their durations in the
+manifest, so static renders are unaffected.
 """
 
+import asyncio
+import functools
+import hashlib
+import io
+import json
+import os
 import re
+import tempfile
+import threading
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from PIL import Image
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import logging
 from src.config import config
+from src.core import aw2_autotile
+from src.utils.awbw_data import CLEAR, WEATHER_LAYERS
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +50,26 @@ TILE_SIZE = config.renderer["tile_size"]
 SPRITE_DIR = Path(config.renderer["sprite_dir"])
 NEWSEAS_DIR = Path(config.renderer.get("newseas_dir", ""))
 ATLAS_PATH = Path(config.renderer["atlas_path"])
+ATLAS_BUILD_WORKERS = config.renderer.get("atlas_build_workers", 0)
+
+# Report build progress every this many sprites
+PROGRESS_EVERY = 100
+
+# NPZ entry holding the JSON manifest; never a sprite name
+MANIFEST_KEY = "__manifest__"
+# Prefix of the NPZ entries holding the autotile tables
+TABLES_PREFIX = "__autotile_"
+# Prefix of the NPZ entries holding the packed sprite sheet
+SHEET_PREFIX = "__sheet_"
+# Minimum sprite sheet width; shelves are packed left to right
+SHEET_WIDTH = 256
+
+# Separates the layer from the sprite name in atlas keys
+LAYER_SEP = ":"
+# Separates the frame number from the sprite key of animation frames
+FRAME_SEP = "#"
+# Frame duration for GIFs that don't set one, in milliseconds
+DEFAULT_FRAME_MS = 100
 
 # Regex to filter files:
 # - Must end with .gif or .png
@@ -27,6 +78,10 @@ ATLAS_PATH = Path(config.renderer["atlas_path"])
 VALID_SPRITE_PATTERN = re.compile(r"^(?!gs_).*\.(gif|png)$")
 EXCLUDE_WEATHER_PATTERN = re.compile(r"_(rain|snow)\.(gif|png)$")
 
+# Weather and fog variants: plain_rain.gif, plain_snow.gif, gs_plain.gif
+WEATHER_SPRITE_PATTERN = re.compile(r"^(?P<name>.+)_(?P<layer>rain|snow)\.(gif|png)$")
+FOG_SPRITE_PATTERN = re.compile(r"^gs_(?P<name>.+)\.(gif|png)$")
+
 # Regex for newseas sprites - include all sea*.png files
 NEWSEAS_PATTERN = re.compile(r"^sea\d+\.png$")
 
@@ -49,112 +104,529 @@ def _extract_sprite_name(filename: str) -> Optional[str]:
     return None
 
 
-def _load_image_frame(path: Path) -> Optional[np.ndarray]:
-    """Load first frame from an image file as RGBA numpy array."""
+def _layer_sprite_key(filename: str) -> Optional[str]:
+    """Atlas key ("layer:name") of a weather or fog sprite file, if enabled."""
+    match = FOG_SPRITE_PATTERN.match(filename)
+    if match:
+        layer = "fog"
+        if EXCLUDE_WEATHER_PATTERN.search(filename):
+            return None
+    else:
+        match = WEATHER_SPRITE_PATTERN.match(filename)
+        if not match:
+            return None
+        layer = match["layer"]
+    if layer not in WEATHER_LAYERS:
+        return None
+    return f"{layer}{LAYER_SEP}{match['name']}"
+
+
+def frame_key(sprite_key: str, frame: int) -> str:
+    """Atlas key of an animation frame; frame 0 is the sprite itself."""
+    return f"{sprite_key}{FRAME_SEP}{frame}" if frame else sprite_key
+
+
+def _load_image_frames(
+    path: Path, source: Optional[io.BytesIO] = None
+) -> Optional[List[Tuple[np.ndarray, int]]]:
+    """Load every frame of an image file as (RGBA numpy array, duration ms)."""
     try:
-        with Image.open(path) as img:
-            # Convert to RGBA if needed
-            if img.mode != "RGBA":
-                img = img.convert("RGBA")
-
-            # Get first frame
-            frame = np.array(img)
-
-            # Ensure correct shape (H, W, 4)
-            if len(frame.shape) == 3 and frame.shape[2] == 4:
-                return frame
-            elif len(frame.shape) == 3 and frame.shape[2] == 3:
-                # Add alpha channel
-                alpha = np.full(
-                    (frame.shape[0], frame.shape[1], 1), 255, dtype=np.uint8
-                )
-                return np.concatenate([frame, alpha], axis=2)
-            else:
-                logger.warning(f"Unexpected image shape: {frame.shape} for {path}")
-                return None
+        with Image.open(source or path) as img:
+            frames = []
+            for index in range(getattr(img, "n_frames", 1)):
+                img.seek(index)
+                duration = img.info.get("duration") or DEFAULT_FRAME_MS
+                # Convert to RGBA if needed
+                frame = np.array(img if img.mode == "RGBA" else img.convert("RGBA"))
+
+                # Ensure correct shape (H, W, 4)
+                if len(frame.shape) == 3 and frame.shape[2] == 3:
+                    # Add alpha channel
+                    alpha = np.full(
+                        (frame.shape[0], frame.shape[1], 1), 255, dtype=np.uint8
+                    )
+                    frame = np.concatenate([frame, alpha], axis=2)
+                elif len(frame.shape) != 3 or frame.shape[2] != 4:
+                    logger.warning(f"Unexpected image shape: {frame.shape} for {path}")
+                    return None
+                frames.append((frame, int(duration)))
+            return frames
     except Exception as e:
         logger.warning(f"Failed to load {path}: {e}")
         return None
 
 
-def build_atlas(force: bool = False) -> Dict[str, np.ndarray]:
-    """Build sprite atlas from AW2 terrain GIFs.
+def _collect_sprite_files() -> List[Tuple[str, Path]]:
+    """List (atlas key, path) for every file that belongs in the atlas.
+
+    Newseas sprites come last so they override same-named AW2 sprites.
+    Weather and fog variants are keyed "layer:name".
+    """
+    files = []
+
+    image_files = sorted(SPRITE_DIR.glob("*.gif")) + sorted(SPRITE_DIR.glob("*.png"))
+    for image_file in image_files:
+        if not _should_include_file(image_file.name):
+            layer_key = _layer_sprite_key(image_file.name)
+            if layer_key is not None:
+                files.append((layer_key, image_file))
+            continue
+        sprite_name = _extract_sprite_name(image_file.name)
+        if sprite_name is not None:
+            files.append((sprite_name, image_file))
+
+    if NEWSEAS_DIR.exists():
+        logger.info(f"Loading newseas sprites from {NEWSEAS_DIR}")
+        for image_file in sorted(NEWSEAS_DIR.glob("sea*.png")):
+            if not NEWSEAS_PATTERN.match(image_file.name):
+                continue
+            sprite_name = _extract_sprite_name(image_file.name)
+            if sprite_name is not None:
+                files.append((sprite_name, image_file))
+
+    return files
+
+
+def _file_entry(path: Path, data: Optional[bytes] = None) -> Dict[str, Any]:
+    """Manifest entry for a sprite file; hashes the contents if given."""
+    stat = path.stat()
+    entry = {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if data is not None:
+        entry["hash"] = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return entry
 
-    Args:
-        force: If True, rebuild even if atlas exists.
+
+def _load_sprite(
+    item: Tuple[str, Path],
+) -> Tuple[str, Optional[List[Tuple[np.ndarray, int]]], Optional[Dict[str, Any]]]:
+    """Load and hash one atlas sprite; runs in the build worker processes.
+
+    Returns the sprite's frames as (RGBA array, duration ms); one for
+    still images.
+    """
+    sprite_name, path = item
+    try:
+        data = path.read_bytes()
+        entry = _file_entry(path, data)
+    except OSError as e:
+        logger.warning(f"Failed to read {path}: {e}")
+        return sprite_name, None, None
+
+    frames = _load_image_frames(path, io.BytesIO(data))
+    if frames and any(frame.shape != frames[0][0].shape for frame, _ in frames):
+        logger.warning(
+            f"Frames of {path.name} differ in size, keeping the first frame only"
+        )
+        frames = frames[:1]
+    return sprite_name, frames or None, entry
+
+
+def _unchanged(entry: Optional[Dict[str, Any]], path: Path) -> bool:
+    """True if the file still has the path, size and mtime in entry."""
+    if entry is None or entry.get("path") != str(path):
+        return False
+    try:
+        stat = path.stat()
+    except OSError:
+        return False
+    return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+
+def atlas_version(files: Dict[str, Dict[str, Any]]) -> str:
+    """Hash of every sprite name and content hash.
+
+    Only changes when sprite contents change, not when files are touched.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for sprite_name in sorted(files):
+        digest.update(f"{sprite_name}:{files[sprite_name]['hash']}\n".encode())
+    return digest.hexdigest()
+
+
+def _content_version(atlas: Dict[str, np.ndarray]) -> str:
+    """Version for atlases built before manifests existed."""
+    digest = hashlib.blake2b(digest_size=8)
+    for sprite_name in sorted(atlas):
+        digest.update(sprite_name.encode())
+        digest.update(np.ascontiguousarray(atlas[sprite_name]).tobytes())
+    return digest.hexdigest()
+
+
+def _pack_sheet(atlas: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Deduplicate sprites by content and pack the unique ones into one sheet.
 
     Returns:
-        Dictionary mapping sprite names to RGBA arrays at native resolution.
+        pixels: (H, W, 4) sprite sheet.
+        rects: (unique sprites, 4) y, x, height, width of each sheet slot.
+        names: sprite names, sorted.
+        slots: sheet slot of each name; identical sprites share a slot.
     """
-    if ATLAS_PATH.exists() and not force:
-        logger.info(f"Loading existing atlas from {ATLAS_PATH}")
-        return load_atlas()
+    names = sorted(atlas)
+    slot_of: Dict[Tuple[Tuple[int, ...], bytes], int] = {}
+    unique: List[np.ndarray] = []
+    slots = np.zeros(len(names), dtype=np.int32)
+    for i, sprite_name in enumerate(names):
+        sprite = np.ascontiguousarray(atlas[sprite_name])
+        digest = hashlib.blake2b(sprite.tobytes(), digest_size=16).digest()
+        key = (sprite.shape, digest)
+        if key not in slot_of:
+            slot_of[key] = len(unique)
+            unique.append(sprite)
+        slots[i] = slot_of[key]
+
+    # Shelf packing, tallest sprites first
+    width = max([SHEET_WIDTH] + [sprite.shape[1] for sprite in unique])
+    rects = np.zeros((len(unique), 4), dtype=np.int32)
+    x = y = shelf_height = 0
+    for slot in sorted(range(len(unique)), key=lambda i: unique[i].shape[:2])[::-1]:
+        h, w = unique[slot].shape[:2]
+        if x + w > width:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        rects[slot] = (y, x, h, w)
+        x += w
+        shelf_height = max(shelf_height, h)
+
+    pixels = np.zeros((y + shelf_height, width, 4), dtype=np.uint8)
+    for (y, x, h, w), sprite in zip(rects, unique):
+        pixels[y : y + h, x : x + w] = sprite
+    return {"pixels": pixels, "rects": rects, "names": np.array(names), "slots": slots}
+
+
+def _unpack_sheet(sheet: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Map every sprite name to a view of its slot in the sheet."""
+    pixels = sheet["pixels"]
+    views = [pixels[y : y + h, x : x + w] for y, x, h, w in sheet["rects"]]
+    return {
+        str(sprite_name): views[slot]
+        for sprite_name, slot in zip(sheet["names"], sheet["slots"])
+    }
+
+
+def layer_sprites(atlas: Dict[str, np.ndarray], layer: str) -> Dict[str, np.ndarray]:
+    """Clear sprites, with the given layer's variants swapped in.
+
+    Variants without a clear sprite are left out, so every layer has the
+    same sprite names (and autotile table layout).
+    """
+    sprites = {
+        key: sprite
+        for key, sprite in atlas.items()
+        if LAYER_SEP not in key and FRAME_SEP not in key
+    }
+    if layer != CLEAR:
+        prefix = f"{layer}{LAYER_SEP}"
+        for key, sprite in atlas.items():
+            name = key[len(prefix) :]
+            if key.startswith(prefix) and name in sprites:
+                sprites[name] = sprite
+    return sprites
+
+
+def layer_sprite_key(atlas: Dict[str, np.ndarray], layer: str, name: str) -> str:
+    """Atlas key of the sprite a layer draws for name (its variant, if any)."""
+    key = f"{layer}{LAYER_SEP}{name}"
+    return key if layer != CLEAR and key in atlas else name
+
+
+def frame_sprites(
+    atlas: Dict[str, np.ndarray], layer: str, frames: Dict[str, int]
+) -> Dict[str, np.ndarray]:
+    """A layer's sprites with some of them at a later animation frame.
+
+    frames maps sprite names to frame numbers; sprites without the frame
+    keep their first one.
+    """
+    sprites = layer_sprites(atlas, layer)
+    for name, frame in frames.items():
+        sprite = atlas.get(frame_key(layer_sprite_key(atlas, layer, name), frame))
+        if name in sprites and sprite is not None:
+            sprites[name] = sprite
+    return sprites
 
-    logger.info(f"Building sprite atlas from {SPRITE_DIR}")
 
-    if not SPRITE_DIR.exists():
-        raise FileNotFoundError(f"Sprite directory not found: {SPRITE_DIR}")
+def _atlas_layers(atlas: Dict[str, np.ndarray]) -> List[str]:
+    """Weather layers the atlas has at least one variant sprite for."""
+    present = {key.split(LAYER_SEP, 1)[0] for key in atlas if LAYER_SEP in key}
+    return [layer for layer in WEATHER_LAYERS if layer in present]
 
-    atlas = {}
 
-    image_files = sorted(SPRITE_DIR.glob("*.gif")) + sorted(SPRITE_DIR.glob("*.png"))
+def _tables_prefix(layer: str) -> str:
+    return TABLES_PREFIX if layer == CLEAR else f"__{layer}{TABLES_PREFIX[1:]}"
 
-    for image_file in image_files:
-        filename = image_file.name
 
-        if not _should_include_file(filename):
-            continue
+def _build_layer_tables(
+    atlas: Dict[str, np.ndarray],
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """Autotile tables for the clear layer and every weather layer present."""
+    return {
+        layer: aw2_autotile.build_tables(layer_sprites(atlas, layer))
+        for layer in [CLEAR] + _atlas_layers(atlas)
+    }
 
-        sprite_name = _extract_sprite_name(filename)
-        if sprite_name is None:
-            continue
 
-        sprite_data = _load_image_frame(image_file)
-        if sprite_data is None:
-            continue
+def _save_atlas(
+    sheet: Dict[str, np.ndarray],
+    manifest: Dict[str, Any],
+    tables: Dict[str, Dict[str, np.ndarray]],
+):
+    """Write the atlas, manifest and tables to a temp file and swap it in.
 
-        if len(sprite_data.shape) != 3 or sprite_data.shape[2] != 4:
-            logger.warning(
-                f"Unexpected sprite shape {sprite_data.shape} for {filename}, skipping"
+    Readers (and a crash mid-write) never see a partially written atlas, and
+    sheet, manifest and tables can't get out of sync.
+    """
+    ATLAS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=ATLAS_PATH.parent, prefix=f".{ATLAS_PATH.stem}-", suffix=".npz"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(
+                f,
+                **{SHEET_PREFIX + name: array for name, array in sheet.items()},
+                **{
+                    _tables_prefix(layer) + name: table
+                    for layer, layer_tables in tables.items()
+                    for name, table in layer_tables.items()
+                },
+                **{MANIFEST_KEY: np.array(json.dumps(manifest))},
             )
-            continue
+        os.replace(tmp_path, ATLAS_PATH)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
-        atlas[sprite_name] = sprite_data
-        logger.debug(
-            f"Added sprite: {sprite_name} ({sprite_data.shape[0]}x{sprite_data.shape[1]})"
-        )
 
-    # Load newseas sprites if directory exists
-    if NEWSEAS_DIR.exists():
-        logger.info(f"Loading newseas sprites from {NEWSEAS_DIR}")
-        newseas_files = sorted(NEWSEAS_DIR.glob("sea*.png"))
-        for image_file in newseas_files:
-            filename = image_file.name
-            if not NEWSEAS_PATTERN.match(filename):
-                continue
-            
-            sprite_name = _extract_sprite_name(filename)
-            if sprite_name is None:
-                continue
-            
-            sprite_data = _load_image_frame(image_file)
-            if sprite_data is None:
-                continue
-            
-            if len(sprite_data.shape) != 3 or sprite_data.shape[2] != 4:
-                continue
-            
-            atlas[sprite_name] = sprite_data
-            logger.debug(f"Added newseas: {sprite_name}")
+def _frame_keys(atlas: Dict[str, np.ndarray]) -> List[str]:
+    """Keys of the later animation frames (not the sprites themselves)."""
+    return [key for key in atlas if FRAME_SEP in key]
 
-    logger.info(f"Built atlas with {len(atlas)} sprites")
 
-    # Save to compressed NPZ
-    ATLAS_PATH.parent.mkdir(parents=True, exist_ok=True)
-    np.savez_compressed(ATLAS_PATH, **atlas)
-    logger.info(f"Saved atlas to {ATLAS_PATH}")
+def build_atlas(
+    force: bool = False,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    incremental: bool = True,
+) -> Dict[str, np.ndarray]:
+    """Build sprite atlas from AW2 terrain GIFs.
 
-    return atlas
+    Sprites whose file path, size and mtime match the existing atlas
+    manifest are reused as-is; only added or changed files are decoded (in
+    a process pool) and removed files are dropped. The atlas is then saved
+    to a temp file and swapped in atomically. If nothing changed, the
+    existing file is left alone.
+
+    Args:
+        force: If True, rebuild even if atlas exists.
+        workers: Worker processes; defaults to renderer.atlas_build_workers
+            or the CPU count. 1 decodes in this process.
+        progress: Called as progress(done, total) while sprites load.
+        incremental: If False, decode every sprite again.
+
+    Returns:
+        Dictionary mapping sprite names to RGBA arrays at native resolution.
+    """
+    if ATLAS_PATH.exists() and not force:
+        logger.info(f"Loading existing atlas from {ATLAS_PATH}")
+        return load_atlas()
+
+    logger.info(f"Building sprite atlas from {SPRITE_DIR}")
+
+    if not SPRITE_DIR.exists():
+        raise FileNotFoundError(f"Sprite directory not found: {SPRITE_DIR}")
+
+    start_time = time.perf_counter()
+    # Later files (newseas) override same-named sprites
+    files = dict(_collect_sprite_files())
+
+    previous: Dict[str, np.ndarray] = {}
+    old_manifest: Dict[str, Any] = {}
+    if incremental and ATLAS_PATH.exists():
+        previous, old_manifest, _ = _read_atlas()
+        if "animations" not in old_manifest:
+            # Built before animation frames were kept; decode everything again
+            previous = {}
+    elif ATLAS_PATH.exists():
+        old_manifest = load_manifest()
+    old_files = old_manifest.get("files", {})
+    old_animations = old_manifest.get("animations", {})
+
+    atlas = {}
+    entries = {}
+    animations = {}
+    to_load = []
+    for sprite_name, path in files.items():
+        entry = old_files.get(sprite_name)
+        if sprite_name in previous and _unchanged(entry, path):
+            atlas[sprite_name] = previous[sprite_name]
+            entries[sprite_name] = entry
+            if sprite_name in old_animations:
+                animations[sprite_name] = old_animations[sprite_name]
+                for frame in range(1, len(animations[sprite_name])):
+                    key = frame_key(sprite_name, frame)
+                    atlas[key] = previous[key]
+        else:
+            to_load.append((sprite_name, path))
+
+    total = len(to_load)
+    workers = workers or ATLAS_BUILD_WORKERS or os.cpu_count() or 1
+
+    if workers > 1 and total > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, total))
+        chunksize = max(1, total // (workers * 4))
+        results = executor.map(_load_sprite, to_load, chunksize=chunksize)
+    else:
+        executor = None
+        results = map(_load_sprite, to_load)
+
+    changed = 0
+    try:
+        for done, (sprite_name, frames, entry) in enumerate(results, start=1):
+            if frames is not None:
+                for frame, (sprite_data, _) in enumerate(frames):
+                    atlas[frame_key(sprite_name, frame)] = sprite_data
+                if len(frames) > 1:
+                    animations[sprite_name] = [duration for _, duration in frames]
+                entries[sprite_name] = entry
+                # Touched but identical files only need their mtime updated
+                if old_files.get(sprite_name, {}).get("hash") != entry["hash"]:
+                    changed += 1
+            if progress is not None and (done % PROGRESS_EVERY == 0 or done == total):
+                progress(done, total)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    removed = len(set(previous) - set(atlas) - set(_frame_keys(previous)))
+    reused = len(entries) - total
+    logger.info(
+        f"Built atlas with {len(entries)} sprites "
+        f"({len(atlas) - len(entries)} extra animation frames) in "
+        f"{time.perf_counter() - start_time:.2f}s: {total} decoded "
+        f"({changed} changed), {reused} reused, {removed} removed "
+        f"({workers} workers)"
+    )
+
+    layout_current = (
+        old_manifest.get("autotile_version") == aw2_autotile.TABLES_VERSION
+        and "sheet" in old_manifest
+        and "animations" in old_manifest
+    )
+    if previous and not total and not removed and layout_current:
+        logger.info(f"Atlas at {ATLAS_PATH} is up to date")
+        return atlas
+
+    sheet = _pack_sheet(atlas)
+    sprite_bytes = sum(sprite.nbytes for sprite in atlas.values())
+    sheet_bytes = sheet["pixels"].nbytes
+    logger.info(
+        f"Packed {len(atlas)} sprites as {len(sheet['rects'])} unique into a "
+        f"{sheet['pixels'].shape[1]}x{sheet['pixels'].shape[0]} sheet: "
+        f"{sprite_bytes / 1024:.0f} KB -> {sheet_bytes / 1024:.0f} KB "
+        f"({(sprite_bytes - sheet_bytes) / 1024:.0f} KB saved)"
+    )
+
+    manifest = {
+        "version": atlas_version(entries),
+        "built_at": time.time(),
+        "changes": {"decoded": total, "changed": changed, "removed": removed},
+        "autotile_version": aw2_autotile.TABLES_VERSION,
+        "layers": _atlas_layers(atlas),
+        "animations": animations,
+        "sheet": {
+            "sprites": len(atlas),
+            "unique": len(sheet["rects"]),
+            "sprite_bytes": sprite_bytes,
+            "sheet_bytes": sheet_bytes,
+        },
+        "files": entries,
+    }
+    _save_atlas(sheet, manifest, _build_layer_tables(atlas))
+    logger.info(f"Saved atlas version {manifest['version']} to {ATLAS_PATH}")
+
+    return _unpack_sheet(sheet)
+
+
+async def build_atlas_async(
+    force: bool = True,
+    progress: Optional[Callable[[int, int], None]] = None,
+    incremental: bool = True,
+) -> Dict[str, np.ndarray]:
+    """Run build_atlas without blocking the event loop.
+
+    progress is called from a worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        functools.partial(
+            build_atlas, force=force, progress=progress, incremental=incremental
+        ),
+    )
+
+
+def _read_atlas() -> Tuple[
+    Dict[str, np.ndarray], Dict[str, Any], Optional[Dict[str, np.ndarray]]
+]:
+    """Read sprites, manifest and clear autotile tables from the NPZ file.
+
+    Sprites include every layer's variants. Tables are None if missing or
+    built by an older table layout.
+    """
+    with np.load(ATLAS_PATH) as data:
+        if SHEET_PREFIX + "pixels" in data.files:
+            atlas = _unpack_sheet(
+                {
+                    key[len(SHEET_PREFIX) :]: data[key]
+                    for key in data.files
+                    if key.startswith(SHEET_PREFIX)
+                }
+            )
+        else:
+            # One array per sprite, from before sprite sheets
+            atlas = {key: data[key] for key in data.files if not key.startswith("__")}
+        if MANIFEST_KEY in data.files:
+            manifest = json.loads(data[MANIFEST_KEY].item())
+        else:
+            # Built before manifests; the next rebuild decodes everything
+            manifest = {"version": _content_version(atlas), "files": {}}
+        tables = None
+        if manifest.get("autotile_version") == aw2_autotile.TABLES_VERSION:
+            tables = {
+                key[len(TABLES_PREFIX) :]: data[key]
+                for key in data.files
+                if key.startswith(TABLES_PREFIX)
+            }
+    return atlas, manifest, tables
+
+
+def _read_layer_tables(layer: str, version: str) -> Optional[Dict[str, np.ndarray]]:
+    """Read one weather layer's tables, if the file still has that version."""
+    prefix = _tables_prefix(layer)
+    with np.load(ATLAS_PATH) as data:
+        if MANIFEST_KEY not in data.files:
+            return None
+        manifest = json.loads(data[MANIFEST_KEY].item())
+        if (
+            manifest.get("version") != version
+            or manifest.get("autotile_version") != aw2_autotile.TABLES_VERSION
+        ):
+            return None
+        tables = {
+            key[len(prefix) :]: data[key]
+            for key in data.files
+            if key.startswith(prefix)
+        }
+    return tables or None
+
+
+def load_manifest() -> Dict[str, Any]:
+    """Load only the manifest, without decompressing any sprites."""
+    if not ATLAS_PATH.exists():
+        return {}
+    with np.load(ATLAS_PATH) as data:
+        if MANIFEST_KEY in data.files:
+            return json.loads(data[MANIFEST_KEY].item())
+    return _read_atlas()[1]
 
 
 def load_atlas() -> Dict[str, np.ndarray]:
@@ -166,8 +638,7 @@ def load_atlas() -> Dict[str, np.ndarray]:
     if not ATLAS_PATH.exists():
         return build_atlas()
 
-    data = np.load(ATLAS_PATH)
-    atlas = {key: data[key] for key in data.files}
+    atlas = layer_sprites(_read_atlas()[0], CLEAR)
     logger.info(f"Loaded {len(atlas)} sprites from atlas")
     return atlas
 
@@ -177,6 +648,15 @@ class SpriteAtlas:
 
     _instance: Optional["SpriteAtlas"] = None
     _atlas: Optional[Dict[str, np.ndarray]] = None
+    _sprites: Dict[str, np.ndarray] = {}
+    _manifest: Dict[str, Any] = {}
+    _tables: Dict[str, np.ndarray] = {}
+    _layers: List[str] = []
+    _layer_tables: Dict[str, Dict[str, np.ndarray]] = {}
+    _layer_lock = threading.Lock()
+    _animations: Dict[str, List[int]] = {}
+    _frame_tables: Dict[Tuple, Dict[str, np.ndarray]] = {}
+    _animated_rows: Dict[Tuple[str, str], np.ndarray] = {}
 
     def __new__(cls) -> "SpriteAtlas":
         if cls._instance is None:
@@ -185,12 +665,122 @@ class SpriteAtlas:
 
     def __init__(self):
         if self._atlas is None:
-            self._atlas = load_atlas()
+            self._load()
+
+    def _load(self):
+        if not ATLAS_PATH.exists():
+            build_atlas()
+        self._sprites, self._manifest, tables = _read_atlas()
+        self._atlas = layer_sprites(self._sprites, CLEAR)
+        if tables is None:
+            logger.info("Atlas has no current autotile tables, building them")
+            tables = aw2_autotile.build_tables(self._atlas)
+        self._tables = tables
+        self._layers = _atlas_layers(self._sprites)
+        self._layer_tables = {}
+        self._animations = self._manifest.get("animations", {})
+        self._frame_tables = {}
+        self._animated_rows = {}
+        logger.info(
+            f"Loaded {len(self._atlas)} sprites from atlas (version {self.version})"
+        )
 
     def reload(self):
         """Force-reload the atlas from disk."""
         logger.info("Reloading sprite atlas from disk...")
-        self._atlas = load_atlas()
+        self._load()
+
+    @property
+    def version(self) -> str:
+        """Content hash of the loaded atlas, for cache invalidation."""
+        return self._manifest["version"]
+
+    @property
+    def autotiles(self) -> Dict[str, np.ndarray]:
+        """Pre-rendered tile tables (see aw2_autotile.build_tables)."""
+        return self._tables
+
+    @property
+    def layers(self) -> List[str]:
+        """Weather layers with at least one variant sprite."""
+        return self._layers
+
+    def layer_autotiles(self, layer: str) -> Dict[str, np.ndarray]:
+        """Tile tables for a weather layer, loaded on first use.
+
+        Rows line up with the clear tables, so the same tile indices work.
+        Layers without any variant sprites share the clear tables.
+        """
+        if layer == CLEAR or layer not in self.layers:
+            return self._tables
+        tables = self._layer_tables.get(layer)
+        if tables is None:
+            with self._layer_lock:
+                tables = self._layer_tables.get(layer)
+                if tables is None:
+                    tables = _read_layer_tables(layer, self.version)
+                    if tables is None:
+                        logger.info(f"Building autotile tables for {layer} layer")
+                        tables = aw2_autotile.build_tables(
+                            layer_sprites(self._sprites, layer)
+                        )
+                    self._layer_tables[layer] = tables
+        return tables
+
+    def animation(self, name: str, layer: str = CLEAR) -> List[int]:
+        """Frame durations (ms) of a sprite as drawn on a layer; empty if still."""
+        return self._animations.get(layer_sprite_key(self._sprites, layer, name), [])
+
+    def terrain_animations(self, layer: str = CLEAR) -> Dict[str, List[int]]:
+        """Frame durations of the animated sprites the autotile tables use."""
+        animations = {}
+        for name in aw2_autotile.TABLE_SPRITES:
+            durations = self.animation(name, layer)
+            if durations and name in self._atlas:
+                animations[name] = durations
+        return animations
+
+    def get_frame(
+        self, name: str, frame: int, layer: str = CLEAR
+    ) -> Optional[np.ndarray]:
+        """Get one animation frame of a sprite; frame 0 is the sprite itself."""
+        key = layer_sprite_key(self._sprites, layer, name)
+        return self._sprites.get(frame_key(key, frame))
+
+    def frame_autotiles(
+        self, layer: str, frames: Dict[str, int]
+    ) -> Dict[str, np.ndarray]:
+        """Tile tables with the given terrain sprites at later frames.
+
+        Built on first use and kept; the rows line up with layer_autotiles.
+        """
+        frames = {name: frame for name, frame in frames.items() if frame}
+        if not frames:
+            return self.layer_autotiles(layer)
+        key = (layer, tuple(sorted(frames.items())))
+        tables = self._frame_tables.get(key)
+        if tables is None:
+            tables = aw2_autotile.build_tables(
+                frame_sprites(self._sprites, layer, frames)
+            )
+            tables = self._frame_tables.setdefault(key, tables)
+        return tables
+
+    def animated_rows(self, name: str, layer: str = CLEAR) -> np.ndarray:
+        """Tile table rows whose tile or overhang changes with a sprite's frames."""
+        key = (layer, name)
+        rows = self._animated_rows.get(key)
+        if rows is None:
+            base = self.layer_autotiles(layer)
+            changed = np.zeros(len(base["tiles"]), dtype=bool)
+            for frame in range(1, len(self.animation(name, layer))):
+                tables = self.frame_autotiles(layer, {name: frame})
+                changed |= (tables["tiles"] != base["tiles"]).any(axis=(1, 2, 3))
+                changed |= (tables["overhangs"] != base["overhangs"]).any(
+                    axis=(1, 2, 3)
+                )
+            rows = self._animated_rows.setdefault(key, np.flatnonzero(changed))
+        return rows
 
     def get(self, name: str) -> Optional[np.ndarray]:
         """Get sprite by name. Returns None if not found."""
@@ -207,13 +797,20 @@ class SpriteAtlas:
 
     @property
     def size_bytes(self) -> int:
-        """Return estimated size of atlas in bytes."""
+        """Return size of the loaded sprites in bytes (the sheet, if packed)."""
         if self._atlas is None:
             return 0
+        if "sheet" in self._manifest:
+            return self._manifest["sheet"]["sheet_bytes"]
         total = 0
         for arr in self._atlas.values():
             total += arr.nbytes
         return total
 
+    @property
+    def sheet_stats(self) -> Dict[str, int]:
+        """Sprite and unique sprite counts and bytes before/after packing."""
+        return self._manifest.get("sheet", {})
+
     def __len__(self) -> int:
         return len(self._atlas)
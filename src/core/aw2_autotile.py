@@ -0,0 +1,358 @@
+"""Pre-rendered autotile tables.
+
+Every terrain tile the renderer can draw is composited ahead of time into one
+dense (N, TILE_SIZE, TILE_SIZE, 4) table: each terrain ID on its plain
+background (tall sprites contribute their bottom tile), all 256 sea
+variants (after diagonal cleanup) and all 81 shoal variants. The parts of
+tall sprites (mountains, missile silos, properties) that stick out above
+their tile go into a matching overhang table.
+
+Rendering then picks a row per map tile with integer arrays only: sea masks
+and shoal codes are computed for the whole map at once, added to the table
+offsets, and the canvas is a single gather.
+
+The tables are derived from the sprites, so the atlas build computes them
+and stores them next to the sprites.
+"""
+
+from typing import Dict, Mapping, Tuple
+
+import numpy as np
+from PIL import Image
+
+from src.config import config
+from src.core.aw2_data import (
+    PROPERTY_IDS,
+    RIVER_EHC,
+    RIVER_NVC,
+    RIVER_SVC,
+    RIVER_WHC,
+    SEA_ID,
+    SHOAL_IDS,
+    TERRAIN_ID_TO_SPRITE,
+)
+from src.core.aw2_sea_data import (
+    RIVER_CONNECT_E,
+    RIVER_CONNECT_N,
+    RIVER_CONNECT_S,
+    RIVER_CONNECT_W,
+)
+
+TILE_SIZE = config.renderer["tile_size"]
+MAX_PROP_EXTENSION = config.renderer["max_prop_extension"]
+# Rows of a tall sprite drawn over the tile above (only one tile up)
+OVERHANG = min(TILE_SIZE, MAX_PROP_EXTENSION)
+
+# Bump whenever the table layout or compositing changes
+TABLES_VERSION = 1
+
+SEA_VARIANTS = 256
+SHOAL_VARIANTS = 81
+
+TELEPORT_ID = 195
+HBRIDGE_ID = 26
+VBRIDGE_ID = 27
+
+# Terrain IDs past this (or negative) are unknown and drawn with the fallback
+TERRAIN_LUT_SIZE = max(max(TERRAIN_ID_TO_SPRITE), TELEPORT_ID) + 1
+# Stand-in for unknown IDs in neighbour lookups: plain land
+UNKNOWN_NEIGHBOUR_ID = 1
+
+# Row 0 of the tile table is reserved for the renderer's fallback sprite
+FALLBACK_TILE = 0
+
+# How a terrain tile is layered, which decides whose overhang stays visible
+# on it (see overhang_visible)
+KIND_FLAT = 0
+KIND_AUTOTILE = 1  # sea and shoals, redrawn over overhangs
+KIND_COMPLEX = 2  # tall non-property sprites
+KIND_PROPERTY = 3
+
+# (dx, dy) of the sea neighbours, bit k of the mask (matches map_renderer.js)
+SEA_NEIGHBOURS = [(-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0)]
+# Rivers that flow into the sea from the N, E, S and W neighbour
+SEA_RIVER_CONNECT = {
+    1: (RIVER_SVC, RIVER_CONNECT_N),
+    3: (RIVER_WHC, RIVER_CONNECT_W),
+    5: (RIVER_NVC, RIVER_CONNECT_S),
+    7: (RIVER_EHC, RIVER_CONNECT_E),
+}
+
+# (dx, dy) of the shoal neighbours, base-3 digit k of the code: top, left,
+# right, bottom
+SHOAL_NEIGHBOURS = [(0, -1), (-1, 0), (1, 0), (0, 1)]
+SHOAL_RIVER_CONNECT = {0: RIVER_SVC, 1: RIVER_EHC, 2: RIVER_WHC, 3: RIVER_NVC}
+
+
+def _sea_bits() -> np.ndarray:
+    """(8, TERRAIN_LUT_SIZE) mask bits each neighbour contributes by terrain ID."""
+    bits = np.zeros((len(SEA_NEIGHBOURS), TERRAIN_LUT_SIZE), dtype=np.int32)
+    for k in range(len(SEA_NEIGHBOURS)):
+        bits[k, :] = 1 << k
+        # Water: sea, reef, bridges, shoals, teleporter
+        bits[k, 26:34] = 0
+        bits[k, TELEPORT_ID] = 0
+        if k in SEA_RIVER_CONNECT:
+            rivers, connect = SEA_RIVER_CONNECT[k]
+            bits[k, rivers] = connect
+    return bits
+
+
+def _shoal_digits() -> np.ndarray:
+    """(4, TERRAIN_LUT_SIZE) base-3 digit each neighbour contributes by terrain ID.
+
+    0 is sea, 1 is land that connects to the shoal and 2 is anything else.
+    """
+    digits = np.full((len(SHOAL_NEIGHBOURS), TERRAIN_LUT_SIZE), 2, dtype=np.int32)
+    for k in range(len(SHOAL_NEIGHBOURS)):
+        digits[k, [SEA_ID, 33]] = 0
+        digits[k, SHOAL_RIVER_CONNECT[k]] = 1
+        digits[k, sorted(SHOAL_IDS)] = 1
+        digits[k, TELEPORT_ID] = 1
+    # Bridges connect along their direction
+    digits[[0, 3], HBRIDGE_ID] = 1
+    digits[[1, 2], VBRIDGE_ID] = 1
+    return digits
+
+
+SEA_BITS = _sea_bits()
+SHOAL_DIGITS = _shoal_digits()
+
+# Every sprite build_tables reads
+TABLE_SPRITES = frozenset(
+    ["plain", *TERRAIN_ID_TO_SPRITE.values()]
+    + [f"sea{mask}" for mask in range(SEA_VARIANTS)]
+    + [f"shoal{code}" for code in range(SHOAL_VARIANTS)]
+)
+
+
+def _neighbours(terrain_ids: np.ndarray, offsets, fill: int) -> np.ndarray:
+    """(len(offsets), H, W) terrain IDs of each tile's neighbours."""
+    height, width = terrain_ids.shape
+    ids = np.where(
+        (terrain_ids >= 0) & (terrain_ids < TERRAIN_LUT_SIZE),
+        terrain_ids,
+        UNKNOWN_NEIGHBOUR_ID,
+    )
+    padded = np.pad(ids, 1, constant_values=fill)
+    return np.stack(
+        [
+            padded[1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
+            for dx, dy in offsets
+        ]
+    )
+
+
+def sea_masks(terrain_ids: np.ndarray) -> np.ndarray:
+    """Sea autotile variant (0-255) for every tile of a (height, width) map.
+
+    Vectorized port of map_renderer.js getSea(): one bit per land neighbour,
+    rivers flowing into the sea set their connection bits, then diagonal
+    bits next to a set edge are cleared. Off-map neighbours count as water.
+    """
+    neighbours = _neighbours(terrain_ids, SEA_NEIGHBOURS, fill=32)
+    k = np.arange(len(SEA_NEIGHBOURS))[:, None, None]
+    total = np.bitwise_or.reduce(SEA_BITS[k, neighbours], axis=0)
+    total &= ~(((total << 1) | (total >> 1) | (total >> 7)) & 0x55)
+    return total
+
+
+def shoal_codes(terrain_ids: np.ndarray) -> np.ndarray:
+    """Shoal autotile variant (0-80) for every tile of a (height, width) map.
+
+    Base-3 digit per edge neighbour, weighted 1, 3, 9, 27 for top, left,
+    right and bottom. Off-map neighbours count as sea.
+    """
+    neighbours = _neighbours(terrain_ids, SHOAL_NEIGHBOURS, fill=SEA_ID)
+    k = np.arange(len(SHOAL_NEIGHBOURS))[:, None, None]
+    weights = (3 ** np.arange(len(SHOAL_NEIGHBOURS)))[:, None, None]
+    return (SHOAL_DIGITS[k, neighbours] * weights).sum(axis=0)
+
+
+def blend_over(dst: np.ndarray, src: np.ndarray) -> np.ndarray:
+    """Paste src onto dst using its alpha as the mask, like Image.paste.
+
+    Uses Pillow's rounding so results match pixel for pixel.
+    """
+    # 255 * 255 + 128 + 255 still fits in 16 bits
+    alpha = src[..., 3:4].astype(np.uint16)
+    tmp = dst * (255 - alpha)
+    tmp += src * alpha
+    tmp += 128
+    tmp += tmp >> 8
+    tmp >>= 8
+    return tmp.astype(np.uint8)
+
+
+def _flat_tile(sprite: np.ndarray, plain: np.ndarray) -> np.ndarray:
+    """Blend a tile-sized sprite over plain and make it opaque."""
+    if not np.any(sprite[:, :, 3] < 255):
+        return sprite
+    alpha = (sprite[:, :, 3] / 255.0)[:, :, np.newaxis]
+    rgb = sprite[:, :, :3] * alpha + plain[:, :, :3] * (1.0 - alpha)
+    return np.dstack(
+        [rgb.astype(np.uint8), np.full((TILE_SIZE, TILE_SIZE), 255, dtype=np.uint8)]
+    )
+
+
+def _pasted_tile(
+    sprite: np.ndarray, plain: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Paste a sprite onto plain, bottom-aligned; returns (tile, overhang).
+
+    Tall sprites are first composited onto a plain-backed canvas of their
+    own height; the rows above the tile become the overhang.
+    """
+    plain_image = Image.fromarray(plain, "RGBA")
+    sprite_image = Image.fromarray(sprite, "RGBA")
+    h, w = sprite.shape[:2]
+    overhang = np.zeros((OVERHANG, TILE_SIZE, 4), dtype=np.uint8)
+    if h > TILE_SIZE:
+        comp = Image.new("RGBA", (w, h))
+        comp.paste(plain_image, (0, h - TILE_SIZE))
+        comp.alpha_composite(sprite_image)
+        comp_arr = np.array(comp)[:, :TILE_SIZE]
+        top = comp_arr[: h - TILE_SIZE][-OVERHANG:]
+        overhang[OVERHANG - len(top) :, : top.shape[1]] = top
+        tile = plain.copy()
+        bottom = comp_arr[h - TILE_SIZE :]
+        tile[:, : bottom.shape[1]] = bottom
+        return tile, overhang
+    tile_image = plain_image.copy()
+    tile_image.paste(sprite_image, (0, TILE_SIZE - h), mask=sprite_image)
+    return np.array(tile_image), overhang
+
+
+def build_tables(sprites: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Composite every terrain, sea and shoal tile from the atlas sprites.
+
+    Returns:
+        tiles: (N, TILE_SIZE, TILE_SIZE, 4) opaque tiles; row 0 is left for
+            the renderer's fallback sprite.
+        overhangs: (N, OVERHANG, TILE_SIZE, 4) parts of tall
+            sprites drawn over the tile above; transparent for most rows.
+        terrain_tile: (TERRAIN_LUT_SIZE,) tile row per terrain ID.
+        terrain_kind: (TERRAIN_LUT_SIZE,) KIND_* layering per terrain ID.
+        offsets: [sea offset, shoal offset] of the variant rows.
+    """
+    fallback = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    fallback[:, :] = config.renderer["fallback_color"]
+    plain = sprites.get("plain")
+    if plain is None:
+        plain = fallback
+
+    tiles = [fallback]
+    overhangs = [np.zeros((OVERHANG, TILE_SIZE, 4), dtype=np.uint8)]
+    terrain_tile = np.full(TERRAIN_LUT_SIZE, FALLBACK_TILE, dtype=np.int32)
+    terrain_kind = np.full(TERRAIN_LUT_SIZE, KIND_FLAT, dtype=np.int8)
+
+    for terrain_id, sprite_name in sorted(TERRAIN_ID_TO_SPRITE.items()):
+        sprite = sprites.get(sprite_name)
+        if sprite is None:
+            # Properties without a sprite show their plain background
+            if terrain_id in PROPERTY_IDS:
+                terrain_tile[terrain_id] = len(tiles)
+                tiles.append(plain)
+                overhangs.append(overhangs[0])
+            continue
+        overhang = overhangs[0]
+        if terrain_id in PROPERTY_IDS or sprite.shape[:2] != (TILE_SIZE, TILE_SIZE):
+            tile, overhang = _pasted_tile(sprite, plain)
+            terrain_kind[terrain_id] = (
+                KIND_PROPERTY if terrain_id in PROPERTY_IDS else KIND_COMPLEX
+            )
+        else:
+            tile = _flat_tile(sprite, plain)
+        terrain_tile[terrain_id] = len(tiles)
+        tiles.append(tile)
+        overhangs.append(overhang)
+
+    terrain_kind[SEA_ID] = KIND_AUTOTILE
+    terrain_kind[sorted(SHOAL_IDS)] = KIND_AUTOTILE
+
+    # Variants are drawn over the plain terrain tile (sea) or plain (shoals)
+    sea_base = tiles[terrain_tile[SEA_ID]]
+    sea_offset = len(tiles)
+    for mask in range(SEA_VARIANTS):
+        sprite = sprites.get(f"sea{mask}")
+        tiles.append(sea_base if sprite is None else blend_over(sea_base, sprite))
+    shoal_offset = len(tiles)
+    for code in range(SHOAL_VARIANTS):
+        sprite = sprites.get(f"shoal{code}")
+        tiles.append(plain if sprite is None else blend_over(plain, sprite))
+    overhangs.extend([overhangs[0]] * (SEA_VARIANTS + SHOAL_VARIANTS))
+
+    return {
+        "tiles": np.stack(tiles),
+        "overhangs": np.stack(overhangs),
+        "terrain_tile": terrain_tile,
+        "terrain_kind": terrain_kind,
+        "offsets": np.array([sea_offset, shoal_offset], dtype=np.int32),
+    }
+
+
+def tile_indices(
+    terrain_ids: np.ndarray, tables: Mapping[str, np.ndarray]
+) -> np.ndarray:
+    """Tile table row for every tile of a (height, width) map."""
+    sea_offset, shoal_offset = tables["offsets"]
+    known = (terrain_ids >= 0) & (terrain_ids < TERRAIN_LUT_SIZE)
+    ids = np.where(known, terrain_ids, 0)
+    indices = np.where(known, tables["terrain_tile"][ids], FALLBACK_TILE)
+
+    is_sea = terrain_ids == SEA_ID
+    if is_sea.any():
+        indices[is_sea] = sea_offset + sea_masks(terrain_ids)[is_sea]
+    is_shoal = np.isin(terrain_ids, list(SHOAL_IDS))
+    if is_shoal.any():
+        indices[is_shoal] = shoal_offset + shoal_codes(terrain_ids)[is_shoal]
+    return indices
+
+
+def overhang_slots(canvas: np.ndarray, height: int, width: int) -> np.ndarray:
+    """(height, OVERHANG, width, TILE_SIZE, 4) writable view of a map canvas.
+
+    Slot [y, :, x] is the area the overhang of tile (y, x) covers: the
+    bottom rows of the tile above, or of the top margin.
+    """
+    row_stride, pixel_stride, channel_stride = canvas.strides
+    return np.lib.stride_tricks.as_strided(
+        canvas[MAX_PROP_EXTENSION - OVERHANG :],
+        shape=(height, OVERHANG, width, TILE_SIZE, 4),
+        strides=(
+            TILE_SIZE * row_stride,
+            row_stride,
+            TILE_SIZE * pixel_stride,
+            pixel_stride,
+            channel_stride,
+        ),
+    )
+
+
+def overhang_visible(
+    terrain_ids: np.ndarray, tables: Mapping[str, np.ndarray]
+) -> np.ndarray:
+    """Which tiles' overhangs show over the tile above them.
+
+    Layering follows the original paste order: complex sprites, then seas
+    and shoals, then properties, each group by terrain ID and row. So a
+    complex overhang is hidden by sea, shoal and property tiles above it, and
+    any overhang is hidden by a tile of the same kind with a higher terrain
+    ID. The top row always overhangs into the margin.
+    """
+    known = (terrain_ids >= 0) & (terrain_ids < TERRAIN_LUT_SIZE)
+    ids = np.where(known, terrain_ids, 0)
+    kind = np.where(known, tables["terrain_kind"][ids], KIND_FLAT)
+
+    visible = (kind == KIND_COMPLEX) | (kind == KIND_PROPERTY)
+    above_kind = kind[:-1]
+    above_ids = terrain_ids[:-1]
+    below_kind = kind[1:]
+    below_ids = terrain_ids[1:]
+
+    hidden = (below_kind == KIND_COMPLEX) & (
+        (above_kind == KIND_AUTOTILE) | (above_kind == KIND_PROPERTY)
+    )
+    hidden |= (below_kind == above_kind) & (above_ids > below_ids)
+    visible[1:] &= ~hidden
+    return visible
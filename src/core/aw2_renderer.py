@@ -4,43 +4,76 @@ Uses real AW2 terrain sprites from the game.
 Simple approach: terrain only, no units, no shadows, no neighbor variants.
 """
 
+import asyncio
+import functools
 import io
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Iterator, Optional, Tuple
 import logging
 
-from src.core.aw2_atlas import SpriteAtlas
+from src.core.aw2_animation import (
+    PAD_TOP,
+    TRANSPARENT_INDEX,
+    Palette,
+    SpriteBatches,
+    cells,
+    footprint,
+    frames_at,
+    padded_canvas,
+    timeline,
+)
+from src.core.aw2_atlas import CLEAR, WEATHER_LAYERS, SpriteAtlas
+from src.core.aw2_autotile import (
+    FALLBACK_TILE,
+    OVERHANG,
+    blend_over,
+    overhang_slots,
+    overhang_visible,
+    tile_indices,
+)
 from src.core.aw2_data import (
-    TERRAIN_ID_TO_SPRITE,
     COUNTRY_ID_TO_PREFIX,
     UNIT_ID_TO_SPRITE_NAME,
-    RIVER_SVC,
-    RIVER_EHC,
-    RIVER_WHC,
-    RIVER_NVC,
-    LAND_IDS,
-    SEA_ID,
-    SHOAL_IDS,
-    PROPERTY_IDS,
-)
-from src.core.aw2_sea_data import (
-    SEA_MASK_TO_SPRITE,
-    RIVER_CONNECT_N,
-    RIVER_CONNECT_W,
-    RIVER_CONNECT_S,
-    RIVER_CONNECT_E,
-    SEA_WATER_IDS,
 )
+from src.core.image_cache import ImageCache
+from src.core.profiling import RENDER_THREAD_PREFIX, RenderProfiler
 from src.core.stats import BotStats
+from src.core.timing import StageTimer
 from src.utils.data.element_id import AWBW_COUNTRY_CODE, AWBW_UNIT_CODE
+from src.utils.map_helpers import changed_tiles, map_data_version, terrain_grid
 from src.config import config
 
 logger = logging.getLogger(__name__)
 
 TILE_SIZE = config.renderer["tile_size"]
 MAX_PROP_EXTENSION = config.renderer["max_prop_extension"]
+IMAGE_SIZE = config.renderer.get("image_size", 1000)
+THUMBNAIL_SIZE = config.renderer.get("thumbnail_size", 512)
+IMAGE_CACHE_MB = config.renderer.get("image_cache_mb", 64)
+RENDER_WORKERS = config.renderer.get("render_workers", 4)
+ANIMATION_FORMAT = config.renderer.get("animation_format", "gif").upper()
+DIFF_COLOR = config.renderer.get("diff_color", [255, 48, 48, 255])
+
+# Unchanged tiles of a map diff keep this much of their brightness
+DIFF_DIM = 0.4
+# Width in native pixels of the outline around changed areas
+DIFF_OUTLINE = 2
+
+# Bump whenever rendering output changes so cached previews are invalidated
+RENDERER_VERSION = 1
+
+# Output pyramid levels, all derived from the same native 1x canvas
+RENDER_LEVELS = ("native", "thumbnail", "full")
+
+# Encodings render_map can produce
+IMAGE_FORMATS = ("WEBP", "PNG")
+
+# Terrain layers a map can be rendered with
+WEATHERS = (CLEAR,) + WEATHER_LAYERS
 
 
 class AW2Renderer:
@@ -48,20 +81,71 @@ class AW2Renderer:
 
     def __init__(self):
         self.atlas = SpriteAtlas()
+        # Identifies rendered output: renderer code plus sprite contents
+        self.version = f"{RENDERER_VERSION}.{self.atlas.version}"
         self._fallback_sprite = self._create_fallback_sprite()
-        plain_arr = self.atlas.get("plain")
-        self._plain_sprite = (
-            plain_arr if plain_arr is not None else self._fallback_sprite
+
+        # Pre-rendered terrain, sea and shoal tiles, indexed per map tile
+        self.autotiles = self.atlas.autotiles
+        self.tiles, self.overhangs, self._has_overhang = self._layer_tables(
+            self.autotiles
         )
+        # Same tables for the weather layers, loaded on first use
+        self._weather_tables = {CLEAR: (self.tiles, self.overhangs, self._has_overhang)}
+        self._weather_lock = threading.Lock()
 
         # Pre-cache Pillow Image objects to avoid repeated fromarray calls
         self._sprite_image_cache = {}
+        images_by_slot = {}
         for name in self.atlas.sprite_names:
             sprite_arr = self.atlas.get(name)
             if sprite_arr is not None:
-                self._sprite_image_cache[name] = Image.fromarray(sprite_arr, "RGBA")
+                # Deduplicated sprites share one array, so share the image too
+                image = images_by_slot.get(id(sprite_arr))
+                if image is None:
+                    image = Image.fromarray(sprite_arr, "RGBA")
+                    images_by_slot[id(sprite_arr)] = image
+                self._sprite_image_cache[name] = image
+
+        # Rendered base canvases and encoded pyramid levels
+        self.image_cache = ImageCache(IMAGE_CACHE_MB * 1024 * 1024)
+
+        # Renders run here so they don't block the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=RENDER_WORKERS, thread_name_prefix=RENDER_THREAD_PREFIX
+        )
+
+    def close(self):
+        """Stop the render pool once the renders already submitted finish.
 
-        self._plain_image = self._sprite_image_cache.get("plain")
+        Renders queued by requests that are still waiting complete on the
+        old pool instead of being cancelled mid-request.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=False)
+
+    def _layer_tables(
+        self, autotiles: Dict[str, np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Tiles (with the fallback row filled in), overhangs and overhang mask."""
+        tiles = autotiles["tiles"].copy()
+        tiles[FALLBACK_TILE] = self._fallback_sprite
+        overhangs = autotiles["overhangs"]
+        return tiles, overhangs, overhangs[..., 3].any(axis=(1, 2))
+
+    def _get_weather_tables(
+        self, weather: str
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Tables for a weather layer, loading them from the atlas on first use."""
+        tables = self._weather_tables.get(weather)
+        if tables is None:
+            if weather not in WEATHERS:
+                raise ValueError(f"Unknown weather: {weather}")
+            with self._weather_lock:
+                tables = self._weather_tables.get(weather)
+                if tables is None:
+                    tables = self._layer_tables(self.atlas.layer_autotiles(weather))
+                    self._weather_tables[weather] = tables
+        return tables
 
     def _create_fallback_sprite(self) -> np.ndarray:
         """Create a magenta fallback sprite for missing terrain."""
@@ -69,23 +153,6 @@ class AW2Renderer:
         sprite[:, :] = config.renderer["fallback_color"]
         return sprite
 
-    def _get_sprite_for_terrain(self, terrain_id: int) -> Tuple[np.ndarray, str]:
-        """Get sprite array and name for a terrain ID."""
-        sprite_name = TERRAIN_ID_TO_SPRITE.get(terrain_id, "")
-
-        if not sprite_name:
-            logger.warning(f"Unknown terrain ID: {terrain_id}")
-            return self._fallback_sprite, ""
-
-        sprite = self.atlas.get(sprite_name)
-        if sprite is None:
-            logger.warning(
-                f"Sprite not found: {sprite_name} for terrain ID {terrain_id}"
-            )
-            return self._fallback_sprite, ""
-
-        return sprite, sprite_name
-
     def _get_sprite_name_for_unit(self, unit_id: int, country_id: int) -> str | None:
         """Get sprite name for a unit."""
         if country_id not in COUNTRY_ID_TO_PREFIX:
@@ -102,99 +169,6 @@ class AW2Renderer:
 
         return f"{prefix}{suffix}"
 
-    def _get_sea_sprite_name(self, x: int, y: int, terrain_ids: np.ndarray) -> str:
-        """Get the numbered sea sprite based on neighbor bitmask.
-        
-        Matches the logic from map_renderer.js getSea() method.
-        Uses newseas sprites: sea0 through sea255.
-        """
-        height, width = terrain_ids.shape
-
-        def get_terrain_id(px, py):
-            if 0 <= py < height and 0 <= px < width:
-                return terrain_ids[py, px]
-            return 32  # Out of bounds treated as land (plain)
-
-        total = 0
-        border = [
-            (x - 1, y - 1),  # NW (k=0)
-            (x, y - 1),      # N (k=1)
-            (x + 1, y - 1),  # NE (k=2)
-            (x + 1, y),      # E (k=3)
-            (x + 1, y + 1),  # SE (k=4)
-            (x, y + 1),      # S (k=5)
-            (x - 1, y + 1),  # SW (k=6)
-            (x - 1, y),      # W (k=7)
-        ]
-
-        for k, (bx, by) in enumerate(border):
-            tid = get_terrain_id(bx, by)
-            # Water: sea, reef, bridge, shoal, teleport
-            if 26 <= tid <= 33 or tid == 195:
-                continue
-            elif 4 <= tid <= 14:  # rivers
-                if k == 1 and tid in RIVER_SVC:
-                    total |= 0x05
-                elif k == 3 and tid in RIVER_WHC:
-                    total |= 0x14
-                elif k == 5 and tid in RIVER_NVC:
-                    total |= 0x50
-                elif k == 7 and tid in RIVER_EHC:
-                    total |= 0x41
-                else:
-                    total |= 1 << k
-            else:
-                total |= 1 << k
-
-        # Clean up diagonal artifacts - matches JS: total &= ~((total << 1 | total >> 1 | total >> 7) & 0x55)
-        total &= ~(((total << 1) | (total >> 1) | (total >> 7)) & 0x55)
-
-        return f"sea{total}"
-
-    def _get_shoal_sprite_name(self, x: int, y: int, terrain_ids: np.ndarray) -> str:
-        """Get the sprite name for a shoal tile based on its neighbors."""
-        height, width = terrain_ids.shape
-        total = 0
-
-        # Define border coordinates [top, left, right, bottom]
-        border = [
-            (y - 1, x),  # Top
-            (y, x - 1),  # Left
-            (y, x + 1),  # Right
-            (y + 1, x),  # Bottom
-        ]
-
-        for k, (by, bx) in enumerate(border):
-            tval = 2
-            if not (0 <= by < height and 0 <= bx < width):
-                tval = 0  # Treat out-of-bounds as sea
-            else:
-                b_tid = terrain_ids[by, bx]
-                if b_tid in {28, 33}:  # sea or reef is a connection
-                    tval = 0
-                elif 4 <= b_tid <= 14:  # rivers
-                    tval = 2  # Default to no connection
-                    if k == 0 and b_tid in RIVER_SVC:
-                        tval = 1
-                    elif k == 1 and b_tid in RIVER_EHC:
-                        tval = 1
-                    elif k == 2 and b_tid in RIVER_WHC:
-                        tval = 1
-                    elif k == 3 and b_tid in RIVER_NVC:
-                        tval = 1
-                elif b_tid == 26:  # hbridge
-                    if k == 0 or k == 3:  # Connects vertically
-                        tval = 1
-                elif b_tid == 27:  # vbridge
-                    if k == 1 or k == 2:  # Connects horizontally
-                        tval = 1
-                elif b_tid in SHOAL_IDS or b_tid == 195:  # shoal or teleporter is land
-                    tval = 1
-
-            total += (3**k) * tval
-
-        return f"shoal{total}"
-
     def _get_sprite_image(self, sprite_name: str) -> Image.Image | None:
         """Get a sprite Image from the cache, converting on-demand if needed."""
         if sprite_name in self._sprite_image_cache:
@@ -209,180 +183,400 @@ class AW2Renderer:
         logger.warning(f"Sprite not found in atlas or cache: {sprite_name}")
         return None
 
-    def render_map(self, map_data: Dict[str, Any]) -> Tuple[bool, io.BytesIO]:
-        """Render map using AW2 sprites."""
-        start_time = time.time()
-        try:
-            width = map_data["size_w"]
-            height = map_data["size_h"]
+    def level_width(self, map_data: Dict[str, Any], level: str) -> int:
+        """Return the output width in pixels of a pyramid level for a map."""
+        if level == "native":
+            return map_data["size_w"] * TILE_SIZE
+        if level == "thumbnail":
+            return THUMBNAIL_SIZE
+        if level == "full":
+            return IMAGE_SIZE
+        raise ValueError(f"Unknown render level: {level}")
 
-            terrain_data = np.array(map_data["terr"], dtype=np.int32)
+    def choose_level(self, map_data: Dict[str, Any], min_width: int) -> str:
+        """Pick the smallest pyramid level that is at least min_width wide.
 
-            if terrain_data.ndim == 1:
-                terrain_ids = terrain_data.reshape(width, height).T
-            else:
-                terrain_ids = terrain_data.T
+        Falls back to the widest level if none is large enough.
+        """
+        widths = sorted(
+            (self.level_width(map_data, level), level) for level in RENDER_LEVELS
+        )
+        for width, level in widths:
+            if width >= min_width:
+                return level
+        return widths[-1][1]
 
-            if terrain_ids.shape != (height, width):
-                logger.warning(
-                    f"Terrain shape {terrain_ids.shape} doesn't match map size {height}x{width}"
-                )
-                terrain_ids = terrain_ids[:height, :width]
+    def render_map(
+        self,
+        map_data: Dict[str, Any],
+        level: str = "full",
+        use_cache: bool = True,
+        timer: Optional[StageTimer] = None,
+        weather: str = CLEAR,
+        image_format: str = "WEBP",
+    ) -> Tuple[bool, io.BytesIO]:
+        """Render map using AW2 sprites.
+
+        Args:
+            map_data: Parsed map data from the repository.
+            level: Pyramid level to encode ("native", "thumbnail" or "full").
+            use_cache: If False, bypass the image cache entirely.
+            timer: Optional StageTimer that receives per-stage durations.
+            weather: Terrain layer to draw (one of WEATHERS).
+            image_format: "WEBP" (lossless) or "PNG".
+
+        Returns:
+            Tuple of (served from cache, encoded image).
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        target_w = self.level_width(map_data, level)
+        map_id = map_data.get("id", 0)
+        cache_key = (map_id, map_data_version(map_data), weather)
+        level_key = (*cache_key, image_format, level)
+
+        if use_cache:
+            cached = self.image_cache.get(level_key)
+            BotStats().record_cache_event("image", hit=cached is not None)
+            if cached is not None:
+                return True, io.BytesIO(cached)
+
+        if timer is None:
+            timer = StageTimer()
+
+        start_time = time.time()
+        try:
+            base = self.image_cache.get((*cache_key, "base")) if use_cache else None
+            if base is None:
+                base = self._render_base(map_data, timer, weather)
+                if use_cache:
+                    self.image_cache.put(
+                        (*cache_key, "base"), base, base.width * base.height * 4
+                    )
 
-            img = self._render(terrain_ids, map_data.get("unit", []), width, height)
+            data = self._encode_level(base, target_w, timer, image_format)
+            if use_cache:
+                self.image_cache.put(level_key, data, len(data))
 
-            target_w = config.renderer.get("image_size", 1000)
-            img_w, img_h = img.size
+            return False, io.BytesIO(data)
+        finally:
+            self._record_render(time.time() - start_time, map_id, timer)
 
-            if img_w != target_w and img_w > 0:
+    def _record_render(self, duration: float, map_id, timer: StageTimer):
+        """Report a finished (uncached) render to the stats and profiler."""
+        stats = BotStats()
+        stats.record_render(duration, map_id)
+        stats.record_stages(timer.stages)
+        RenderProfiler().record_render(duration, map_id)
+
+    def _encode_level(
+        self,
+        img: Image.Image,
+        target_w: int,
+        timer: StageTimer,
+        image_format: str = "WEBP",
+    ) -> bytes:
+        """Resize a native canvas to a level's width and encode it."""
+        img_w, img_h = img.size
+        if img_w != target_w and img_w > 0:
+            with timer.stage("resize"):
                 scale = target_w / img_w
                 new_h = int(img_h * scale)
                 img = img.resize((target_w, new_h), resample=Image.Resampling.NEAREST)
 
+        with timer.stage("encode"):
             out = io.BytesIO()
-            img.save(out, format="WEBP", lossless=True)
-            out.seek(0)
+            if image_format == "WEBP":
+                img.save(out, format="WEBP", lossless=True)
+            else:
+                img.save(out, format=image_format)
+            return out.getvalue()
+
+    async def render_map_async(
+        self,
+        map_data: Dict[str, Any],
+        level: str = "full",
+        use_cache: bool = True,
+        weather: str = CLEAR,
+    ) -> Tuple[bool, io.BytesIO]:
+        """Run render_map on the render thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(
+                self.render_map,
+                map_data,
+                level=level,
+                use_cache=use_cache,
+                weather=weather,
+            ),
+        )
 
-            return False, out
+    def render_animation(
+        self,
+        map_data: Dict[str, Any],
+        level: str = "full",
+        use_cache: bool = True,
+        timer: Optional[StageTimer] = None,
+        weather: str = CLEAR,
+        image_format: str = ANIMATION_FORMAT,
+    ) -> Tuple[bool, io.BytesIO]:
+        """Render an animated preview that plays every sprite's GIF frames.
+
+        The static render (shared with render_map through the base cache)
+        is the first frame; later frames only recomposite the cells animated
+        sprites touch.
+
+        Args:
+            map_data: Parsed map data from the repository.
+            level: Pyramid level to encode ("native", "thumbnail" or "full").
+            use_cache: If False, bypass the image cache entirely.
+            timer: Optional StageTimer that receives per-stage durations.
+            weather: Terrain layer to draw (one of WEATHERS).
+            image_format: "GIF" or "WEBP".
+
+        Returns:
+            Tuple of (served from cache, encoded animation).
+        """
+        if image_format not in ("GIF", "WEBP"):
+            raise ValueError(f"Unknown animation format: {image_format}")
+        target_w = self.level_width(map_data, level)
+        map_id = map_data.get("id", 0)
+        cache_key = (map_id, map_data_version(map_data), weather)
+        animation_key = (*cache_key, "animated", image_format, level)
+
+        if use_cache:
+            cached = self.image_cache.get(animation_key)
+            BotStats().record_cache_event("image", hit=cached is not None)
+            if cached is not None:
+                return True, io.BytesIO(cached)
+
+        if timer is None:
+            timer = StageTimer()
+
+        start_time = time.time()
+        try:
+            width = map_data["size_w"]
+            height = map_data["size_h"]
+            with timer.stage("convert"):
+                terrain_ids = terrain_grid(map_data)
+            indices, visible = self._plan(terrain_ids, timer)
+            units = map_data.get("unit", [])
+
+            base = self.image_cache.get((*cache_key, "base")) if use_cache else None
+            if base is None:
+                base = self._draw(
+                    indices, visible, units, width, height, timer, weather
+                )
+                if use_cache:
+                    self.image_cache.put(
+                        (*cache_key, "base"), base, base.width * base.height * 4
+                    )
+            static = np.asarray(base)
+
+            dirty, durations, patches = self._animate(
+                indices, visible, units, width, height, weather
+            )
+            data = self._encode_animation(
+                static, dirty, durations, patches, target_w, image_format, timer
+            )
+            if use_cache:
+                self.image_cache.put(animation_key, data, len(data))
+
+            return False, io.BytesIO(data)
         finally:
-            map_id = map_data.get("id", 0)
-            BotStats().record_render(time.time() - start_time, map_id)
+            self._record_render(time.time() - start_time, map_id, timer)
 
-    def _render(
+    async def render_animation_async(
         self,
-        terrain_ids: np.ndarray,
-        units: list[dict],
-        width: int,
-        height: int,
-    ) -> Image.Image:
-        """Render map using vectorized numpy operations for the base layer."""
+        map_data: Dict[str, Any],
+        level: str = "full",
+        use_cache: bool = True,
+        weather: str = CLEAR,
+        image_format: str = ANIMATION_FORMAT,
+    ) -> Tuple[bool, io.BytesIO]:
+        """Run render_animation on the render thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(
+                self.render_animation,
+                map_data,
+                level=level,
+                use_cache=use_cache,
+                weather=weather,
+                image_format=image_format,
+            ),
+        )
 
-        unique_ids = np.unique(terrain_ids)
-        lut = np.zeros((len(unique_ids), TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
-        complex_sprite_cache = {}
-        property_sprite_cache = {}
-
-        plain_arr = self._plain_sprite
-
-        for i, tid in enumerate(unique_ids):
-            sprite_arr, sprite_name = self._get_sprite_for_terrain(tid)
-
-            if tid in PROPERTY_IDS:
-                lut[i] = plain_arr
-                sprite_img = self._get_sprite_image(sprite_name)
-                if sprite_img:
-                    h, w = sprite_img.height, sprite_img.width
-                    if h > TILE_SIZE:
-                        comp = Image.new("RGBA", (w, h))
-                        if self._plain_image:
-                            comp.paste(self._plain_image, (0, h - TILE_SIZE))
-                        comp.alpha_composite(sprite_img)
-                        property_sprite_cache[tid] = comp
-                    else:
-                        property_sprite_cache[tid] = sprite_img
-                continue
+    def render_diff(
+        self,
+        old_data: Dict[str, Any],
+        new_data: Dict[str, Any],
+        level: str = "full",
+        use_cache: bool = True,
+        timer: Optional[StageTimer] = None,
+        weather: str = CLEAR,
+    ) -> Tuple[bool, io.BytesIO]:
+        """Render new_data with the tiles that differ from old_data highlighted.
+
+        The new map's cached base canvas supplies every tile; unchanged ones
+        are dimmed and changed areas outlined. Tiles only the old map has
+        (when it was larger) get a translucent fill of the outline color.
+
+        Args:
+            old_data: Parsed map data to compare against.
+            new_data: Parsed map data to draw.
+            level: Pyramid level to encode ("native", "thumbnail" or "full").
+            use_cache: If False, bypass the image cache entirely.
+            timer: Optional StageTimer that receives per-stage durations.
+            weather: Terrain layer to draw (one of WEATHERS).
+
+        Returns:
+            Tuple of (served from cache, encoded WEBP image).
+        """
+        new_key = (new_data.get("id", 0), map_data_version(new_data), weather)
+        diff_key = (
+            old_data.get("id", 0),
+            map_data_version(old_data),
+            *new_key,
+            "diff",
+            level,
+        )
+
+        if use_cache:
+            cached = self.image_cache.get(diff_key)
+            BotStats().record_cache_event("image", hit=cached is not None)
+            if cached is not None:
+                return True, io.BytesIO(cached)
+
+        if timer is None:
+            timer = StageTimer()
 
-            h, w, c = sprite_arr.shape
-
-            # Ensure sprite is RGBA for LUT
-            final_sprite_arr = sprite_arr
-            if c == 3:
-                alpha_channel = np.full((h, w, 1), 255, dtype=np.uint8)
-                final_sprite_arr = np.concatenate([sprite_arr, alpha_channel], axis=2)
-
-            if h == TILE_SIZE and w == TILE_SIZE:
-                if np.any(final_sprite_arr[:, :, 3] < 255):
-                    alpha = (final_sprite_arr[:, :, 3] / 255.0)[:, :, np.newaxis]
-                    comp_rgb = final_sprite_arr[:, :, :3] * alpha + plain_arr[
-                        :, :, :3
-                    ] * (1.0 - alpha)
-                    lut[i] = np.dstack(
-                        [
-                            comp_rgb.astype(np.uint8),
-                            np.full((h, w), 255, dtype=np.uint8),
-                        ]
+        start_time = time.time()
+        try:
+            with timer.stage("diff"):
+                changed = changed_tiles(old_data, new_data)
+
+            base = self.image_cache.get((*new_key, "base")) if use_cache else None
+            if base is None:
+                base = self._render_base(new_data, timer, weather)
+                if use_cache:
+                    self.image_cache.put(
+                        (*new_key, "base"), base, base.width * base.height * 4
                     )
-                else:
-                    lut[i] = final_sprite_arr
-            else:
-                lut[i] = plain_arr
-                sprite_img = self._get_sprite_image(sprite_name)
-                if sprite_img:
-                    if h > TILE_SIZE:
-                        comp = Image.new("RGBA", (w, h))
-                        if self._plain_image:
-                            comp.paste(self._plain_image, (0, h - TILE_SIZE))
-                        comp.alpha_composite(sprite_img)
-                        complex_sprite_cache[tid] = comp
-                    else:
-                        complex_sprite_cache[tid] = sprite_img
 
-        max_id = unique_ids.max() if len(unique_ids) > 0 else 0
-        mapper = np.zeros(max_id + 1, dtype=int)
-        mapper[unique_ids] = np.arange(len(unique_ids))
-        indices = mapper[terrain_ids]
+            with timer.stage("diff"):
+                canvas = self._highlight_changes(
+                    np.asarray(base), changed, new_data["size_w"], new_data["size_h"]
+                )
+            # The diff spans both maps, which may be wider than the new one
+            target_w = self.level_width({"size_w": changed.shape[1]}, level)
+            data = self._encode_level(Image.fromarray(canvas), target_w, timer)
+            if use_cache:
+                self.image_cache.put(diff_key, data, len(data))
+
+            return False, io.BytesIO(data)
+        finally:
+            self._record_render(time.time() - start_time, new_key[0], timer)
 
-        grid = lut[indices]
-        base_layer_arr = grid.transpose(0, 2, 1, 3, 4).reshape(
-            height * TILE_SIZE, width * TILE_SIZE, 4
+    async def render_diff_async(
+        self,
+        old_data: Dict[str, Any],
+        new_data: Dict[str, Any],
+        level: str = "full",
+        use_cache: bool = True,
+        weather: str = CLEAR,
+    ) -> Tuple[bool, io.BytesIO]:
+        """Run render_diff on the render thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(
+                self.render_diff,
+                old_data,
+                new_data,
+                level=level,
+                use_cache=use_cache,
+                weather=weather,
+            ),
         )
 
-        canvas_width = width * TILE_SIZE
-        canvas_height = height * TILE_SIZE + MAX_PROP_EXTENSION
-        output = Image.new("RGBA", (canvas_width, canvas_height), (0, 0, 0, 0))
-        base_layer_img = Image.fromarray(base_layer_arr, "RGBA")
-        output.paste(base_layer_img, (0, MAX_PROP_EXTENSION))
-
-        paste = output.paste
-        if complex_sprite_cache:
-            for tid, sprite in complex_sprite_cache.items():
-                ys, xs = np.where(terrain_ids == tid)
-                for y, x in zip(ys, xs):
-                    px = x * TILE_SIZE
-                    py = y * TILE_SIZE + MAX_PROP_EXTENSION
-                    paste_y = py - (sprite.height - TILE_SIZE)
-                    paste(sprite, (px, paste_y), mask=sprite)
-
-        # Correct seas after base rendering
-        sea_ys, sea_xs = np.where(terrain_ids == SEA_ID)
-        for y, x in zip(sea_ys, sea_xs):
-            sprite_name = self._get_sea_sprite_name(x, y, terrain_ids)
-            sprite_img = self._get_sprite_image(sprite_name)
-            if sprite_img:
-                px = x * TILE_SIZE
-                py = y * TILE_SIZE + MAX_PROP_EXTENSION
-                paste(sprite_img, (px, py), mask=sprite_img)
-
-        # Correct shoals after base rendering
-        shoal_ys, shoal_xs = np.where(np.isin(terrain_ids, list(SHOAL_IDS)))
-
-        for y, x in zip(shoal_ys, shoal_xs):
-            sprite_name = self._get_shoal_sprite_name(x, y, terrain_ids)
-            sprite_img = self._get_sprite_image(sprite_name)
-            if sprite_img:
-                px = x * TILE_SIZE
-                py = y * TILE_SIZE + MAX_PROP_EXTENSION
-                # We need to paste the plain sprite underneath first for transparency
-                if self._plain_image:
-                    output.paste(self._plain_image, (px, py))
-                paste(sprite_img, (px, py), mask=sprite_img)
-
-        # Draw properties on top of terrain and shoals
-        if property_sprite_cache:
-            for tid, sprite in property_sprite_cache.items():
-                ys, xs = np.where(terrain_ids == tid)
-                for y, x in zip(ys, xs):
-                    px = x * TILE_SIZE
-                    py = y * TILE_SIZE + MAX_PROP_EXTENSION
+    def _highlight_changes(
+        self, base: np.ndarray, changed: np.ndarray, width: int, height: int
+    ) -> np.ndarray:
+        """Dim the unchanged tiles of a base canvas and outline the changed ones.
 
-                    # For standard size props, paste plains first for transparency
-                    # Tall props have plains pre-composited.
-                    if sprite.height == TILE_SIZE and self._plain_image:
-                        output.paste(self._plain_image, (px, py))
+        changed covers both maps, so it can be larger than the width x height
+        base canvas; the canvas grows to match.
+        """
+        diff_h, diff_w = changed.shape
+        padded = np.zeros(
+            (PAD_TOP + diff_h * TILE_SIZE, diff_w * TILE_SIZE, 4), dtype=np.uint8
+        )
+        top = PAD_TOP - MAX_PROP_EXTENSION
+        padded[top : top + base.shape[0], : base.shape[1]] = base
+        view = cells(padded, diff_h, diff_w)
+
+        # Tall sprites in the margin belong to the row below
+        dim = np.concatenate([~changed[:1], ~changed])
+        ys, xs = np.nonzero(dim)
+        view[ys, :, xs, :, :3] = view[ys, :, xs, :, :3] * DIFF_DIM
+
+        removed = changed.copy()
+        removed[:height, :width] = False
+        ys, xs = np.nonzero(removed)
+        view[ys + 1, :, xs] = [*DIFF_COLOR[:3], DIFF_COLOR[3] // 3]
+
+        # Outline the edges of changed areas, not every changed tile
+        outside = ~np.pad(changed, 1)
+        edges = (
+            (outside[:-2, 1:-1], np.s_[:DIFF_OUTLINE], np.s_[:]),
+            (outside[2:, 1:-1], np.s_[-DIFF_OUTLINE:], np.s_[:]),
+            (outside[1:-1, :-2], np.s_[:], np.s_[:DIFF_OUTLINE]),
+            (outside[1:-1, 2:], np.s_[:], np.s_[-DIFF_OUTLINE:]),
+        )
+        for neighbor_unchanged, rows, columns in edges:
+            ys, xs = np.nonzero(changed & neighbor_unchanged)
+            view[ys + 1, rows, xs, columns] = DIFF_COLOR
 
-                    paste_y = py - (sprite.height - TILE_SIZE)
-                    paste(sprite, (px, paste_y), mask=sprite)
+        return padded[top:]
 
+    def _render_base(
+        self, map_data: Dict[str, Any], timer: StageTimer, weather: str = CLEAR
+    ) -> Image.Image:
+        """Render the native 1x canvas that all pyramid levels derive from."""
+        width = map_data["size_w"]
+        height = map_data["size_h"]
+
+        with timer.stage("convert"):
+            terrain_ids = terrain_grid(map_data)
+
+        return self._render(
+            terrain_ids, map_data.get("unit", []), width, height, timer, weather
+        )
+
+    def _plan(
+        self, terrain_ids: np.ndarray, timer: StageTimer
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Tile table row and overhang visibility of every map tile.
+
+        Both only depend on the terrain, so they hold for every weather and
+        animation frame.
+        """
+        with timer.stage("autotile"):
+            indices = tile_indices(terrain_ids, self.autotiles)
+            if (indices == FALLBACK_TILE).any():
+                unknown = np.unique(terrain_ids[indices == FALLBACK_TILE])
+                logger.warning(f"No sprite for terrain IDs: {unknown.tolist()}")
+            visible = overhang_visible(terrain_ids, self.autotiles)
+        return indices, visible
+
+    def _unit_placements(
+        self, units: list[dict], width: int, height: int
+    ) -> list[Tuple[str, int, int]]:
+        """(sprite name, x, y) of every unit and HP sprite, in paste order."""
+        placements = []
         for unit in units:
             x, y = unit.get("x", -1), unit.get("y", -1)
             if not (0 <= x < width and 0 <= y < height):
@@ -404,7 +598,7 @@ class AW2Renderer:
                         if unit_sprite.height > TILE_SIZE
                         else py
                     )
-                    paste(unit_sprite, (px, paste_y), mask=unit_sprite)
+                    placements.append((sprite_name, px, paste_y))
 
                     hp = int(unit.get("hp", 10))
                     if 1 <= hp <= 9:
@@ -413,5 +607,267 @@ class AW2Renderer:
                             hp_w, hp_h = hp_sprite.size
                             hp_x = px + TILE_SIZE - hp_w
                             hp_y = py + TILE_SIZE - hp_h
-                            paste(hp_sprite, (hp_x, hp_y), mask=hp_sprite)
+                            placements.append((str(hp), hp_x, hp_y))
+        return placements
+
+    def _animate(
+        self,
+        indices: np.ndarray,
+        visible: np.ndarray,
+        units: list[dict],
+        width: int,
+        height: int,
+        weather: str = CLEAR,
+    ) -> Tuple[Tuple[np.ndarray, np.ndarray], list[int], Iterator]:
+        """Plan an animation and recomposite its dirty cells frame by frame.
+
+        Returns the dirty cells (rows, columns; see aw2_animation.cells),
+        the frame durations in milliseconds, and an iterator over the dirty
+        cells' pixels for each frame (None where the frame is the static
+        render).
+        """
+        placements = self._unit_placements(units, width, height)
+        unit_frames = {}
+        for name, _, _ in placements:
+            if name not in unit_frames:
+                unit_frames[name] = np.stack(
+                    [
+                        self.atlas.get_frame(name, frame)
+                        for frame in range(max(len(self.atlas.animation(name)), 1))
+                    ]
+                )
+        unit_animations = {
+            name: self.atlas.animation(name)
+            for name, frames in unit_frames.items()
+            if len(frames) > 1
+        }
+
+        # Terrain sprites only count if they change a tile this map uses
+        used_rows = np.unique(indices)
+        terrain_rows = {
+            name: np.intersect1d(self.atlas.animated_rows(name, weather), used_rows)
+            for name in self.atlas.terrain_animations(weather)
+        }
+        terrain_rows = {name: rows for name, rows in terrain_rows.items() if len(rows)}
+
+        dirty = np.zeros((height + 1, width), dtype=bool)
+        if terrain_rows:
+            animated = np.isin(indices, np.concatenate(list(terrain_rows.values())))
+            dirty[1:] |= animated
+            # Their overhangs reach into the cell above
+            dirty[:-1] |= animated & visible
+        for name, x, y in placements:
+            if name in unit_animations:
+                h, w = unit_frames[name].shape[1:3]
+                dirty[footprint(x, y, w, h, height, width)] = True
+
+        # Everything drawn over a dirty cell is drawn again
+        redraw = []
+        for name, x, y in placements:
+            h, w = unit_frames[name].shape[1:3]
+            if dirty[footprint(x, y, w, h, height, width)].any():
+                redraw.append((name, x, y + PAD_TOP - MAX_PROP_EXTENSION))
+
+        animations = {
+            **{name: self.atlas.animation(name, weather) for name in terrain_rows},
+            **unit_animations,
+        }
+        frames = timeline(animations)
+        durations = [duration for _, duration in frames]
+        ys, xs = np.nonzero(dirty)
+
+        def patches() -> Iterator[Optional[np.ndarray]]:
+            work = np.zeros(
+                (PAD_TOP + height * TILE_SIZE, width * TILE_SIZE, 4), dtype=np.uint8
+            )
+            view = cells(work, height, width)
+            sprites = SpriteBatches(redraw, unit_frames, work.shape[:2])
+            on_map = ys > 0
+            map_ys, map_xs = ys[on_map], xs[on_map]
+            margin_xs = xs[~on_map]
+            # Dirty cells above a tile with a visible overhang
+            below = (ys < height) & visible[np.minimum(ys, height - 1), xs]
+            over_ys, over_xs = ys[below], xs[below]
+            frame_tables = {}
+
+            for start, _ in frames:
+                frame_of = frames_at(animations, start)
+                if not any(frame_of.values()):
+                    yield None
+                    continue
+
+                terrain_frames = {name: frame_of[name] for name in terrain_rows}
+                tables_key = tuple(terrain_frames.values())
+                if tables_key not in frame_tables:
+                    frame_tables[tables_key] = (
+                        self._layer_tables(
+                            self.atlas.frame_autotiles(weather, terrain_frames)
+                        )
+                        if any(tables_key)
+                        else self._get_weather_tables(weather)
+                    )
+                tiles, overhangs, has_overhang = frame_tables[tables_key]
+
+                view[map_ys, :, map_xs] = tiles[indices[map_ys - 1, map_xs]]
+                view[0, :, margin_xs] = 0
+                rows = indices[over_ys, over_xs]
+                shown = has_overhang[rows]
+                oy, ox = over_ys[shown], over_xs[shown]
+                if len(oy):
+                    view[oy, TILE_SIZE - OVERHANG :, ox] = blend_over(
+                        view[oy, TILE_SIZE - OVERHANG :, ox], overhangs[rows[shown]]
+                    )
+                sprites.paste(work, frame_of)
+                yield view[ys, :, xs]
+
+        return (ys, xs), durations, patches()
+
+    def _encode_animation(
+        self,
+        static: np.ndarray,
+        dirty: Tuple[np.ndarray, np.ndarray],
+        durations: list[int],
+        patches: Iterator[Optional[np.ndarray]],
+        target_w: int,
+        image_format: str,
+        timer: StageTimer,
+    ) -> bytes:
+        """Assemble each frame from the static canvas and encode them.
+
+        Frames are built as the encoder consumes them, so only the encoder
+        holds on to (the changed parts of) earlier frames. GIF output keeps
+        every frame's dirty cells first to build its palette from.
+        """
+        ys, xs = dirty
+        img_h, img_w = static.shape[:2]
+        height = (img_h - MAX_PROP_EXTENSION) // TILE_SIZE
+        width = img_w // TILE_SIZE
+        palette = None
+        if image_format == "GIF":
+            # One palette for all frames, so every frame's colors come first
+            with timer.stage("animate"):
+                patches = list(patches)
+                palette = Palette(
+                    [static] + [patch for patch in patches if patch is not None]
+                )
+            patches = iter(patches)
+
+        def to_image(frame: np.ndarray) -> Image.Image:
+            if palette is not None:
+                image = Image.fromarray(frame, "P")
+                image.putpalette(palette.palette.tobytes())
+            else:
+                image = Image.fromarray(frame, "RGBA")
+            if img_w != target_w and img_w > 0:
+                with timer.stage("resize"):
+                    new_h = int(img_h * (target_w / img_w))
+                    image = image.resize(
+                        (target_w, new_h), resample=Image.Resampling.NEAREST
+                    )
+            else:
+                # fromarray shares the canvas that later frames are patched
+                # into, and the WebP encoder only reads frames once all are in
+                image = image.copy()
+            return image
+
+        with timer.stage("animate"):
+            if palette is not None:
+                static = palette.index(static)
+            padded = padded_canvas(static)
+            first = to_image(static)
+
+        # Frames are built while the encoder runs; that time isn't encoding
+        building = 0.0
+
+        def later_frames() -> Iterator[Image.Image]:
+            nonlocal building
+            for _ in durations[1:]:
+                start = time.perf_counter()
+                with timer.stage("animate"):
+                    patch = next(patches)
+                    if patch is None:
+                        frame = static
+                    else:
+                        if palette is not None:
+                            patch = palette.index(patch)
+                        cells(padded, height, width)[ys, :, xs] = patch
+                        frame = padded[PAD_TOP - MAX_PROP_EXTENSION :]
+                image = to_image(frame)
+                building += time.perf_counter() - start
+                yield image
+
+        # The first frame is the static render itself
+        with timer.stage("animate"):
+            next(patches)
+        start = time.perf_counter()
+        out = io.BytesIO()
+        options = {"save_all": True, "append_images": later_frames(), "loop": 0}
+        if len(durations) > 1:
+            options["duration"] = durations
+        if palette is not None:
+            first.save(
+                out,
+                format="GIF",
+                transparency=TRANSPARENT_INDEX,
+                disposal=1,
+                optimize=False,
+                **options,
+            )
+        else:
+            # Lossless WebP's slower methods barely shrink pixel art
+            first.save(out, format="WEBP", lossless=True, method=0, **options)
+        timer.add("encode", time.perf_counter() - start - building)
+        return out.getvalue()
+
+    def _render(
+        self,
+        terrain_ids: np.ndarray,
+        units: list[dict],
+        width: int,
+        height: int,
+        timer: StageTimer,
+        weather: str = CLEAR,
+    ) -> Image.Image:
+        """Render map using vectorized numpy operations for the base layer."""
+        indices, visible = self._plan(terrain_ids, timer)
+        return self._draw(indices, visible, units, width, height, timer, weather)
+
+    def _draw(
+        self,
+        indices: np.ndarray,
+        visible: np.ndarray,
+        units: list[dict],
+        width: int,
+        height: int,
+        timer: StageTimer,
+        weather: str = CLEAR,
+    ) -> Image.Image:
+        """Draw the tiles, overhangs and units of a planned map."""
+        tiles, overhangs, has_overhang = self._get_weather_tables(weather)
+
+        with timer.stage("compose"):
+            grid = tiles[indices]
+            canvas = np.zeros(
+                (height * TILE_SIZE + MAX_PROP_EXTENSION, width * TILE_SIZE, 4),
+                dtype=np.uint8,
+            )
+            canvas[MAX_PROP_EXTENSION:] = grid.transpose(0, 2, 1, 3, 4).reshape(
+                height * TILE_SIZE, width * TILE_SIZE, 4
+            )
+
+        with timer.stage("overhangs"):
+            # Tops of mountains and properties, drawn over the tile above
+            ys, xs = np.nonzero(visible & has_overhang[indices])
+            if len(ys):
+                slots = overhang_slots(canvas, height, width)
+                slots[ys, :, xs] = blend_over(
+                    slots[ys, :, xs], overhangs[indices[ys, xs]]
+                )
+            output = Image.fromarray(canvas, "RGBA")
+            paste = output.paste
+
+        with timer.stage("units"):
+            for sprite_name, x, y in self._unit_placements(units, width, height):
+                sprite = self._sprite_image_cache[sprite_name]
+                paste(sprite, (x, y), mask=sprite)
         return output
@@ -36,37 +36,41 @@ class AWBWClient:
         Fetches map data from AWBW with rate limiting.
         """
         session = await self.get_session()
+        stats = BotStats()
 
-        async with self._limiter:
-            start_time = time.time()
-            try:
-                logger.info(f"Fetching map {map_id} from AWBW...")
-                async with session.get(
-                    self.MAPS_API, params={"maps_id": map_id}
-                ) as response:
-                    if response.status != 200:
-                        raise ConnectionError(
-                            f"AWBW API returned status {response.status}"
-                        )
+        stats.api_queue_depth += 1
+        try:
+            await self._limiter.acquire()
+        finally:
+            stats.api_queue_depth -= 1
 
-                    try:
-                        data = await response.json()
-                    except aiohttp.ContentTypeError:
-                        text = await response.text()
-                        raise ConnectionError(
-                            f"AWBW API returned invalid JSON: {text[:100]}..."
-                        )
+        start_time = time.time()
+        try:
+            logger.info(f"Fetching map {map_id} from AWBW...")
+            async with session.get(
+                self.MAPS_API, params={"maps_id": map_id}
+            ) as response:
+                if response.status != 200:
+                    raise ConnectionError(f"AWBW API returned status {response.status}")
 
-                    if data.get("err"):
-                        raise ValueError(data.get("message", "Unknown API Error"))
+                try:
+                    data = await response.json()
+                except aiohttp.ContentTypeError:
+                    text = await response.text()
+                    raise ConnectionError(
+                        f"AWBW API returned invalid JSON: {text[:100]}..."
+                    )
 
-                    # Basic validation that it looks like a map
-                    if "Terrain Map" not in data:
-                        raise ValueError("Response does not contain Terrain Map data")
+                if data.get("err"):
+                    raise ValueError(data.get("message", "Unknown API Error"))
 
-                    return data
-            except aiohttp.ClientError as e:
-                logger.error(f"Network error fetching map {map_id}: {e}")
-                raise
-            finally:
-                BotStats().record_api_request(time.time() - start_time)
+                # Basic validation that it looks like a map
+                if "Terrain Map" not in data:
+                    raise ValueError("Response does not contain Terrain Map data")
+
+                return data
+        except aiohttp.ClientError as e:
+            logger.error(f"Network error fetching map {map_id}: {e}")
+            raise
+        finally:
+            stats.record_api_request(time.time() - start_time)
@@ -0,0 +1,120 @@
+"""Event loop lag sampler and slow-callback detector.
+
+Periodically sleeps for a fixed interval and records how much later than
+requested the loop woke up. Sustained lag means something is blocking the
+event loop (rendering, SQLite, atlas builds, ...).
+
+A watchdog thread notices when the loop is stuck past the slow-callback
+threshold and snapshots the loop thread's stack, so the stall can be
+attributed to the command or listener (e.g. /map, on_message) and the
+innermost bot function that was running at the time.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+from types import FrameType
+from typing import Callable, Dict, Optional, Tuple
+
+from src.core.stats import BotStats
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = str(Path(__file__).resolve().parent.parent)
+UNKNOWN = "unknown"
+
+
+class LoopMonitor:
+    """Samples event loop lag and attributes stalls to the blocking code."""
+
+    def __init__(self, interval: float = 0.5, slow_threshold: float = 0.25):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._deadline = 0.0
+        self._stall: Optional[Tuple[str, str]] = None
+        self._labels: Dict[object, str] = {}
+
+    def register(self, func: Callable, label: str):
+        """Attribute stalls inside func (a command or listener) to label."""
+        func = getattr(func, "__func__", func)
+        code = getattr(func, "__code__", None)
+        if code is not None:
+            self._labels[code] = label
+
+    def start(self):
+        """Start sampling on the running event loop."""
+        if self._task is None or self._task.done():
+            self._loop_thread_id = threading.get_ident()
+            self._deadline = time.monotonic() + self.interval
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._stop_event.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stats = BotStats()
+        while True:
+            start = loop.time()
+            self._deadline = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            stats.record_loop_lag(lag)
+
+            if lag >= self.slow_threshold:
+                label, location = self._stall or (UNKNOWN, UNKNOWN)
+                stats.record_slow_callback(label, location, lag)
+                logger.warning(
+                    f"Event loop blocked for {lag * 1000:.0f} ms by {label} ({location})"
+                )
+            self._stall = None
+
+    def _watch(self):
+        """Watchdog thread: snapshot the loop thread while it is stuck."""
+        poll = max(0.01, self.slow_threshold / 4)
+        while not self._stop_event.wait(poll):
+            overdue = time.monotonic() - self._deadline
+            if overdue < self.slow_threshold or self._stall is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._stall = self._describe(frame)
+
+    def _describe(self, frame: Optional[FrameType]) -> Tuple[str, str]:
+        """Return (command/listener label, innermost bot code location)."""
+        label = None
+        location = None
+        while frame is not None:
+            code = frame.f_code
+            if location is None and code.co_filename.startswith(SRC_DIR):
+                filename = Path(code.co_filename).relative_to(SRC_DIR)
+                location = f"{filename}:{frame.f_lineno} in {code.co_qualname}"
+            label = self._labels.get(code)
+            if label is not None:
+                break
+            frame = frame.f_back
+
+        if label is None:
+            label = location.rsplit(" in ", 1)[-1] if location else UNKNOWN
+        return label, location or UNKNOWN
@@ -0,0 +1,161 @@
+"""Prometheus-style metrics endpoint.
+
+Serves the BotStats telemetry in the Prometheus text exposition format on a
+local HTTP port so it can be scraped and alerted on without Discord.
+"""
+
+import logging
+import time
+from typing import Optional
+
+from aiohttp import web
+
+from src.core.stats import BotStats, Histogram
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "battlemaps"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+class _Writer:
+    """Accumulates metric families in exposition format."""
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        self.lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    def sample(self, name: str, value: float, **labels):
+        self.lines.append(f"{PREFIX}_{name}{_labels(labels)} {value}")
+
+    def summary(self, name: str, histogram: Histogram, **labels):
+        for quantile in QUANTILES:
+            self.sample(
+                name,
+                histogram.percentile(quantile * 100),
+                **labels,
+                quantile=quantile,
+            )
+        self.sample(f"{name}_sum", histogram.total, **labels)
+        self.sample(f"{name}_count", histogram.count, **labels)
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics(stats: BotStats) -> str:
+    """Render all BotStats telemetry as Prometheus text."""
+    out = _Writer()
+
+    out.family("uptime_seconds", "gauge", "Seconds since the bot started.")
+    out.sample("uptime_seconds", round(time.time() - stats.start_time, 3))
+
+    out.family(
+        "api_request_seconds", "summary", "Latency of AWBW API requests in seconds."
+    )
+    out.summary("api_request_seconds", stats.api_latency)
+
+    out.family("api_queue_depth", "gauge", "Requests waiting on the AWBW rate limiter.")
+    out.sample("api_queue_depth", stats.api_queue_depth)
+
+    out.family("renders_total", "counter", "Map renders that missed the cache.")
+    out.sample("renders_total", stats.render_count)
+
+    out.family(
+        "stage_seconds",
+        "summary",
+        "Duration of request phases and render pipeline stages in seconds.",
+    )
+    for stage, histogram in sorted(stats.get_stage_histograms().items()):
+        out.summary("stage_seconds", histogram, stage=stage)
+
+    out.family("cache_requests_total", "counter", "Cache lookups by cache and result.")
+    for cache, counts in stats.get_cache_event_stats().items():
+        out.sample("cache_requests_total", counts["hits"], cache=cache, result="hit")
+        out.sample("cache_requests_total", counts["misses"], cache=cache, result="miss")
+
+    previews = stats.get_preview_stats()
+    out.family(
+        "messages_total",
+        "counter",
+        "Messages seen by the link listener, by how far they got.",
+    )
+    out.sample("messages_total", previews["scanned"], stage="scanned")
+    out.sample("messages_total", previews["regex_checked"], stage="regex_checked")
+    out.sample("messages_total", previews["matched"], stage="matched")
+    out.family(
+        "auto_previews_in_progress", "gauge", "Link auto-previews being generated."
+    )
+    out.sample("auto_previews_in_progress", previews["active"])
+    out.family(
+        "auto_previews_deferred_total",
+        "counter",
+        "Link auto-previews that waited for a free slot.",
+    )
+    out.sample("auto_previews_deferred_total", previews["deferred"])
+    out.family(
+        "auto_previews_dropped_total",
+        "counter",
+        "Maps skipped by auto-preview throttling, by reason.",
+    )
+    for reason, count in previews["dropped"].items():
+        out.sample("auto_previews_dropped_total", count, reason=reason)
+
+    out.family(
+        "event_loop_lag_seconds",
+        "summary",
+        "How late the event loop woke up from a timed sleep, in seconds.",
+    )
+    out.summary("event_loop_lag_seconds", stats.loop_lag)
+
+    out.family(
+        "slow_callbacks_total",
+        "counter",
+        "Event loop stalls past the slow-callback threshold, by culprit.",
+    )
+    for label, count in sorted(stats.slow_callback_counts.items()):
+        out.sample("slow_callbacks_total", count, label=label)
+
+    return out.render()
+
+
+class MetricsServer:
+    """Minimal aiohttp server exposing /metrics."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9108):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(
+            f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics"
+        )
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=render_metrics(BotStats()).encode(),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
@@ -0,0 +1,224 @@
+"""On-demand sampling profiler for renders on live traffic.
+
+/profile turns it on for the next N renders or N seconds. While active, a
+background thread snapshots the stacks of the renderer's thread pool every
+few milliseconds with sys._current_frames(). Renders run at full speed and
+concurrent renders are all sampled; cProfile instead instruments every call
+and can only be enabled once per interpreter.
+
+Samples are aggregated in memory per function: "self" counts the function
+at the top of the stack (time in C code, e.g. NumPy or Pillow, counts
+toward the Python function that called it) and "total" every function on
+the stack. Samples from idle pool threads are not counted.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import List, Optional, Tuple
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = str(Path(__file__).resolve().parent.parent)
+
+# Name prefix of the threads that are sampled (the renderer's pool)
+RENDER_THREAD_PREFIX = "render"
+PROFILE_INTERVAL_MS = config.metrics.get("profile_interval_ms", 5)
+# Upper bound on a profile's length, also for "next N renders"
+PROFILE_MAX_SECONDS = config.metrics.get("profile_max_seconds", 600)
+
+# (filename, first line, qualified name) of a sampled function
+Function = Tuple[str, int, str]
+
+
+def _describe(function: Function) -> str:
+    filename, line, name = function
+    if filename.startswith(SRC_DIR):
+        filename = str(Path(filename).relative_to(SRC_DIR))
+    else:
+        filename = "/".join(Path(filename).parts[-2:])
+    return f"{filename}:{line}({name})"
+
+
+class RenderProfiler:
+    """Singleton sampling profiler for the render threads."""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RenderProfiler, cls).__new__(cls)
+            cls._instance._init_profiler()
+        return cls._instance
+
+    def _init_profiler(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        # Set on the event loop that started the profile once it finishes
+        self._finished: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = None
+        self._renders_left: Optional[int] = None
+        self.running = False
+        self._reset()
+
+    def _reset(self):
+        self.self_samples: Counter[Function] = Counter()
+        self.total_samples: Counter[Function] = Counter()
+        self.samples = 0
+        self.busy_samples = 0
+        self.renders: List[Tuple[float, object]] = []
+        self.elapsed = 0.0
+
+    def start(
+        self, renders: Optional[int] = None, seconds: Optional[float] = None
+    ) -> bool:
+        """Sample until renders more renders finish or seconds pass.
+
+        Either limit may be None; profiles never run longer than
+        PROFILE_MAX_SECONDS. Returns False if a profile is already running.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self._reset()
+            self._renders_left = renders
+            self._stop_event.clear()
+            try:
+                self._finished = (asyncio.get_running_loop(), asyncio.Event())
+            except RuntimeError:
+                self._finished = None
+            limit = min(seconds or PROFILE_MAX_SECONDS, PROFILE_MAX_SECONDS)
+            self.running = True
+            self._thread = threading.Thread(
+                target=self._sample, args=(limit,), name="profiler", daemon=True
+            )
+            self._thread.start()
+        logger.info(f"Render profiling started (renders={renders}, limit={limit}s)")
+        return True
+
+    def stop(self):
+        self._stop_event.set()
+
+    def wait(self):
+        """Block until the current profile (if any) has finished."""
+        if self._thread is not None:
+            self._thread.join()
+
+    async def wait_async(self):
+        """Wait without blocking a thread until the current profile finishes.
+
+        Only for profiles started from the running event loop.
+        """
+        if self._finished is not None:
+            await self._finished[1].wait()
+
+    def record_render(self, duration: float, map_id):
+        """Count a finished render; called by the renderer after every render."""
+        if not self.running:
+            return
+        with self._lock:
+            self.renders.append((duration, map_id))
+            if self._renders_left is not None:
+                self._renders_left -= 1
+                if self._renders_left <= 0:
+                    self._stop_event.set()
+
+    def _sample(self, limit: float):
+        """Profiler thread: snapshot the render threads until stopped."""
+        interval = PROFILE_INTERVAL_MS / 1000
+        start = time.perf_counter()
+        deadline = start + limit
+        try:
+            while (
+                not self._stop_event.wait(interval) and time.perf_counter() < deadline
+            ):
+                idents = [
+                    thread.ident
+                    for thread in threading.enumerate()
+                    if thread.name.startswith(RENDER_THREAD_PREFIX)
+                ]
+                frames = sys._current_frames()
+                for ident in idents:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self._add(frame)
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self.running = False
+            logger.info(
+                f"Render profiling finished: {self.busy_samples} samples, "
+                f"{len(self.renders)} renders in {self.elapsed:.1f}s"
+            )
+            if self._finished is not None:
+                loop, finished = self._finished
+                try:
+                    loop.call_soon_threadsafe(finished.set)
+                except RuntimeError:
+                    pass  # The loop was closed, nobody is waiting
+
+    def _add(self, frame: Optional[FrameType]):
+        stack: List[Function] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_qualname))
+            frame = frame.f_back
+
+        self.samples += 1
+        # Idle pool threads wait in concurrent.futures without any bot code;
+        # busy stacks are cut at the outermost bot frame to drop the pool's
+        own = [
+            i
+            for i, (filename, _, _) in enumerate(stack)
+            if filename.startswith(SRC_DIR)
+        ]
+        if not own:
+            return
+        stack = stack[: own[-1] + 1]
+        self.busy_samples += 1
+        self.self_samples[stack[0]] += 1
+        self.total_samples.update(set(stack))
+
+    def summary(self) -> str:
+        """One-line description of the last profile."""
+        line = (
+            f"{self.elapsed:.1f}s, {self.busy_samples} samples while rendering, "
+            f"{len(self.renders)} renders"
+        )
+        if self.renders:
+            durations = [duration for duration, _ in self.renders]
+            slowest, map_id = max(self.renders, key=lambda render: render[0])
+            line += (
+                f" (mean {sum(durations) / len(durations) * 1000:.1f} ms, "
+                f"slowest {slowest * 1000:.1f} ms for map {map_id})"
+            )
+        return line
+
+    def report(self, limit: int = 50) -> str:
+        """The functions with the most self samples, as a text table."""
+        lines = [
+            f"Render profile: {self.summary()}",
+            f"Sampled threads named {RENDER_THREAD_PREFIX}* every "
+            f"{PROFILE_INTERVAL_MS} ms: {self.samples} samples, "
+            f"{self.busy_samples} while rendering",
+            "",
+            f"{'Self':>7}{'Self%':>8}{'Total':>8}{'Total%':>8}  Function",
+        ]
+        busy = max(self.busy_samples, 1)
+        for function, count in self.self_samples.most_common(limit):
+            total = self.total_samples[function]
+            lines.append(
+                f"{count:>7}{count / busy:>8.1%}{total:>8}{total / busy:>8.1%}"
+                f"  {_describe(function)}"
+            )
+
+        lines += ["", f"{'Total':>7}{'Total%':>8}  Function (by total samples)"]
+        for function, total in self.total_samples.most_common(limit):
+            lines.append(f"{total:>7}{total / busy:>8.1%}  {_describe(function)}")
+        return "\n".join(lines) + "\n"
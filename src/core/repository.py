@@ -3,15 +3,20 @@ import json
 import os
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+import aiohttp
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from src.core.awbw import AWBWClient
+from src.core.stats import BotStats
+from src.utils.map_helpers import map_data_version, summarize_map
 from src.config import config
 
 logger = logging.getLogger(__name__)
 
 CACHE_TTL_SECONDS = config.cache["ttl_seconds"]
 MAX_CACHE_SIZE_MB = config.cache["max_size_mb"]
+# Seconds to wait for the CDN when checking a stored attachment URL
+ATTACHMENT_URL_CHECK_TIMEOUT = config.cache.get("attachment_url_check_timeout", 5)
 
 
 class MapRepository:
@@ -33,6 +38,32 @@ class MapRepository:
                     updated_at TIMESTAMP
                 )
             """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS map_summaries (
+                    id INTEGER PRIMARY KEY,
+                    version TEXT,
+                    name TEXT,
+                    author TEXT,
+                    player_count INTEGER,
+                    size_w INTEGER,
+                    size_h INTEGER,
+                    total_props INTEGER,
+                    daily_income_k INTEGER,
+                    summary_json TEXT,
+                    updated_at TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS attachment_urls (
+                    map_id INTEGER,
+                    version TEXT,
+                    renderer_version TEXT,
+                    level TEXT,
+                    url TEXT,
+                    expires_at REAL,
+                    PRIMARY KEY (map_id, version, renderer_version, level)
+                )
+            """)
             conn.commit()
 
     def _get_db_size_mb(self) -> float:
@@ -59,6 +90,7 @@ class MapRepository:
 
             for map_id in old_ids:
                 conn.execute("DELETE FROM maps WHERE id = ?", (map_id,))
+                conn.execute("DELETE FROM map_summaries WHERE id = ?", (map_id,))
 
             conn.commit()
 
@@ -74,7 +106,9 @@ class MapRepository:
         except ValueError, TypeError:
             return True
 
-    def _get_from_db(self, map_id: int) -> Optional[Dict[str, Any]]:
+    def _get_from_db(
+        self, map_id: int, ignore_ttl: bool = False
+    ) -> Optional[Dict[str, Any]]:
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.execute(
@@ -83,7 +117,7 @@ class MapRepository:
                 row = cursor.fetchone()
                 if row:
                     json_data, updated_at = row
-                    if self._is_expired(updated_at):
+                    if not ignore_ttl and self._is_expired(updated_at):
                         logger.info(
                             f"Map {map_id} cache expired (older than {CACHE_TTL_SECONDS}s)"
                         )
@@ -96,16 +130,64 @@ class MapRepository:
     def _save_to_db(self, map_id: int, data: Dict[str, Any]):
         try:
             self._enforce_size_limit()
+            summary = summarize_map(data)
 
             with sqlite3.connect(self.db_path) as conn:
                 conn.execute(
                     "INSERT OR REPLACE INTO maps (id, json_data, updated_at) VALUES (?, ?, ?)",
                     (map_id, json.dumps(data), datetime.now().isoformat()),
                 )
+                self._write_summary(conn, map_id, summary)
                 conn.commit()
         except Exception as e:
             logger.error(f"DB Error saving map {map_id}: {e}")
 
+    def _write_summary(
+        self, conn: sqlite3.Connection, map_id: int, summary: Dict[str, Any]
+    ):
+        conn.execute(
+            "INSERT OR REPLACE INTO map_summaries (id, version, name, author, "
+            "player_count, size_w, size_h, total_props, daily_income_k, "
+            "summary_json, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                map_id,
+                summary["version"],
+                summary["name"],
+                summary["author"],
+                summary["player_count"],
+                summary["size_w"],
+                summary["size_h"],
+                summary["total_props"],
+                summary["daily_income_k"],
+                json.dumps(summary),
+                datetime.now().isoformat(),
+            ),
+        )
+
+    def _get_summary_from_db(
+        self, map_id: int, version: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    "SELECT summary_json, version FROM map_summaries WHERE id = ?",
+                    (map_id,),
+                )
+                row = cursor.fetchone()
+                if row and (version is None or row[1] == version):
+                    return json.loads(row[0])
+        except Exception as e:
+            logger.error(f"DB Error reading summary for map {map_id}: {e}")
+        return None
+
+    def _save_summary(self, map_id: int, summary: Dict[str, Any]):
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                self._write_summary(conn, map_id, summary)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"DB Error saving summary for map {map_id}: {e}")
+
     def _parse_map_data(self, j_map: Dict[str, Any], map_id: int) -> Dict[str, Any]:
         map_data = dict()
 
@@ -152,23 +234,187 @@ class MapRepository:
                     await loop.run_in_executor(None, self._save_to_db, map_id, data)
 
                 logger.info(f"Loaded map {map_id} from DB cache.")
+                BotStats().record_cache_event("db", hit=True)
                 return data
 
+            BotStats().record_cache_event("db", hit=False)
+
         raw_data = await self.client.get_map(map_id)
         data = self._parse_map_data(raw_data, map_id)
         await loop.run_in_executor(None, self._save_to_db, map_id, data)
 
         return data
 
+    async def get_stored_map_data(self, map_id: int) -> Optional[Dict[str, Any]]:
+        """Get the cached copy of a map even if it has expired, without fetching.
+
+        Returns None if the map was never cached.
+        """
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self._get_from_db, map_id, True)
+        if data and "size_w" not in data and "Size X" in data:
+            data = self._parse_map_data(data, map_id)
+        return data
+
+    async def get_map_summary(
+        self, map_id: int, map_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Get the precomputed statistics for a map.
+
+        Summaries are computed when map data is ingested. If map_data is
+        given, the stored summary is only used when it matches that data's
+        version; otherwise it is recomputed (e.g. for maps cached before
+        summaries existed) and stored.
+        """
+        loop = asyncio.get_running_loop()
+        version = map_data_version(map_data) if map_data is not None else None
+
+        summary = await loop.run_in_executor(
+            None, self._get_summary_from_db, map_id, version
+        )
+        if summary:
+            BotStats().record_cache_event("summary", hit=True)
+            return summary
+
+        BotStats().record_cache_event("summary", hit=False)
+        if map_data is None:
+            map_data = await self.get_map_data(map_id)
+        summary = summarize_map(map_data)
+        await loop.run_in_executor(None, self._save_summary, map_id, summary)
+        return summary
+
+    def _get_attachment_url(
+        self, key: Tuple[int, str, str, str], valid_until: float
+    ) -> Optional[Tuple[str, Optional[float]]]:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    "SELECT url, expires_at FROM attachment_urls WHERE map_id = ? "
+                    "AND version = ? AND renderer_version = ? AND level = ?",
+                    key,
+                )
+                row = cursor.fetchone()
+                if row and (row[1] is None or row[1] > valid_until):
+                    return row[0], row[1]
+        except Exception as e:
+            logger.error(f"DB Error reading attachment URL for map {key[0]}: {e}")
+        return None
+
+    def _get_latest_attachment_url(
+        self, map_id: int, valid_until: float
+    ) -> Optional[Tuple[str, Optional[float]]]:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    "SELECT url, expires_at FROM attachment_urls WHERE map_id = ? "
+                    "AND (expires_at IS NULL OR expires_at > ?) "
+                    "ORDER BY expires_at IS NULL DESC, expires_at DESC LIMIT 1",
+                    (map_id, valid_until),
+                )
+                row = cursor.fetchone()
+                if row:
+                    return row[0], row[1]
+        except Exception as e:
+            logger.error(f"DB Error reading attachment URL for map {map_id}: {e}")
+        return None
+
+    def _save_attachment_url(
+        self, key: Tuple[int, str, str, str], url: str, expires_at: Optional[float]
+    ):
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO attachment_urls (map_id, version, "
+                    "renderer_version, level, url, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, url, expires_at),
+                )
+                # Expired URLs are useless; drop them while we're here
+                conn.execute(
+                    "DELETE FROM attachment_urls WHERE expires_at < ?",
+                    (datetime.now().timestamp(),),
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"DB Error saving attachment URL for map {key[0]}: {e}")
+
+    def _delete_attachment_url(self, key: Tuple[int, str, str, str]):
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "DELETE FROM attachment_urls WHERE map_id = ? AND version = ? "
+                    "AND renderer_version = ? AND level = ?",
+                    key,
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"DB Error deleting attachment URL for map {key[0]}: {e}")
+
+    async def get_attachment_url(
+        self, key: Tuple[int, str, str, str], valid_until: float
+    ) -> Optional[Tuple[str, Optional[float]]]:
+        """Get a previously uploaded image URL that is still valid at valid_until.
+
+        key is (map id, data version, renderer version, level). Returns a
+        tuple of (url, expiry timestamp or None), or None if there is none.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self._get_attachment_url, key, valid_until
+        )
+
+    async def get_latest_attachment_url(
+        self, map_id: int, valid_until: float
+    ) -> Optional[Tuple[str, Optional[float]]]:
+        """Get the longest-lived uploaded image URL for any version of a map."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self._get_latest_attachment_url, map_id, valid_until
+        )
+
+    async def save_attachment_url(
+        self, key: Tuple[int, str, str, str], url: str, expires_at: Optional[float]
+    ):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, self._save_attachment_url, key, url, expires_at
+        )
+
+    async def forget_attachment_url(self, key: Tuple[int, str, str, str]):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._delete_attachment_url, key)
+
+    async def attachment_url_available(self, url: str) -> bool:
+        """Check that an uploaded image URL still serves the image.
+
+        Discord accepts any embed image URL without fetching it, so a
+        deleted or expired attachment would only show up as a broken image.
+        """
+        session = await self.client.get_session()
+        try:
+            async with session.head(
+                url,
+                allow_redirects=True,
+                timeout=aiohttp.ClientTimeout(total=ATTACHMENT_URL_CHECK_TIMEOUT),
+            ) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logger.warning(f"Could not check attachment URL {url}: {e}")
+            return False
+
     def clear_cache(self, map_id: Optional[int] = None):
         if map_id:
             with sqlite3.connect(self.db_path) as conn:
                 conn.execute("DELETE FROM maps WHERE id = ?", (map_id,))
+                conn.execute("DELETE FROM map_summaries WHERE id = ?", (map_id,))
+                conn.execute("DELETE FROM attachment_urls WHERE map_id = ?", (map_id,))
                 conn.commit()
             logger.info(f"Cleared cache for map {map_id}")
         else:
             with sqlite3.connect(self.db_path) as conn:
                 conn.execute("DELETE FROM maps")
+                conn.execute("DELETE FROM map_summaries")
+                conn.execute("DELETE FROM attachment_urls")
                 conn.commit()
             logger.info("Cleared all map caches")
 
@@ -176,17 +422,21 @@ class MapRepository:
         """Get cache statistics."""
         db_size = self._get_db_size_mb()
         entry_count = 0
+        summary_count = 0
 
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.execute("SELECT COUNT(*) FROM maps")
                 entry_count = cursor.fetchone()[0]
+                cursor = conn.execute("SELECT COUNT(*) FROM map_summaries")
+                summary_count = cursor.fetchone()[0]
         except Exception:
             pass
 
         return {
             "db_size_mb": round(db_size, 2),
             "entry_count": entry_count,
+            "summary_count": summary_count,
             "size_limit_mb": MAX_CACHE_SIZE_MB,
             "ttl_seconds": CACHE_TTL_SECONDS,
         }
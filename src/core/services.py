@@ -0,0 +1,197 @@
+"""Process-level container for long-lived resources.
+
+Cogs are torn down and rebuilt by /reload, so anything expensive they
+created themselves (the repository and its HTTP session, the renderer with
+its converted sprites, render pool and image cache, the response cache)
+used to be thrown away with them. The container lives in a core module,
+which extension reloads leave alone, and hands the same instances to every
+new cog.
+
+Resources are only rebuilt when something they depend on changed: the
+config sections they were built from, or the sprite atlas on disk. Core
+modules that read config into constants at import time are re-imported
+before rebuilding so the new values take effect.
+"""
+
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from src.config import config
+from src.core import repository
+from src.core.image_cache import ImageCache
+
+if TYPE_CHECKING:
+    from src.core.aw2_renderer import AW2Renderer
+
+logger = logging.getLogger(__name__)
+
+# config.cache keys read by MapRepository
+REPOSITORY_CACHE_KEYS = (
+    "db_path",
+    "ttl_seconds",
+    "max_size_mb",
+    "attachment_url_check_timeout",
+)
+
+
+def _fingerprint(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def _atlas_fingerprint() -> str:
+    """Identify the atlas file on disk by path, size and modification time."""
+    path = Path(config.renderer.get("atlas_path", ""))
+    try:
+        stat = path.stat()
+    except OSError:
+        return _fingerprint(str(path), None)
+    return _fingerprint(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+class Services:
+    """Singleton holding the repository, renderer and response cache."""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Services, cls).__new__(cls)
+            cls._instance._init_services()
+        return cls._instance
+
+    def _init_services(self):
+        self._repository: Optional["repository.MapRepository"] = None
+        self._renderer: Optional["AW2Renderer"] = None
+        self._response_cache: Optional[ImageCache] = None
+        self._renderer_lock = threading.Lock()
+        # Config (and atlas) each resource and its modules were loaded with,
+        # to detect changes on refresh
+        self._built_from: Dict[str, str] = {
+            "repository": self._repository_key(),
+            "renderer": self._renderer_key(),
+            "response_cache": self._response_cache_key(),
+        }
+
+    def _repository_key(self) -> str:
+        # Only what MapRepository and the AWBW client read; other cache
+        # settings (response cache, URL reuse) don't need a new session
+        cache = config.cache
+        return _fingerprint(
+            {key: cache.get(key) for key in REPOSITORY_CACHE_KEYS}, config.api
+        )
+
+    def _renderer_key(self) -> str:
+        return _fingerprint(config.renderer)
+
+    def _response_cache_key(self) -> str:
+        return _fingerprint(config.cache.get("response_cache_mb", 32))
+
+    @property
+    def repository(self) -> "repository.MapRepository":
+        if self._repository is None:
+            self._repository = repository.MapRepository()
+        return self._repository
+
+    @property
+    def response_cache(self) -> ImageCache:
+        """Built map responses keyed by (map id, data version, renderer version, level)."""
+        if self._response_cache is None:
+            size_mb = config.cache.get("response_cache_mb", 32)
+            self._response_cache = ImageCache(size_mb * 1024 * 1024)
+        return self._response_cache
+
+    @property
+    def renderer_loaded(self) -> bool:
+        return self._renderer is not None
+
+    def _create_renderer(self) -> "AW2Renderer":
+        with self._renderer_lock:
+            if self._renderer is None:
+                from src.core.aw2_renderer import AW2Renderer
+
+                self._renderer = AW2Renderer()
+                self._built_from["atlas"] = _atlas_fingerprint()
+        return self._renderer
+
+    async def get_renderer(self) -> "AW2Renderer":
+        """Return the renderer, building it off the event loop on first use.
+
+        Building loads the sprite atlas and converts every sprite.
+        """
+        if self._renderer is not None:
+            return self._renderer
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._create_renderer)
+
+    async def refresh(self) -> List[str]:
+        """Rebuild the resources whose config or atlas changed.
+
+        Call after config.reload() or an atlas rebuild. Returns the names of
+        the resources that were invalidated; everything else stays warm.
+        """
+        invalidated = []
+
+        if self._built_from["repository"] != self._repository_key():
+            old = self._repository
+            self._repository = None
+            if old is not None:
+                await old.close()
+            importlib.reload(importlib.import_module("src.core.awbw"))
+            importlib.reload(repository)
+            self._built_from["repository"] = self._repository_key()
+            invalidated.append("repository")
+
+        renderer_config_changed = self._built_from["renderer"] != self._renderer_key()
+        atlas_changed = (
+            "atlas" in self._built_from
+            and self._built_from["atlas"] != _atlas_fingerprint()
+        )
+        if renderer_config_changed or atlas_changed:
+            with self._renderer_lock:
+                old = self._renderer
+                self._renderer = None
+            if old is not None:
+                old.close()
+            if renderer_config_changed:
+                importlib.reload(importlib.import_module("src.utils.awbw_data"))
+                importlib.reload(importlib.import_module("src.core.aw2_autotile"))
+                importlib.reload(importlib.import_module("src.core.aw2_atlas"))
+                importlib.reload(importlib.import_module("src.core.aw2_animation"))
+                importlib.reload(importlib.import_module("src.core.aw2_renderer"))
+            else:
+                from src.core.aw2_atlas import SpriteAtlas
+
+                SpriteAtlas().reload()
+            self._built_from["renderer"] = self._renderer_key()
+            self._built_from.pop("atlas", None)
+            invalidated.append("renderer")
+
+        # Cached responses embed rendered images, so they go with the renderer
+        if (
+            "renderer" in invalidated
+            or self._built_from["response_cache"] != self._response_cache_key()
+        ):
+            self._response_cache = None
+            self._built_from["response_cache"] = self._response_cache_key()
+            invalidated.append("response_cache")
+
+        if invalidated:
+            logger.info(f"Rebuilding services: {', '.join(invalidated)}")
+        return invalidated
+
+    async def close(self):
+        """Release everything on shutdown."""
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
+        if self._repository is not None:
+            await self._repository.close()
+            self._repository = None
+        self._response_cache = None
@@ -1,3 +1,4 @@
+import threading
 import time
 from collections import deque
 import logging
@@ -5,6 +6,117 @@ from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Phases of a map request as seen by the cog
+REQUEST_STAGES = ("fetch", "render", "upload")
+
+# Renderer pipeline stages, in execution order
+RENDER_STAGES = (
+    "convert",
+    "autotile",
+    "compose",
+    "overhangs",
+    "units",
+    "resize",
+    "encode",
+    "animate",
+    "diff",
+)
+
+
+class Histogram:
+    """Duration samples with bounded memory for percentile queries.
+
+    Keeps the most recent samples for percentiles and running totals for
+    the lifetime count and sum. Render threads record into it while the
+    event loop reads it, so both go through a lock.
+    """
+
+    def __init__(self, max_samples: int = 1024):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, value: float):
+        with self._lock:
+            self.samples.append(value)
+            self.count += 1
+            self.total += value
+
+    def _sorted(self) -> list:
+        with self._lock:
+            return sorted(self.samples)
+
+    def percentile(self, pct: float) -> float:
+        """Return the pct-th percentile (0-100) of the retained samples."""
+        return self._pick(self._sorted(), pct)
+
+    def summary(self) -> Dict[str, float]:
+        ordered = self._sorted()
+        return {
+            "count": self.count,
+            "p50": self._pick(ordered, 50),
+            "p95": self._pick(ordered, 95),
+            "p99": self._pick(ordered, 99),
+        }
+
+    @staticmethod
+    def _pick(ordered: list, pct: float) -> float:
+        if not ordered:
+            return 0.0
+        index = round(pct / 100 * (len(ordered) - 1))
+        return ordered[min(len(ordered) - 1, index)]
+
+
+class RollingCounter:
+    """Event counts over sliding windows in constant memory.
+
+    Events are added to three rings of time buckets: per-second for the last
+    minute, per-minute for the last hour and per-hour for the last day. Each
+    bucket remembers which time slot it holds and is reset lazily when the
+    ring wraps around, so recording is O(1) and queries are O(buckets).
+    Window counts are accurate to one bucket of the respective ring.
+    """
+
+    # (bucket width in seconds, number of buckets) per ring
+    RINGS = ((1, 60), (60, 60), (3600, 24))
+
+    def __init__(self):
+        self._counts = [[0] * size for _, size in self.RINGS]
+        self._slots = [[-1] * size for _, size in self.RINGS]
+        self.total = 0
+
+    def record(self, count: int = 1, now: float | None = None):
+        if now is None:
+            now = time.time()
+        self.total += count
+        for ring, (width, size) in enumerate(self.RINGS):
+            slot = int(now // width)
+            index = slot % size
+            if self._slots[ring][index] != slot:
+                self._slots[ring][index] = slot
+                self._counts[ring][index] = 0
+            self._counts[ring][index] += count
+
+    def _window(self, ring: int, now: float) -> int:
+        width, size = self.RINGS[ring]
+        oldest = int(now // width) - size
+        return sum(
+            count
+            for count, slot in zip(self._counts[ring], self._slots[ring])
+            if slot > oldest
+        )
+
+    def windows(self, now: float | None = None) -> Dict[str, int]:
+        """Return event counts for the last minute, hour and day."""
+        if now is None:
+            now = time.time()
+        return {
+            "1m": self._window(0, now),
+            "1h": self._window(1, now),
+            "24h": self._window(2, now),
+        }
+
 
 class BotStats:
     _instance = None
@@ -17,59 +129,117 @@ class BotStats:
 
     def _init_stats(self):
         self.start_time = time.time()
+        # Renders record their stats from the render threads; this guards
+        # what they touch against readers on the event loop
+        self._lock = threading.Lock()
 
         # API Stats
         self.api_total_count = 0
         self.api_total_duration = 0.0
         self.api_longest_duration = 0.0
-        self.api_timestamps = deque()  # Store timestamps for time-window counts
+        self.api_requests = RollingCounter()  # Time-window request counts
+        self.api_latency = Histogram()
+        self.api_queue_depth = 0  # Requests waiting on the rate limiter
 
         # Render Stats
         self.render_count = 0
         self.render_total_time = 0.0
         self.render_longest_time = 0.0
         self.render_longest_map_id = 0
+        self.render_events = RollingCounter()
+
+        # Per-stage timing histograms (request phases and render stages)
+        self.stage_histograms: Dict[str, Histogram] = {}
+
+        # Cache hit/miss counters, keyed by cache name ("db", "image")
+        self.cache_hits: Dict[str, RollingCounter] = {}
+        self.cache_misses: Dict[str, RollingCounter] = {}
+
+        # Event loop lag and the callbacks that blocked it
+        self.loop_lag = Histogram()
+        self.loop_lag_max = 0.0
+        self.slow_callbacks = deque(maxlen=20)  # Most recent stalls
+        self.slow_callback_counts: Dict[str, int] = {}
+        self.slow_callback_longest: Dict[str, float] = {}
+
+        # Startup and reload timings (seconds) by step, in the order they ran
+        self.startup_stages: Dict[str, float] = {}
+
+        # Messages seen by the link listener
+        self.messages_scanned = 0  # Non-bot messages seen
+        self.messages_regex_checked = 0  # Passed the substring pre-filter
+        self.messages_matched = 0  # Contained at least one map link
+
+        # Link auto-preview throttling
+        self.preview_dropped: Dict[str, int] = {}  # Maps skipped, by reason
+        self.preview_deferred = 0  # Previews that waited for a free slot
+        self.preview_active = 0  # Previews currently being generated
 
     def record_api_request(self, duration: float):
-        now = time.time()
         self.api_total_count += 1
         self.api_total_duration += duration
         if duration > self.api_longest_duration:
             self.api_longest_duration = duration
-        self.api_timestamps.append(now)
-        self._prune_timestamps()
+        self.api_latency.record(duration)
+        self.api_requests.record()
 
     def record_render(self, duration: float, map_id: int):
-        self.render_count += 1
-        self.render_total_time += duration
-        if duration > self.render_longest_time:
-            self.render_longest_time = duration
-            self.render_longest_map_id = map_id
-
-    def _prune_timestamps(self):
-        # Remove timestamps older than 24 hours
-        cutoff = time.time() - 86400
-        while self.api_timestamps and self.api_timestamps[0] < cutoff:
-            self.api_timestamps.popleft()
+        with self._lock:
+            self.render_count += 1
+            self.render_total_time += duration
+            self.render_events.record()
+            if duration > self.render_longest_time:
+                self.render_longest_time = duration
+                self.render_longest_map_id = map_id
+
+    def record_stage(self, stage: str, duration: float):
+        with self._lock:
+            histogram = self.stage_histograms.get(stage)
+            if histogram is None:
+                histogram = self.stage_histograms[stage] = Histogram()
+        histogram.record(duration)
+
+    def record_stages(self, stages: Dict[str, float]):
+        for stage, duration in stages.items():
+            self.record_stage(stage, duration)
+
+    def record_cache_event(self, cache: str, hit: bool):
+        with self._lock:
+            counters = self.cache_hits if hit else self.cache_misses
+            counter = counters.get(cache)
+            if counter is None:
+                counter = counters[cache] = RollingCounter()
+            counter.record()
+
+    def record_loop_lag(self, lag: float):
+        self.loop_lag.record(lag)
+        if lag > self.loop_lag_max:
+            self.loop_lag_max = lag
+
+    def record_slow_callback(self, label: str, location: str, duration: float):
+        self.slow_callbacks.append(
+            {
+                "time": time.time(),
+                "label": label,
+                "location": location,
+                "duration": duration,
+            }
+        )
+        self.slow_callback_counts[label] = self.slow_callback_counts.get(label, 0) + 1
+        if duration > self.slow_callback_longest.get(label, 0.0):
+            self.slow_callback_longest[label] = duration
+
+    def record_startup(self, stage: str, duration: float):
+        self.startup_stages[stage] = duration
+
+    def record_preview_dropped(self, reason: str, count: int = 1):
+        self.preview_dropped[reason] = self.preview_dropped.get(reason, 0) + count
+
+    def record_preview_deferred(self):
+        self.preview_deferred += 1
 
     def get_api_stats(self) -> Dict[str, Any]:
-        self._prune_timestamps()
-        now = time.time()
-        one_min = now - 60
-        one_hour = now - 3600
-
-        count_24h = len(self.api_timestamps)
-        count_1h = 0
-        count_1m = 0
-
-        # Iterate backwards since it's sorted
-        for ts in reversed(self.api_timestamps):
-            if ts > one_min:
-                count_1m += 1
-            if ts > one_hour:
-                count_1h += 1
-            else:
-                break
+        windows = self.api_requests.windows()
 
         avg_time = (
             self.api_total_duration / self.api_total_count
@@ -81,17 +251,88 @@ class BotStats:
             "longest": self.api_longest_duration,
             "average": avg_time,
             "total_uptime": self.api_total_count,
-            "total_1m": count_1m,
-            "total_1h": count_1h,
-            "total_24h": count_24h,
+            "total_1m": windows["1m"],
+            "total_1h": windows["1h"],
+            "total_24h": windows["24h"],
         }
 
     def get_render_stats(self) -> Dict[str, Any]:
-        avg = self.render_total_time / self.render_count if self.render_count > 0 else 0
+        with self._lock:
+            count = self.render_count
+            total_time = self.render_total_time
+            longest = self.render_longest_time
+            longest_map_id = self.render_longest_map_id
+            windows = self.render_events.windows()
+        return {
+            "total_time": total_time,
+            "longest": longest,
+            "average": total_time / count if count > 0 else 0,
+            "count": count,
+            "longest_map_id": longest_map_id,
+            "total_1m": windows["1m"],
+            "total_1h": windows["1h"],
+            "total_24h": windows["24h"],
+        }
+
+    def get_cache_event_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return lifetime and last-hour hit/miss counts per cache."""
+        stats = {}
+        with self._lock:
+            for cache in sorted(set(self.cache_hits) | set(self.cache_misses)):
+                hits = self.cache_hits.get(cache) or RollingCounter()
+                misses = self.cache_misses.get(cache) or RollingCounter()
+                stats[cache] = {
+                    "hits": hits.total,
+                    "misses": misses.total,
+                    "hits_1h": hits.windows()["1h"],
+                    "misses_1h": misses.windows()["1h"],
+                }
+        return stats
+
+    def get_stage_histograms(self) -> Dict[str, Histogram]:
+        """Return a snapshot of the per-stage histograms, safe to iterate."""
+        with self._lock:
+            return dict(self.stage_histograms)
+
+    def get_stage_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return count and p50/p95/p99 (seconds) for every recorded stage."""
+        return {
+            stage: histogram.summary()
+            for stage, histogram in self.get_stage_histograms().items()
+        }
+
+    def get_loop_stats(self) -> Dict[str, Any]:
+        """Return event loop lag percentiles and slow-callback attribution."""
+        lag = self.loop_lag.summary()
+        by_label = sorted(
+            (
+                {
+                    "label": label,
+                    "count": count,
+                    "longest": self.slow_callback_longest.get(label, 0.0),
+                }
+                for label, count in self.slow_callback_counts.items()
+            ),
+            key=lambda entry: entry["count"],
+            reverse=True,
+        )
+        return {
+            "lag_p50": lag["p50"],
+            "lag_p99": lag["p99"],
+            "lag_max": self.loop_lag_max,
+            "slow_total": sum(self.slow_callback_counts.values()),
+            "by_label": by_label,
+            "recent": list(self.slow_callbacks),
+        }
+
+    def get_preview_stats(self) -> Dict[str, Any]:
+        """Return link listener and auto-preview throttling counts."""
         return {
-            "total_time": self.render_total_time,
-            "longest": self.render_longest_time,
-            "average": avg,
-            "count": self.render_count,
-            "longest_map_id": self.render_longest_map_id,
+            "scanned": self.messages_scanned,
+            "regex_checked": self.messages_regex_checked,
+            "matched": self.messages_matched,
+            "active": self.preview_active,
+            "deferred": self.preview_deferred,
+            "dropped": dict(sorted(self.preview_dropped.items())),
+            "dropped_total": sum(self.preview_dropped.values()),
         }
@@ -0,0 +1,152 @@
+"""Throttling for link auto-previews.
+
+Auto-previews are triggered by any message, so a user spamming links or a
+bot relaying the same link could otherwise saturate the render pool and
+the AWBW rate limit. This applies per-channel and per-guild cooldowns, a
+per-channel dedup window for recently previewed maps and a global cap on
+concurrent previews. Explicit /map commands are not throttled.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.core.stats import BotStats
+
+logger = logging.getLogger(__name__)
+
+# Prune bookkeeping once it tracks this many channels/maps
+PRUNE_THRESHOLD = 1024
+
+
+class PreviewThrottle:
+    """Decides which auto-previews run now, later or not at all."""
+
+    def __init__(
+        self,
+        channel_cooldown: float = 5.0,
+        guild_cooldown: float = 1.0,
+        dedup_window: float = 300.0,
+        max_concurrent: int = 4,
+        max_queued: int = 16,
+    ):
+        self.channel_cooldown = channel_cooldown
+        self.guild_cooldown = guild_cooldown
+        self.dedup_window = dedup_window
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._waiting = 0
+        self._channel_last: Dict[int, float] = {}
+        self._guild_last: Dict[int, float] = {}
+        self._recent: Dict[Tuple[int, int], float] = {}  # (channel, map) -> time
+
+    def admit(
+        self,
+        channel_id: int,
+        guild_id: Optional[int],
+        map_ids: List[int],
+        now: Optional[float] = None,
+    ) -> List[int]:
+        """Return the maps that may be previewed now.
+
+        Maps are dropped if the channel or guild is cooling down, or if the
+        map was already previewed in the channel within the dedup window.
+        Nothing is recorded until mark() is called for the admitted maps.
+        """
+        if now is None:
+            now = time.monotonic()
+        stats = BotStats()
+
+        if now - self._channel_last.get(channel_id, -math.inf) < self.channel_cooldown:
+            stats.record_preview_dropped("channel_cooldown", len(map_ids))
+            return []
+        if (
+            guild_id is not None
+            and now - self._guild_last.get(guild_id, -math.inf) < self.guild_cooldown
+        ):
+            stats.record_preview_dropped("guild_cooldown", len(map_ids))
+            return []
+
+        fresh = [
+            map_id
+            for map_id in map_ids
+            if now - self._recent.get((channel_id, map_id), -math.inf)
+            >= self.dedup_window
+        ]
+        if len(fresh) < len(map_ids):
+            stats.record_preview_dropped("duplicate", len(map_ids) - len(fresh))
+        return fresh
+
+    def mark(
+        self,
+        channel_id: int,
+        guild_id: Optional[int],
+        map_ids: List[int],
+        now: Optional[float] = None,
+    ):
+        """Start the cooldowns and mark the maps as previewed in the channel.
+
+        Called once a preview slot is held, so dropped messages leave no trace.
+        """
+        if now is None:
+            now = time.monotonic()
+        self._channel_last[channel_id] = now
+        if guild_id is not None:
+            self._guild_last[guild_id] = now
+        for map_id in map_ids:
+            self._recent[(channel_id, map_id)] = now
+        self._prune(now)
+
+    def unmark(self, channel_id: int, map_ids: List[int]):
+        """Forget maps whose previews failed, so the next link retries them."""
+        for map_id in map_ids:
+            self._recent.pop((channel_id, map_id), None)
+
+    async def acquire(self, count: int = 1) -> bool:
+        """Wait for a preview slot. Returns False if the queue is full.
+
+        count is the number of maps the slot is for, counted as dropped
+        when the queue is full.
+        """
+        stats = BotStats()
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queued:
+                stats.record_preview_dropped("overloaded", count)
+                return False
+            stats.record_preview_deferred()
+            self._waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        stats.preview_active += 1
+        return True
+
+    def release(self):
+        BotStats().preview_active -= 1
+        self._semaphore.release()
+
+    def _prune(self, now: float):
+        """Forget channels, guilds and maps whose windows have passed."""
+        if len(self._recent) > PRUNE_THRESHOLD:
+            self._recent = {
+                key: seen
+                for key, seen in self._recent.items()
+                if now - seen < self.dedup_window
+            }
+        if len(self._channel_last) > PRUNE_THRESHOLD:
+            self._channel_last = {
+                key: seen
+                for key, seen in self._channel_last.items()
+                if now - seen < self.channel_cooldown
+            }
+        if len(self._guild_last) > PRUNE_THRESHOLD:
+            self._guild_last = {
+                key: seen
+                for key, seen in self._guild_last.items()
+                if now - seen < self.guild_cooldown
+            }
@@ -0,0 +1,39 @@
+"""Lightweight wall-clock timing for named pipeline stages."""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class StageTimer:
+    """Accumulates durations (in seconds) for named stages of a pipeline."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        """Add a duration measured elsewhere to a stage."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @property
+    def total(self) -> float:
+        return sum(self.stages.values())
+
+
+def format_durations(durations: Dict[str, float]) -> str:
+    """Format named durations (in seconds) as aligned millisecond lines."""
+    if not durations:
+        return "No samples yet"
+    width = max(len(name) for name in durations) + 2
+    return "\n".join(
+        f"{name:<{width}}{seconds * 1000:>9.1f} ms"
+        for name, seconds in durations.items()
+    )
@@ -1,7 +1,14 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
-from src.config import DISCORD_TOKEN
+from src.config import DISCORD_TOKEN, config
+from src.core.loop_monitor import LoopMonitor
+from src.core.metrics import MetricsServer
+from src.core.services import Services
+from src.core.stats import BotStats
+from src.core.timing import format_durations
 import sys
+import time
 
 
 class BattleMapsBot(commands.Bot):
@@ -9,25 +16,79 @@ class BattleMapsBot(commands.Bot):
         intents = discord.Intents.default()
         intents.message_content = True
         super().__init__(command_prefix=lambda *_: [], intents=intents)
+        self.loop_monitor = LoopMonitor(
+            config.metrics.get("loop_lag_interval", 0.5),
+            config.metrics.get("slow_callback_threshold", 0.25),
+        )
+        self.metrics_server: MetricsServer | None = None
 
     async def is_owner(self, user: discord.User) -> bool:
         if user.id == 201170653481533440:
             return True
         return await super().is_owner(user)
 
+    async def add_cog(self, cog: commands.Cog, /, **kwargs):
+        await super().add_cog(cog, **kwargs)
+
+        # Let the loop monitor attribute stalls to commands and listeners
+        for command in cog.walk_app_commands():
+            if isinstance(command, app_commands.Command):
+                self.loop_monitor.register(
+                    command.callback, f"/{command.qualified_name}"
+                )
+        for name, method in cog.get_listeners():
+            self.loop_monitor.register(method, name)
+
     async def setup_hook(self):
         extensions = ["src.cogs.maps", "src.cogs.admin"]
 
+        stats = BotStats()
         for ext in extensions:
             try:
+                start_time = time.perf_counter()
                 await self.load_extension(ext)
-                print(f"Loaded extension: {ext}")
+                # The extension's setup() records its own share of the time
+                elapsed = time.perf_counter() - start_time
+                setup_time = stats.startup_stages.get(f"setup {ext}", 0.0)
+                stats.record_startup(f"import {ext}", elapsed - setup_time)
+                print(f"Loaded extension: {ext} ({elapsed * 1000:.0f} ms)")
             except Exception as e:
                 print(f"Failed to load extension {ext}: {e}")
 
+        self.loop_monitor.start()
+
+        if config.metrics.get("enabled", False):
+            self.metrics_server = MetricsServer(
+                config.metrics.get("host", "127.0.0.1"),
+                config.metrics.get("port", 9108),
+            )
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                print(f"Failed to start metrics endpoint: {e}")
+                self.metrics_server = None
+
+    async def close(self):
+        await self.loop_monitor.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await Services().close()
+        await super().close()
+
     async def on_ready(self):
         print(f"Logged in as {self.user} (ID: {self.user.id})")
 
+        stats = BotStats()
+        if "ready" not in stats.startup_stages:
+            try:
+                import psutil
+
+                started = psutil.Process().create_time()
+                stats.record_startup("ready", time.time() - started)
+            except ImportError:
+                pass
+            print("Startup timings:\n" + format_durations(stats.startup_stages))
+
 
 bot = BattleMapsBot()
 
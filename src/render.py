@@ -0,0 +1,233 @@
+"""Headless map rendering for batch export and offline benchmarking.
+
+Renders maps from repository-style map JSON files (as written by
+benchmark_rendering.py --record), directories of them, or the bot's SQLite
+cache, and writes one image per map. Nothing talks to Discord or AWBW.
+
+Usage:
+    python -m src.render benchmarks/fixtures -o renders      # a directory
+    python -m src.render maps/69669.json --format webp       # single files
+    python -m src.render --cache --jobs 8                    # whole cache
+    python -m src.render --cache 69669 179270 --level native # cached maps
+
+With --jobs N, maps are rendered in N worker processes, each with its own
+renderer. Every run ends with a throughput report: maps and tiles per
+second over the wall-clock time, plus mean per-map stage timings.
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from src.config import config
+from src.core.timing import StageTimer, format_durations
+from src.utils.awbw_data import CLEAR
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("png", "webp")
+
+# Renderer of this process, built on first use (one per --jobs worker)
+_renderer = None
+
+
+def _get_renderer():
+    global _renderer
+    if _renderer is None:
+        from src.core.aw2_renderer import AW2Renderer
+
+        _renderer = AW2Renderer()
+    return _renderer
+
+
+def load_files(paths: Iterable[Path]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(name, map data) of map JSON files and every *.json in directories."""
+    for path in paths:
+        files = sorted(path.glob("*.json")) if path.is_dir() else [path]
+        for file in files:
+            with open(file) as f:
+                yield file.stem, json.load(f)
+
+
+def load_cache(
+    db_path: str, map_ids: Optional[list[int]] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(map id, map data) of maps in the SQLite cache, expired or not."""
+    query = "SELECT id, json_data FROM maps"
+    params: tuple = ()
+    if map_ids:
+        query += f" WHERE id IN ({', '.join('?' * len(map_ids))})"
+        params = tuple(map_ids)
+    query += " ORDER BY id"
+
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+        for map_id, json_data in conn.execute(query, params):
+            data = json.loads(json_data)
+            if "size_w" not in data:
+                # The bot migrates these the next time it loads them
+                logger.warning(f"Skipping map {map_id}: cached in the legacy format")
+                continue
+            yield str(map_id), data
+
+
+def render_one(
+    item: Tuple[str, Dict[str, Any]],
+    output: Path,
+    image_format: str,
+    level: str,
+    weather: str,
+) -> Tuple[str, Optional[str], float, int, int, Dict[str, float]]:
+    """Render one map to output/<name>.<format>.
+
+    Returns (name, error or None, seconds, bytes written, tiles, stages).
+    """
+    name, map_data = item
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        _, image = _get_renderer().render_map(
+            map_data,
+            level=level,
+            use_cache=False,
+            timer=timer,
+            weather=weather,
+            image_format=image_format.upper(),
+        )
+    except Exception as e:
+        return name, f"{type(e).__name__}: {e}", 0.0, 0, 0, {}
+    elapsed = time.perf_counter() - start
+
+    data = image.getvalue()
+    (output / f"{name}.{image_format}").write_bytes(data)
+    tiles = map_data.get("size_w", 0) * map_data.get("size_h", 0)
+    return name, None, elapsed, len(data), tiles, timer.stages
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="Map JSON files or directories; with --cache, map IDs (default: all)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Render maps stored in the SQLite cache instead of files",
+    )
+    parser.add_argument(
+        "--db",
+        default=config.cache["db_path"],
+        help="SQLite cache to read with --cache (default: cache.db_path)",
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, default=Path("renders"), help="Output directory"
+    )
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument(
+        "--level",
+        choices=("native", "thumbnail", "full"),
+        default="full",
+        help="Pyramid level to encode (default: full)",
+    )
+    parser.add_argument(
+        "--weather", default=CLEAR, help="Terrain layer to draw (default: clear)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes (0: one per CPU; default: 1)",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Only print the summary"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.cache:
+        try:
+            map_ids = [int(value) for value in args.inputs]
+        except ValueError:
+            parser.error("with --cache, inputs must be map IDs")
+        maps = load_cache(args.db, map_ids)
+    else:
+        if not args.inputs:
+            parser.error("give map JSON files or directories, or use --cache")
+        maps = load_files(Path(value) for value in args.inputs)
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    jobs = args.jobs or os.cpu_count() or 1
+    render = functools.partial(
+        render_one,
+        output=args.output,
+        image_format=args.format,
+        level=args.level,
+        weather=args.weather,
+    )
+
+    start = time.perf_counter()
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_get_renderer)
+        # Only keep a few maps per worker in flight, not the whole library
+        results = executor.map(render, maps, buffersize=jobs * 4)
+    else:
+        executor = None
+        _get_renderer()
+        if not args.quiet:
+            print(f"Renderer ready in {time.perf_counter() - start:.2f}s")
+        results = map(render, maps)
+
+    rendered = failed = total_bytes = total_tiles = 0
+    render_seconds = 0.0
+    stages: Dict[str, float] = {}
+    try:
+        for name, error, seconds, size, tiles, map_stages in results:
+            if error is not None:
+                failed += 1
+                print(f"{name:<24} FAILED: {error}", file=sys.stderr)
+                continue
+            rendered += 1
+            total_bytes += size
+            total_tiles += tiles
+            render_seconds += seconds
+            for stage, stage_seconds in map_stages.items():
+                stages[stage] = stages.get(stage, 0.0) + stage_seconds
+            if not args.quiet:
+                print(f"{name:<24} {seconds * 1000:8.1f} ms {size / 1024:8.1f} KB")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    wall = time.perf_counter() - start
+
+    print(
+        f"\nRendered {rendered} maps ({failed} failed) to '{args.output}' "
+        f"in {wall:.2f}s with {jobs} job{'s' if jobs > 1 else ''}"
+    )
+    if rendered:
+        print(
+            f"Throughput: {rendered / wall:.1f} maps/s, "
+            f"{total_tiles / wall:,.0f} tiles/s, "
+            f"{total_bytes / wall / 1024 / 1024:.1f} MB/s written"
+        )
+        print(f"Mean render: {render_seconds / rendered * 1000:.1f} ms/map")
+        print(
+            format_durations(
+                {stage: seconds / rendered for stage, seconds in stages.items()}
+            )
+        )
+    return 1 if failed or not rendered else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,10 @@
+from src.config import config
+
+# Default terrain layer, drawn from the plain sprite files
+CLEAR = "clear"
+# Alternate layers: rain and snow load <name>_<layer> files, fog the gs_ sprites
+WEATHER_LAYERS = tuple(config.renderer.get("weather_layers", ["rain", "snow", "fog"]))
+
 PROPERTY_TERRAINS = {101, 102, 103, 104, 105, 106, 107}
 
 PROPERTY_VALUE = {
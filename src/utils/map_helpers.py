@@ -1,3 +1,7 @@
+import hashlib
+import json
+import logging
+import numpy as np
 from typing import Dict, Any, List
 from src.utils.data.element_id import (
     AWBW_TERR,
@@ -6,6 +10,27 @@ from src.utils.data.element_id import (
 )
 from src.utils.awbw_data import PROPERTY_TERRAINS, PROPERTY_VALUE
 
+logger = logging.getLogger(__name__)
+
+NUM_COUNTRIES = 21
+
+# Dense lookup tables indexed by AWBW terrain ID. Unknown IDs map to 0
+# (no terrain, neutral, no income).
+PROPERTY_TYPES = sorted(PROPERTY_TERRAINS)
+TERR_LUT_SIZE = max(AWBW_TERR) + 1
+TERR_BASE = np.zeros(TERR_LUT_SIZE, dtype=np.int32)
+TERR_COUNTRY = np.zeros(TERR_LUT_SIZE, dtype=np.int32)
+TERR_INCOME = np.zeros(TERR_LUT_SIZE, dtype=np.int32)
+# Column in the per-country property count matrix, or -1 if not a property
+TERR_PROPERTY_INDEX = np.full(TERR_LUT_SIZE, -1, dtype=np.int32)
+
+for _terr_id, (_terr, _ctry) in AWBW_TERR.items():
+    TERR_BASE[_terr_id] = _terr
+    TERR_COUNTRY[_terr_id] = _ctry
+    if _terr in PROPERTY_TERRAINS and 0 <= _ctry < NUM_COUNTRIES:
+        TERR_INCOME[_terr_id] = PROPERTY_VALUE.get(_terr, 0)
+        TERR_PROPERTY_INDEX[_terr_id] = PROPERTY_TYPES.index(_terr)
+
 
 def format_k(num: float) -> str:
     num = int(num)
@@ -17,17 +42,65 @@ def format_k(num: float) -> str:
         return str(num)
 
 
+def terrain_grid(map_data: Dict[str, Any]) -> np.ndarray:
+    """Convert a map's column-major terrain list into a (height, width) array."""
+    width = map_data["size_w"]
+    height = map_data["size_h"]
+
+    terrain_data = np.array(map_data["terr"], dtype=np.int32)
+
+    if terrain_data.ndim == 1:
+        terrain_ids = terrain_data.reshape(width, height).T
+    else:
+        terrain_ids = terrain_data.T
+
+    if terrain_ids.shape != (height, width):
+        logger.warning(
+            f"Terrain shape {terrain_ids.shape} doesn't match map size {height}x{width}"
+        )
+        terrain_ids = terrain_ids[:height, :width]
+
+    return terrain_ids
+
+
+def property_totals(
+    terr_map: List[List[int]] | np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Count properties and income per country in a single pass.
+
+    Returns:
+        Tuple of (counts of shape (NUM_COUNTRIES, len(PROPERTY_TYPES)),
+        income of shape (NUM_COUNTRIES,)).
+    """
+    ids = np.asarray(terr_map, dtype=np.int32).ravel()
+    ids = np.where((ids >= 0) & (ids < TERR_LUT_SIZE), ids, 0)
+
+    prop_index = TERR_PROPERTY_INDEX[ids]
+    is_prop = prop_index >= 0
+    ctry = TERR_COUNTRY[ids][is_prop]
+    combined = ctry * len(PROPERTY_TYPES) + prop_index[is_prop]
+
+    counts = np.bincount(combined, minlength=NUM_COUNTRIES * len(PROPERTY_TYPES))
+    income = np.bincount(
+        ctry, weights=TERR_INCOME[ids][is_prop], minlength=NUM_COUNTRIES
+    )
+    return counts.reshape(NUM_COUNTRIES, len(PROPERTY_TYPES)), income
+
+
 def count_properties(
-    terr_map: List[List[int]],
+    terr_map: List[List[int]] | np.ndarray,
 ) -> tuple[Dict[int, Dict[int, int]], Dict[int, int]]:
-    counts = {i: {} for i in range(21)}
-    total_income = {i: 0 for i in range(21)}
-    for row in terr_map:
-        for terr_id in row:
-            terr, ctry = AWBW_TERR.get(terr_id, (0, 0))
-            if terr in PROPERTY_TERRAINS and 0 <= ctry <= 20:
-                counts[ctry][terr] = counts[ctry].get(terr, 0) + 1
-                total_income[ctry] += PROPERTY_VALUE.get(terr, 0)
+    """Count properties and daily income per country.
+
+    Accepts either the raw terrain list from the map data or an already
+    converted terrain array (such as the renderer's), in any layout.
+    """
+    matrix, income = property_totals(terr_map)
+
+    counts = {i: {} for i in range(NUM_COUNTRIES)}
+    for ctry, prop in zip(*np.nonzero(matrix)):
+        counts[int(ctry)][PROPERTY_TYPES[prop]] = int(matrix[ctry, prop])
+    total_income = {i: int(income[i]) for i in range(NUM_COUNTRIES)}
     return counts, total_income
 
 
@@ -39,3 +112,153 @@ def count_units(unit_list: List[Dict[str, Any]]) -> Dict[int, Dict[int, int]]:
         if ctry_id in counts:
             counts[ctry_id][unit_type_id] = counts[ctry_id].get(unit_type_id, 0) + 1
     return counts
+
+
+def map_data_version(map_data: Dict[str, Any]) -> str:
+    """Short content hash of the parts of a map that affect its rendering."""
+    payload = json.dumps(
+        [
+            map_data.get("size_w", 0),
+            map_data.get("size_h", 0),
+            map_data.get("terr", []),
+            map_data.get("unit", []),
+        ],
+        separators=(",", ":"),
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def summarize_map(map_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute the per-version statistics shown in map embeds.
+
+    The result is JSON-serializable so it can be stored alongside the map
+    data; property counts are lists aligned with PROPERTY_TYPES and unit
+    counts are sorted [unit_type, count] pairs.
+    """
+    matrix, income = property_totals(map_data.get("terr", []))
+    unit_counts = count_units(map_data.get("unit", []))
+
+    active_ctries = [
+        i for i in range(NUM_COUNTRIES) if matrix[i].any() or unit_counts.get(i)
+    ]
+    active_ctries.sort(key=lambda i: (0 if matrix[i].any() else 1, i))
+    active_players = len([i for i in active_ctries if i != 0])
+
+    type_totals = dict(zip(PROPERTY_TYPES, matrix.sum(axis=0).tolist()))
+    income_props = sum(type_totals.get(terr, 0) for terr in (101, 102, 103, 104, 105))
+    base_count = type_totals.get(103, 0)
+
+    base_income_k = 2 if map_data.get("is_hfog", False) else 1
+    daily_income_k = income_props * base_income_k
+    players = map_data.get("player_count", active_players)
+
+    return {
+        "id": map_data.get("id"),
+        "version": map_data_version(map_data),
+        "name": map_data.get("name"),
+        "author": map_data.get("author", "Unknown"),
+        "published": map_data.get("published", "Unknown"),
+        "size_w": map_data.get("size_w", 0),
+        "size_h": map_data.get("size_h", 0),
+        "player_count": players,
+        "active_players": active_players,
+        "is_hfog": map_data.get("is_hfog", False),
+        "total_props": int(matrix.sum()),
+        "daily_income_k": daily_income_k,
+        "funds_per_player": round(daily_income_k / players, 1) if players > 0 else 0,
+        "funds_per_base": round(daily_income_k / base_count, 1)
+        if base_count > 0
+        else 0,
+        "countries": [
+            {
+                "ctry": ctry,
+                "income": int(income[ctry]),
+                "props": matrix[ctry].tolist(),
+                "units": sorted([uid, n] for uid, n in unit_counts[ctry].items()),
+            }
+            for ctry in active_ctries
+        ],
+    }
+
+
+def _units_by_tile(units: List[Dict[str, Any]]) -> Dict[tuple, list]:
+    """Type, country and HP of the units on each (x, y) tile."""
+    tiles = {}
+    for unit in units:
+        key = (unit.get("id", 0), unit.get("ctry", ""), unit.get("hp", 10))
+        tiles.setdefault((unit.get("x", -1), unit.get("y", -1)), []).append(key)
+    return {tile: sorted(keys) for tile, keys in tiles.items()}
+
+
+def changed_tiles(old_data: Dict[str, Any], new_data: Dict[str, Any]) -> np.ndarray:
+    """Tiles whose terrain or units differ between two maps.
+
+    The maps are aligned at their top-left corner and compared over the
+    larger of the two sizes; tiles only one of them has count as changed.
+    Returns a bool array of shape (max height, max width).
+    """
+    old_terr = terrain_grid(old_data)
+    new_terr = terrain_grid(new_data)
+    shape = (
+        max(old_terr.shape[0], new_terr.shape[0]),
+        max(old_terr.shape[1], new_terr.shape[1]),
+    )
+
+    # -1 marks tiles outside a map, so they differ from any terrain
+    old_grid = np.full(shape, -1, dtype=np.int32)
+    new_grid = np.full(shape, -1, dtype=np.int32)
+    old_grid[: old_terr.shape[0], : old_terr.shape[1]] = old_terr
+    new_grid[: new_terr.shape[0], : new_terr.shape[1]] = new_terr
+
+    changed = old_grid != new_grid
+    old_units = _units_by_tile(old_data.get("unit", []))
+    new_units = _units_by_tile(new_data.get("unit", []))
+    for x, y in old_units.keys() | new_units.keys():
+        if 0 <= y < shape[0] and 0 <= x < shape[1]:
+            if old_units.get((x, y)) != new_units.get((x, y)):
+                changed[y, x] = True
+    return changed
+
+
+def summary_changes(
+    old_summary: Dict[str, Any], new_summary: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Differences between two map summaries (see summarize_map).
+
+    Returns the changed header fields as {field: [old, new]} and, for every
+    country whose properties, income or units changed, its property count
+    deltas (aligned with PROPERTY_TYPES), income delta and [unit_type,
+    delta] pairs.
+    """
+    fields = {
+        field: [old_summary.get(field), new_summary.get(field)]
+        for field in (
+            "size_w",
+            "size_h",
+            "active_players",
+            "total_props",
+            "daily_income_k",
+        )
+        if old_summary.get(field) != new_summary.get(field)
+    }
+
+    old_countries = {c["ctry"]: c for c in old_summary.get("countries", [])}
+    new_countries = {c["ctry"]: c for c in new_summary.get("countries", [])}
+    empty = {"income": 0, "props": [0] * len(PROPERTY_TYPES), "units": []}
+
+    countries = []
+    for ctry in sorted(old_countries.keys() | new_countries.keys()):
+        old = old_countries.get(ctry, empty)
+        new = new_countries.get(ctry, empty)
+        props = (np.array(new["props"]) - np.array(old["props"])).tolist()
+        units = dict(new["units"])
+        for uid, count in old["units"]:
+            units[uid] = units.get(uid, 0) - count
+        units = sorted([uid, delta] for uid, delta in units.items() if delta)
+        income = new["income"] - old["income"]
+        if any(props) or units or income:
+            countries.append(
+                {"ctry": ctry, "income": income, "props": props, "units": units}
+            )
+
+    return {"fields": fields, "countries": countries}
@@ -0,0 +1,81 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+from benchmark_rendering import synthetic_maps
+from src.core.aw2_animation import ALPHA_THRESHOLD, TRANSPARENT_INDEX, Palette
+from src.core.aw2_renderer import AW2Renderer
+
+
+@pytest.fixture(scope="module")
+def renderer() -> AW2Renderer:
+    return AW2Renderer()
+
+
+def decode_frames(data: io.BytesIO) -> list[np.ndarray]:
+    with Image.open(data) as image:
+        return [
+            np.array(frame.convert("RGBA")) for frame in ImageSequence.Iterator(image)
+        ]
+
+
+@pytest.mark.parametrize("level", ["native", "thumbnail"])
+def test_webp_animation_keeps_every_frame(renderer: AW2Renderer, level: str):
+    map_data = synthetic_maps()["unit_dense_40x40"]
+    _, gif = renderer.render_animation(
+        map_data, level=level, use_cache=False, image_format="GIF"
+    )
+    _, webp = renderer.render_animation(
+        map_data, level=level, use_cache=False, image_format="WEBP"
+    )
+    gif_frames = decode_frames(gif)
+    if len(gif_frames) < 2:
+        pytest.skip("no animated sprites on this map in the current atlas")
+
+    webp_frames = decode_frames(webp)
+    assert len(webp_frames) == len(gif_frames)
+    for frame, following in zip(webp_frames, webp_frames[1:]):
+        assert not np.array_equal(frame, following)
+
+
+def test_gif_first_frame_matches_static_render(renderer: AW2Renderer):
+    map_data = synthetic_maps()["coastline_40x40"]
+    _, png = renderer.render_map(map_data, level="native", use_cache=False)
+    _, gif = renderer.render_animation(
+        map_data, level="native", use_cache=False, image_format="GIF"
+    )
+    static = np.array(Image.open(png).convert("RGBA"))
+    first = decode_frames(gif)[0]
+    opaque = static[..., 3] >= ALPHA_THRESHOLD
+    colors = np.unique(static[opaque][:, :3], axis=0)
+    if len(colors) > TRANSPARENT_INDEX:
+        # Quantized: close, but not exact
+        error = np.abs(first[opaque, :3].astype(int) - static[opaque, :3])
+        assert error.mean() < 8
+    else:
+        assert np.array_equal(first[opaque, :3], static[opaque, :3])
+
+
+def test_palette_keeps_up_to_255_colors_exactly():
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (15, 17, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    pixels[0, 0, 3] = 0
+    palette = Palette([pixels])
+
+    indices = palette.index(pixels)
+    assert indices[0, 0] == TRANSPARENT_INDEX
+    assert np.array_equal(palette.palette[indices[1:]], pixels[1:, ..., :3])
+
+
+def test_palette_quantizes_more_than_255_colors():
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (64, 64, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    palette = Palette([pixels])
+
+    assert palette.size <= TRANSPARENT_INDEX
+    indices = palette.index(pixels)
+    assert indices.max() < palette.size